@@ -0,0 +1,101 @@
+"""Compare calendar events as dicts (old API) with `CalendarEvent`.
+
+Run from the project root:
+    python -m benchmarks.calendar_records [n_events]
+"""
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from benchmarks import fakeenv  # noqa: F401
+from mynotion import CalendarEvent
+
+REPEAT = 5
+
+
+def make_pages(n: int) -> list[dict]:
+    start = datetime(2024, 1, 1, 9, 30)
+    pages = []
+    for i in range(n):
+        begin = start + timedelta(hours=7 * i)
+        end = begin + timedelta(hours=2) if i % 3 else None
+        pages.append({
+            "id": f"{i:032x}",
+            "properties": {
+                "Name": {"title": [{"plain_text": f"event number {i}"}]},
+                "Date": {"date": {
+                    "start": begin.isoformat() + "+03:00",
+                    "end": end.isoformat() + "+03:00" if end else None,
+                }},
+            },
+        })
+    return pages
+
+
+def events_as_dicts(pages: list[dict]) -> list[dict]:
+    """`Notion.get_calendar_events` before records were introduced"""
+    events = []
+    for page in pages:
+        event = {}
+        props = page["properties"]
+        date = props["Date"]['date']
+        title = props["Name"]["title"]
+        if title and date:
+            event['title'] = title[0]['plain_text']
+            event['id'] = page['id']
+            event['start'] = datetime.fromisoformat(date['start'])
+            event['end'] = date['end']
+            if event['end']:
+                event['end'] = datetime.fromisoformat(event['end'])
+            events.append(event)
+    return events
+
+
+def events_as_records(pages: list[dict]) -> list:
+    events = map(CalendarEvent.from_page, pages)
+    return [ev for ev in events if ev is not None]
+
+
+def events_as_records_with_dates(pages: list[dict]) -> list:
+    """Records of consumer that reads dates of every event"""
+    events = events_as_records(pages)
+    for ev in events:
+        ev.start, ev.end
+    return events
+
+
+def build_time(build, pages) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        started = perf_counter()
+        build(pages)
+        best = min(best, perf_counter() - started)
+    return best
+
+
+def retained_memory(build, pages) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    events = build(pages)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del events
+    return size
+
+
+def main(n: int):
+    pages = make_pages(n)
+    print(f"{n} calendar events, best of {REPEAT} runs")
+    print(f"{'':22} {'build, ms':>10} {'memory, KiB':>12}")
+    for name, build in (("dict (eager dates)", events_as_dicts),
+                        ("CalendarEvent (lazy)", events_as_records),
+                        # consumers reading dates pay for parsing on access
+                        ("CalendarEvent + dates", events_as_records_with_dates)):
+        t = build_time(build, pages)
+        m = retained_memory(build, pages)
+        print(f"{name:22} {t * 1000:10.1f} {m / 1024:12.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
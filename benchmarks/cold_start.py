@@ -0,0 +1,94 @@
+"""Cold start of the bot: time from `python bot.py` to the first
+handled update, with lazy plugins and with LAZY_PLUGINS=0.
+
+The bot is started as a separate process against a local stand-in
+for the Bot API (`benchmarks.fakebotapi`), with `/help` waiting in
+the update queue. After the answer `/timerset` is sent, it is the first
+command of a plugin, so lazy plugins import their module here.
+Nothing is sent to Notion.
+
+Run from the project root:
+    python -m benchmarks.cold_start [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from time import monotonic, sleep
+
+from benchmarks import fakeenv  # noqa: F401
+from benchmarks.fakebotapi import FakeBotAPI
+from config import SEND_CHAT_INTERVAL
+
+CHAT_ID = int(os.environ["TG_CHAT_ID"])
+ROOT = Path(__file__).resolve().parent.parent
+TIMEOUT = 30
+
+
+def run_bot(lazy: bool) -> dict[str, float]:
+    answers: list[float] = []
+    answered = threading.Event()
+
+    def on_send(chat_id: int, text: str):
+        answers.append(monotonic())
+        answered.set()
+
+    api = FakeBotAPI(on_send)
+    api.start()
+    api.push(CHAT_ID, "/help")
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ,
+                   BOT_API_URL=api.base_url,
+                   DATA_DIR=data_dir,
+                   LAZY_PLUGINS="1" if lazy else "0")
+        log_path = Path(data_dir, "bot.log")
+        with open(log_path, "w") as log:
+            start = monotonic()
+            bot = subprocess.Popen([sys.executable, "bot.py"], cwd=ROOT,
+                                   env=env, stdout=log, stderr=log)
+            try:
+                if not answered.wait(TIMEOUT):
+                    raise RuntimeError("no answer to /help, see the bot log:\n"
+                                       + log_path.read_text())
+                imported = log_path.read_text().count("plugin module is loaded")
+                # do not measure the pause between messages to a chat
+                sleep(SEND_CHAT_INTERVAL)
+                answered.clear()
+                command_sent = monotonic()
+                api.push(CHAT_ID, "/timerset 1:00")
+                if not answered.wait(TIMEOUT):
+                    raise RuntimeError("no answer to /timerset")
+            finally:
+                bot.terminate()
+                bot.wait()
+                api.stop()
+    return {
+        "polling": api.first_calls["getUpdates"] - start,
+        "first update": answers[0] - start,
+        "first plugin command": answers[1] - command_sent,
+        "imported at start": imported,
+    }
+
+
+def main(runs: int):
+    results = {}
+    for lazy in (False, True):
+        mode = "lazy" if lazy else "eager"
+        results[mode] = [run_bot(lazy) for _ in range(runs)]
+    print(f"median of {runs} runs, seconds from `python bot.py`")
+    print(f"{'':6} {'polling':>8} {'1st update':>11} "
+          f"{'1st plugin cmd':>15} {'imported at start':>18}")
+    for mode, rows in results.items():
+        median = {key: statistics.median(row[key] for row in rows)
+                  for key in rows[0]}
+        print(f"{mode:6} {median['polling']:8.3f} "
+              f"{median['first update']:11.3f} "
+              f"{median['first plugin command']:15.3f} "
+              f"{rows[0]['imported at start']:18}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,127 @@
+"""Compare update delivery latency of polling and webhook modes.
+
+A local stand-in for the Bot API (`benchmarks.fakebotapi`) pushes
+messages, the bot answers each one, and the time from push to the
+answer is measured. Both modes are switched in one run, like the bot
+does on restart with another DELIVERY_MODE.
+
+Run from the project root:
+    python -m benchmarks.delivery_latency [n_messages] [rtt_ms]
+`rtt_ms` imitates the round trip to Telegram (0 by default).
+"""
+import asyncio
+import socket
+import statistics
+import sys
+import urllib.error
+import urllib.request
+from time import perf_counter
+
+from benchmarks import fakeenv  # noqa: F401
+from benchmarks.fakebotapi import FakeBotAPI
+from telegram import Update
+from telegram.ext import Application, ApplicationBuilder, ContextTypes, MessageHandler, filters
+
+CHAT_ID = 1
+SECRET = "benchmark-secret"
+# pause between messages, so every message finds the bot idle
+GAP = 0.05
+
+
+async def answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await context.bot.send_message(update.effective_chat.id, update.effective_message.text)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def post_without_secret(url: str) -> int:
+    request = urllib.request.Request(url, data=b"{}",
+                                     headers={"Content-Type": "application/json"})
+    try:
+        return urllib.request.urlopen(request, timeout=5).status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+async def measure(api: FakeBotAPI, answered: dict, n: int) -> list[float]:
+    loop = asyncio.get_running_loop()
+    latencies = []
+    for i in range(n + 1):
+        text = f"message {i}"
+        done = loop.create_future()
+        answered[text] = done
+        start = perf_counter()
+        api.push(CHAT_ID, text)
+        await asyncio.wait_for(done, 10)
+        if i:  # the first message warms up connections
+            latencies.append(perf_counter() - start)
+        await asyncio.sleep(GAP)
+    return latencies
+
+
+async def run_mode(mode: str, api: FakeBotAPI, answered: dict, n: int) -> list[float]:
+    app: Application = ApplicationBuilder().token("123456:fake") \
+                                           .base_url(api.base_url) \
+                                           .build()
+    app.add_handler(MessageHandler(filters.TEXT, answer))
+    async with app:
+        await app.start()
+        if mode == "webhook":
+            port = free_port()
+            url = f"http://127.0.0.1:{port}/telegram"
+            await app.updater.start_webhook(listen="127.0.0.1", port=port,
+                                            url_path="telegram",
+                                            webhook_url=url,
+                                            secret_token=SECRET)
+            status = await asyncio.to_thread(post_without_secret, url)
+            print(f"webhook: request without secret token -> HTTP {status}")
+        else:
+            await app.updater.start_polling(timeout=10)
+        try:
+            return await measure(api, answered, n)
+        finally:
+            await app.updater.stop()
+            await app.stop()
+
+
+def report(mode: str, latencies: list[float], requests: int):
+    ms = sorted(x * 1000 for x in latencies)
+    p95 = ms[int(len(ms) * 0.95) - 1] if len(ms) >= 20 else ms[-1]
+    print(f"{mode:>8}: mean {statistics.mean(ms):6.2f} ms"
+          f"  median {statistics.median(ms):6.2f} ms"
+          f"  p95 {p95:6.2f} ms  max {ms[-1]:6.2f} ms"
+          f"  Bot API requests {requests}")
+
+
+async def main(n: int, rtt: float):
+    loop = asyncio.get_running_loop()
+    answered: dict[str, asyncio.Future] = {}
+
+    def on_send(chat_id: int, text: str):
+        future = answered.pop(text, None)
+        if future is not None:
+            loop.call_soon_threadsafe(future.set_result, None)
+
+    api = FakeBotAPI(on_send, rtt)
+    api.start()
+    try:
+        results, requests = {}, {}
+        for mode in ("polling", "webhook"):
+            before = sum(api.calls.values())
+            results[mode] = await run_mode(mode, api, answered, n)
+            requests[mode] = sum(api.calls.values()) - before
+    finally:
+        api.stop()
+    print(f"{n} messages, rtt {rtt * 1000:.0f} ms, push -> answer received by the Bot API")
+    for mode, latencies in results.items():
+        report(mode, latencies, requests[mode])
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    rtt = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0
+    asyncio.run(main(n, rtt))
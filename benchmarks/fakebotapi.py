@@ -0,0 +1,186 @@
+"""Local stand-in for the Telegram Bot API.
+
+Serves the few methods the bot needs (getMe, getUpdates, setWebhook,
+deleteWebhook, sendMessage) on 127.0.0.1. Updates are put with `push`
+and delivered either to a pending getUpdates call or, when a webhook is
+set, posted to the webhook url with the secret token header.
+`rtt` (seconds) delays every answer and webhook post to imitate the
+network between the bot and Telegram.
+Use it with `ApplicationBuilder().base_url(api.base_url)`.
+"""
+import json
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, sleep, time
+from urllib.parse import parse_qsl
+
+BOT = {
+    "id": 123456,
+    "is_bot": True,
+    "first_name": "Fake",
+    "username": "fake_bot",
+    "can_join_groups": False,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+
+class FakeBotAPI:
+    def __init__(self, on_send=None, rtt: float = 0):
+        """`on_send(chat_id, text)` is called for every sendMessage"""
+        self._on_send = on_send
+        self._rtt = rtt
+        self._updates: list[dict] = []
+        self._next_update = 1
+        self._next_message = 1
+        self._new_update = threading.Condition()
+        self._webhook: dict | None = None
+        self.calls: dict[str, int] = {}
+        # method -> monotonic time of its first call
+        self.first_calls: dict[str, float] = {}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/bot"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self._new_update:
+            self._new_update.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def push(self, chat_id: int, text: str) -> int:
+        """Add a text message update, returns its id"""
+        with self._new_update:
+            update_id = self._next_update
+            self._next_update += 1
+            update = {"update_id": update_id,
+                      "message": self._message(chat_id, text, user=True)}
+            webhook = self._webhook
+            if webhook is None:
+                self._updates.append(update)
+                self._new_update.notify_all()
+        if webhook is not None:
+            threading.Thread(target=self._post, args=(webhook, update),
+                             daemon=True).start()
+        return update_id
+
+    def _post(self, webhook: dict, update: dict):
+        sleep(self._rtt / 2)
+        request = urllib.request.Request(
+            webhook["url"],
+            data=json.dumps(update).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        if webhook.get("secret_token"):
+            request.add_header("X-Telegram-Bot-Api-Secret-Token",
+                               webhook["secret_token"])
+        urllib.request.urlopen(request, timeout=10).read()
+
+    def _message(self, chat_id: int, text: str, user: bool = False) -> dict:
+        self._next_message += 1
+        message = {
+            "message_id": self._next_message,
+            "date": int(time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": text,
+        }
+        if user:
+            message["from"] = {"id": chat_id, "is_bot": False,
+                               "first_name": "User"}
+            if text.startswith("/"):
+                command = text.split()[0]
+                message["entities"] = [{"type": "bot_command", "offset": 0,
+                                        "length": len(command)}]
+        return message
+
+    def _get_updates(self, params: dict) -> list[dict]:
+        offset = int(params.get("offset") or 0)
+        deadline = monotonic() + float(params.get("timeout") or 0)
+        with self._new_update:
+            self._updates = [u for u in self._updates
+                             if u["update_id"] >= offset]
+            while not self._updates and monotonic() < deadline:
+                self._new_update.wait(deadline - monotonic())
+            return list(self._updates)
+
+    def _call(self, method: str, params: dict):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        self.first_calls.setdefault(method, monotonic())
+        match method:
+            case "getMe":
+                return BOT
+            case "getUpdates":
+                return self._get_updates(params)
+            case "setWebhook":
+                with self._new_update:
+                    self._webhook = params
+                return True
+            case "deleteWebhook":
+                with self._new_update:
+                    self._webhook = None
+                return True
+            case "getWebhookInfo":
+                webhook = self._webhook or {}
+                return {"url": webhook.get("url", ""),
+                        "has_custom_certificate": False,
+                        "pending_update_count": len(self._updates)}
+            case "sendMessage":
+                chat_id, text = int(params["chat_id"]), params["text"]
+                if self._on_send:
+                    self._on_send(chat_id, text)
+                with self._new_update:
+                    return self._message(chat_id, text)
+            case "close" | "logOut":
+                return True
+        return None
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                sleep(api._rtt / 2)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode()
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    params = json.loads(body or "{}")
+                else:
+                    params = {}
+                    for key, value in parse_qsl(body):
+                        try:
+                            params[key] = json.loads(value)
+                        except ValueError:
+                            params[key] = value
+                method = self.path.rsplit("/", 1)[-1]
+                result = api._call(method, params)
+                if result is None:
+                    status, answer = 404, {"ok": False, "error_code": 404,
+                                           "description": "Not Found"}
+                else:
+                    status, answer = 200, {"ok": True, "result": result}
+                data = json.dumps(answer).encode()
+                sleep(api._rtt / 2)
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass    # the bot is stopped during a long poll
+
+            do_GET = do_POST
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
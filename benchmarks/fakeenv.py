@@ -0,0 +1,14 @@
+"""Fake configuration, so benchmarks do not need real tokens.
+Import this module before anything from the bot.
+"""
+import os
+
+os.environ["ENV_FILE"] = os.devnull
+os.environ.setdefault("BOT_TOKEN", "123456:fake")
+os.environ.setdefault("TG_CHAT_ID", "1")
+for var in ("INTEGRATION_TOKEN",
+            "INBOX_DATABASE_ID",
+            "CALENDAR_DATABASE_ID",
+            "CURRENT_TASKS_ID",
+            "UNI_SCHEDULE_ID"):
+    os.environ.setdefault(var, var.lower())
@@ -0,0 +1,323 @@
+"""Local stand-in for the Notion API.
+
+Keeps the four databases of the bot in memory and serves the few
+endpoints the bot uses (database query with pagination and the
+filters of `mynotion.Notion`, page create/update, users/me) on
+127.0.0.1. Pages are kept serialized, so 100k pages per database
+fit in a few hundred megabytes. `rtt` (seconds) delays every answer
+to imitate the network.
+
+Run it in a separate process, so it does not share the CPU and the
+memory with the measured code:
+    python -m benchmarks.fakenotion [n_pages] [rtt_ms]
+prints its url and serves until stdin is closed. `spawn` does that
+from a benchmark. Use the url as `NOTION_API_URL`.
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from uuid import UUID
+
+from benchmarks import fakeenv  # noqa: F401
+
+MAX_PAGE_SIZE = 100
+BOT_USER = {"object": "user", "id": "00000000-0000-4000-8000-000000000001",
+            "type": "bot", "name": "Fake", "bot": {}}
+
+
+@dataclass(slots=True)
+class _Page:
+    id: str
+    database_id: str
+    created: str
+    edited: str
+    # start of the `Date` property (calendar only)
+    start: str | None
+    archived: bool
+    # page object without `archived`, serialized
+    data: bytes
+
+    def json(self) -> bytes:
+        archived = b'true' if self.archived else b'false'
+        return self.data[:-1] + b', "archived": ' + archived + b'}'
+
+
+class FakeNotion:
+    """Databases and request handling, without HTTP"""
+
+    def __init__(self) -> None:
+        self._pages: dict[str, _Page] = {}
+        # database id -> ids of its pages in creation order
+        self._databases: dict[str, list[str]] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self.calls: dict[str, int] = {}
+
+    def seed(self, n_pages: int, today: date | None = None):
+        """Fill every database of the bot with `n_pages` pages.
+        About 5% of calendar events are in the past.
+        """
+        today = today or date.today()
+        created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        first = datetime.combine(today, datetime.min.time()) \
+                    - timedelta(hours=7 * (n_pages // 20))
+        weekdays = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб"]
+        weeks = ["Четная", "Нечетная", "Каждая"]
+        for i in range(n_pages):
+            when = created + timedelta(minutes=i)
+            begin = first + timedelta(hours=7 * i)
+            end = begin + timedelta(hours=2) if i % 3 else None
+            self.add_page(os.environ["CALENDAR_DATABASE_ID"], {
+                "Name": _title(f"event number {i}"),
+                "Date": {"type": "date", "date": {
+                    "start": begin.isoformat() + "+03:00",
+                    "end": end.isoformat() + "+03:00" if end else None,
+                }},
+            }, when)
+            self.add_page(os.environ["CURRENT_TASKS_ID"],
+                          {"Name": _title(f"current task {i}")}, when)
+            self.add_page(os.environ["INBOX_DATABASE_ID"],
+                          {"Name": _title(f"inbox task {i}")}, when)
+            self.add_page(os.environ["UNI_SCHEDULE_ID"], {
+                "Предмет": _title(f"subject {i % 40}"),
+                "Преподаватель": _text(f"lecturer {i % 25}"),
+                "Кабинет": _text(f"{100 + i % 300}"),
+                "Пара": {"type": "number", "number": i % 6 + 1},
+                "День недели": _select(weekdays[i // 6 % 6]),
+                "Неделя": _select(weeks[i // 36 % 3]),
+            }, when)
+
+    def add_page(self, database_id: str, properties: dict,
+                 created: datetime | None = None) -> _Page:
+        with self._lock:
+            page_id = str(UUID(int=self._next_id))
+            self._next_id += 1
+        created = created or datetime.now(timezone.utc)
+        # Notion rounds `last_edited_time` to minutes
+        stamp = created.strftime("%Y-%m-%dT%H:%M:00.000Z")
+        date_prop = properties.get("Date", {}).get("date")
+        page = _Page(page_id, database_id, stamp, stamp,
+                     date_prop["start"] if date_prop else None, False, b"")
+        self._serialize(page, properties)
+        self._pages[page_id] = page
+        self._databases.setdefault(database_id, []).append(page_id)
+        return page
+
+    def _serialize(self, page: _Page, properties: dict):
+        page.data = json.dumps({
+            "object": "page",
+            "id": page.id,
+            "created_time": page.created,
+            "last_edited_time": page.edited,
+            "in_trash": False,
+            "parent": {"type": "database_id",
+                       "database_id": page.database_id},
+            "url": f"https://www.notion.so/{page.id.replace('-', '')}",
+            "properties": properties,
+        }, ensure_ascii=False).encode()
+
+    def handle(self, method: str, path: str,
+               body: dict) -> tuple[int, bytes]:
+        parts = path.strip("/").split("/")
+        if parts and parts[0] == "v1":
+            parts = parts[1:]
+        key = f"{method} {parts[0] if parts else ''}"
+        self.calls[key] = self.calls.get(key, 0) + 1
+        match method, parts:
+            case "POST", ["databases", database_id, "query"]:
+                return 200, self._query(database_id, body)
+            case "POST", ["pages"]:
+                page = self.add_page(body["parent"]["database_id"],
+                                     _plain_titles(body["properties"]))
+                return 200, page.json()
+            case "PATCH", ["pages", page_id]:
+                return self._update(page_id, body)
+            case "GET", ["users", "me"]:
+                return 200, json.dumps(BOT_USER).encode()
+        return _error(404, "invalid_request_url", f"{method} {path}")
+
+    def _query(self, database_id: str, body: dict) -> bytes:
+        ids = self._databases.get(database_id, [])
+        start = int(body.get("start_cursor") or 0)
+        size = min(int(body.get("page_size") or MAX_PAGE_SIZE), MAX_PAGE_SIZE)
+        check = _filter(body.get("filter"))
+        results = []
+        i = start
+        while i < len(ids) and len(results) < size:
+            page = self._pages[ids[i]]
+            if not page.archived and check(page):
+                results.append(page.json())
+            i += 1
+        has_more = i < len(ids)
+        return (b'{"object": "list", "results": [' + b", ".join(results)
+                + b'], "next_cursor": '
+                + (f'"{i}"'.encode() if has_more else b"null")
+                + b', "has_more": ' + (b"true" if has_more else b"false")
+                + b', "type": "page_or_database", "page_or_database": {}}')
+
+    def _update(self, page_id: str, body: dict) -> tuple[int, bytes]:
+        try:
+            page = self._pages.get(str(UUID(page_id)))
+        except ValueError:
+            page = None
+        if page is None:
+            return _error(404, "object_not_found", f"page {page_id}")
+        if "archived" in body:
+            page.archived = bool(body["archived"])
+        page.edited = datetime.now(timezone.utc) \
+                              .strftime("%Y-%m-%dT%H:%M:00.000Z")
+        properties = json.loads(page.data)["properties"]
+        properties.update(_plain_titles(body.get("properties", {})))
+        self._serialize(page, properties)
+        return 200, page.json()
+
+
+def _filter(spec: dict | None):
+    """Predicate for the filters used by the bot"""
+    if not spec:
+        return lambda page: True
+    if "and" in spec:
+        checks = [_filter(s) for s in spec["and"]]
+        return lambda page: all(c(page) for c in checks)
+    if "or" in spec:
+        checks = [_filter(s) for s in spec["or"]]
+        return lambda page: any(c(page) for c in checks)
+    if spec.get("timestamp") == "last_edited_time":
+        since = spec["last_edited_time"]["on_or_after"]
+        return lambda page: page.edited >= since
+    if "date" in spec:
+        (op, value), = spec["date"].items()
+        value = value[:10]
+        compare = {
+            "before": lambda d: d < value,
+            "on_or_before": lambda d: d <= value,
+            "after": lambda d: d > value,
+            "on_or_after": lambda d: d >= value,
+            "equals": lambda d: d == value,
+        }[op]
+        return lambda page: page.start is not None and compare(page.start[:10])
+    raise ValueError(f"unsupported filter {spec}")
+
+
+def _title(text: str) -> dict:
+    return {"type": "title", "title": [{"type": "text", "plain_text": text,
+                                        "text": {"content": text}}]}
+
+
+def _text(text: str) -> dict:
+    return {"type": "rich_text", "rich_text": [{"type": "text",
+                                                "plain_text": text,
+                                                "text": {"content": text}}]}
+
+
+def _select(name: str) -> dict:
+    return {"type": "select", "select": {"name": name}}
+
+
+def _plain_titles(properties: dict) -> dict:
+    """Add `plain_text` to title items sent by the bot, as Notion does"""
+    for prop in properties.values():
+        for item in prop.get("title", ()):
+            item.setdefault("plain_text", item["text"]["content"])
+    return properties
+
+
+def _error(status: int, code: str, message: str) -> tuple[int, bytes]:
+    return status, json.dumps({"object": "error", "status": status,
+                               "code": code, "message": message}).encode()
+
+
+class FakeNotionAPI:
+    """`FakeNotion` served over HTTP"""
+
+    def __init__(self, notion: FakeNotion, rtt: float = 0):
+        self.notion = notion
+        self._rtt = rtt
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive, as api.notion.com
+            # headers and body are written separately, without this
+            # every answer waits for delayed ACK of the client
+            disable_nagle_algorithm = True
+
+            def _answer(self):
+                sleep(api._rtt / 2)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                path = self.path.split("?", 1)[0]
+                status, data = api.notion.handle(self.command, path, body)
+                sleep(api._rtt / 2)
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            do_GET = do_POST = do_PATCH = _answer
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@contextmanager
+def spawn(n_pages: int, rtt: float = 0):
+    """Run seeded fake Notion in a child process, yield its url"""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fakenotion",
+         str(n_pages), str(rtt * 1000)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        url = server.stdout.readline().strip()
+        if not url:
+            raise RuntimeError("fake Notion did not start")
+        yield url
+    finally:
+        server.stdin.close()
+        server.wait()
+
+
+def main(n_pages: int, rtt_ms: float):
+    notion = FakeNotion()
+    notion.seed(n_pages)
+    api = FakeNotionAPI(notion, rtt_ms / 1000)
+    api.start()
+    print(api.base_url, flush=True)
+    # serve until the parent closes stdin
+    sys.stdin.read()
+    api.stop()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 0)
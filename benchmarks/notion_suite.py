@@ -0,0 +1,134 @@
+"""Notion reads and plugin actions against a seeded local Notion.
+
+Every database gets `n_pages` pages in `benchmarks.fakenotion`, which
+runs in a child process. Cases run in order in one bot process, like
+the bot would do them: the first call of a dataset does a full sync
+("cold"), the next one after `invalidate_cache` syncs incrementally
+("warm"). Cleanup archives past events (about 5% of the calendar)
+and ingestion spools `n_messages` inbox messages and waits until
+all of them are in Notion.
+
+Reported for each case: wall time, number of Notion requests (from
+`metrics`) and peak of memory allocated by the case (tracemalloc,
+`--no-memory` turns it off, tracing makes everything slower).
+The Notion rate limit is lifted, so the numbers show the bot's own
+cost; request count shows what real Notion would have to serve.
+
+Run from the project root:
+    python -m benchmarks.notion_suite [n_pages] [--rtt ms]
+                                      [--messages n] [--no-memory]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from datetime import date
+from time import perf_counter
+
+from benchmarks import fakeenv  # noqa: F401
+from benchmarks.fakenotion import spawn
+
+
+async def measure(name: str, case: Callable[[], Awaitable],
+                  memory: bool) -> dict:
+    from metrics import metrics
+
+    def requests() -> int:
+        return sum(h.count for h in
+                   metrics.series("bot_notion_request").values())
+
+    before = requests()
+    if memory:
+        tracemalloc.start()
+    started = perf_counter()
+    await case()
+    elapsed = perf_counter() - started
+    peak = 0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {"case": name, "time": elapsed,
+            "requests": requests() - before, "peak": peak}
+
+
+async def run_cases(n_messages: int, memory: bool) -> list[dict]:
+    # the url of fake Notion must be in the environment before
+    # config is imported
+    import config
+    # the bot's own cost is measured, Notion limits are not imitated
+    config.NOTION_RATE_LIMIT = config.NOTION_RATE_BURST = 1_000_000
+    from mynotion import Notion
+    from inbox import InboxSpool, InboxDrainer, InboxIngest
+    from tenants import tenants
+    from extension.plugins.moriningsummary_plugin import MorningSummary
+    from extension.plugins.cleanup_plugin import CalenarCleanupPlugin
+
+    notion = Notion()
+    morning = MorningSummary()
+    cleanup = CalenarCleanupPlugin()
+
+    async def warm(call: Callable[[], Awaitable]):
+        notion.invalidate_cache()
+        await call()
+
+    async def ingest_messages():
+        async def notify(chat_id: int, text: str):
+            pass
+        spool = InboxSpool()
+        drainer = InboxDrainer(spool, notion, notify)
+        ingest = InboxIngest(spool, drainer, notify)
+        drainer.start()
+        chat_id = next(iter(tenants)).chat_id
+        for i in range(n_messages):
+            ingest.submit(chat_id, i, f"benchmark message {i}")
+        while spool.depth:
+            await asyncio.sleep(0.01)
+        await ingest.stop()
+        await drainer.stop()
+
+    calendar = notion.get_calendar_events
+    tasks = notion.get_current_tasks
+    schedule = lambda: notion.uni_daily_schedule(date.today(), False)
+    cases = [
+        ("get_calendar_events cold", calendar),
+        ("get_calendar_events warm", lambda: warm(calendar)),
+        ("get_current_tasks cold", tasks),
+        ("get_current_tasks warm", lambda: warm(tasks)),
+        ("uni_daily_schedule cold", schedule),
+        ("uni_daily_schedule warm", lambda: warm(schedule)),
+        ("morning_message", morning.morning_message),
+        ("morning_message warm", lambda: warm(morning.morning_message)),
+        ("remove_past_events", cleanup.remove_past_events),
+        (f"ingest {n_messages} messages", ingest_messages),
+    ]
+    return [await measure(name, case, memory) for name, case in cases]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.notion_suite")
+    parser.add_argument("n_pages", type=int, nargs="?", default=10_000,
+                        help="pages in every database (default: 10000)")
+    parser.add_argument("--rtt", type=float, default=0,
+                        help="round trip to Notion, ms (default: 0)")
+    parser.add_argument("--messages", type=int, default=500,
+                        help="inbox messages to ingest (default: 500)")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="do not trace memory allocations")
+    args = parser.parse_args()
+    with (spawn(args.n_pages, args.rtt / 1000) as url,
+          tempfile.TemporaryDirectory() as data_dir):
+        os.environ["NOTION_API_URL"] = url
+        # saved mirrors of previous runs must not be restored
+        os.environ["DATA_DIR"] = data_dir
+        results = asyncio.run(run_cases(args.messages, not args.no_memory))
+    print(f"{args.n_pages} pages per database, rtt {args.rtt:g} ms")
+    print(f"{'':28} {'time, s':>8} {'requests':>9} {'peak, MiB':>10}")
+    for row in results:
+        peak = f"{row['peak'] / 2**20:10.1f}" if row["peak"] else f"{'-':>10}"
+        print(f"{row['case']:28} {row['time']:8.3f} {row['requests']:9} {peak}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,47 @@
 #!/usr/bin/env python
+import asyncio
 import logging
-from asyncio import sleep
+from datetime import datetime, timedelta
+import signal
+import sys
 
 from telegram import Update
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     ContextTypes,
     MessageHandler,
     filters,
     Defaults,
 )
-from notion_client import APIErrorCode, APIResponseError
 
+from cluster import (
+    ClusterApplication, ClusterNode, LeaderLock, UpdateQueue, run_workers
+)
 from extension import ExtensionLoader
-from mynotion import Notion
-from tools import protect_for_html, validate_user
+from inbox import InboxSpool, InboxDrainer, InboxIngest
+from metrics import MetricsExporter, metrics
+from mynotion import Notion, NotionPool
+from outbox import SendQueue
+from tenants import tenants, as_tenant
+from tools import validate_user
 from config import (
     BOT_TOKEN,
-    TRY_SEND_LIMIT,
-    TRY_SEND_INIT_DELAY,
+    BOT_API_URL,
     TIMEZONE,
+    DELIVERY_MODE,
+    WEBHOOK_URL,
+    WEBHOOK_SECRET,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    NOTION_REPLICA_REFRESH_INTERVAL,
+    WORKERS,
+    WORKER_INDEX,
+    SPOOL_POLL_INTERVAL,
+    NOTION_PREWARM_LEAD,
 )
 
-UNAVAILABLE_ERR = "Service Unavailable Err, request will be send again later"
-RATE_ERR = "Rate Limited Err, request will be send again later"
-CANNOTSEND_MSG = "Cannot send a message"
-
 
 logging.basicConfig(
         format='%(asctime)s %(levelname)s %(name)s - %(message)s',
@@ -34,48 +50,165 @@ logging.basicConfig(
 )
 
 nnotion: Notion
+spool: InboxSpool
+drainer: InboxDrainer
+ingest: InboxIngest
+outbox: SendQueue
+exporter: MetricsExporter
+extensions: ExtensionLoader
+# next event time, for which Notion connections are opened
+prewarmed_for: datetime | None = None
 
 @validate_user
 async def add_to_inbox(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-    timing = TRY_SEND_INIT_DELAY
-    for _ in range(TRY_SEND_LIMIT):
-        try:
-            task_text = update.effective_message.text
-            safe_text = protect_for_html(task_text)
-            await nnotion.create_page_in_inbox(task_text)
-            await update.effective_message.reply_text("added to Notion")
-            break
-        except APIResponseError as notion_err:
-            if notion_err.code == APIErrorCode.ServiceUnavailable:
-                await context.bot.send_message(chat_id,
-                                               f"{UNAVAILABLE_ERR}: {safe_text}")
-            elif notion_err.code == APIErrorCode.RateLimited:
-                await context.bot.send_message(chat_id,
-                                               f"{RATE_ERR}: {safe_text}")
-            else:
-                raise notion_err
-            timing *= 2
-            await sleep(timing)
+    message = update.effective_message
+    ingest.submit(update.effective_chat.id, message.message_id, message.text)
+
+async def start_background_tasks(app: Application):
+    global drainer, ingest
+    outbox.start()
+    # in multi-process mode messages are spooled by all workers
+    drainer = InboxDrainer(spool, nnotion, outbox.send,
+                           poll=SPOOL_POLL_INTERVAL if WORKERS else None)
+    ingest = InboxIngest(spool, drainer, outbox.send)
+    await exporter.start()
+    if WORKER_INDEX is None:
+        await lead(app)
+
+async def lead(app: Application):
+    """Start the work done by one process: sending the inbox
+    to Notion and refreshing saved mirrors
+    """
+    drainer.start()
+    # saved mirrors answer read commands when Notion is unavailable
+    app.job_queue.run_repeating(refresh_notion_replica,
+                                interval=NOTION_REPLICA_REFRESH_INTERVAL,
+                                first=60,
+                                name="NotionReplica")
+    if NOTION_PREWARM_LEAD:
+        app.job_queue.run_repeating(prewarm_notion,
+                                    interval=NOTION_PREWARM_LEAD / 3,
+                                    name="NotionPrewarm")
+
+async def stop_background_tasks(app: Application):
+    await ingest.stop()
+    await drainer.stop()
+    await outbox.stop()
+    await exporter.stop()
+    await NotionPool().aclose()
+
+async def refresh_notion_replica(context: ContextTypes.DEFAULT_TYPE):
+    # workspaces have own rate limits, so they are synced one by one
+    # to spread the load on the shared connection pool
+    for tenant in tenants:
+        with as_tenant(tenant):
+            await nnotion.sync_all()
+
+async def prewarm_notion(context: ContextTypes.DEFAULT_TYPE):
+    """Open connections to Notion shortly before scheduled events,
+    which often fire together (e.g. morning messages of all tenants)
+    """
+    global prewarmed_for
+    next_fire = extensions.scheduler.next_fire()
+    if next_fire is None or next_fire == prewarmed_for:
+        return
+    if next_fire - datetime.now(TIMEZONE) <= timedelta(seconds=NOTION_PREWARM_LEAD):
+        prewarmed_for = next_fire
+        await NotionPool().prewarm()
+
+def run(app: Application):
+    """Receive updates in `DELIVERY_MODE`.
+    `run_webhook` registers the webhook, `run_polling` deletes it, so
+    the mode is switched by restart. Pending updates are not dropped.
+    """
+    if DELIVERY_MODE == "webhook":
+        logging.info(f"Receiving updates with webhook on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}")
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            drop_pending_updates=False,
+        )
+    else:
+        logging.info("Receiving updates with polling")
+        app.run_polling(drop_pending_updates=False)
+
+async def become_leader(app: Application):
+    """Take the work of the leader in multi-process mode:
+    scheduled events, the inbox drainer and receiving updates
+    """
+    extensions.start_jobs()
+    await lead(app)
+    if DELIVERY_MODE == "webhook":
+        logging.info(f"Receiving updates with webhook on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}")
+        await app.updater.start_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            drop_pending_updates=False,
+        )
     else:
-        logging.error(f'{CANNOTSEND_MSG}: {safe_text}')
-        await context.bot.send_message(chat_id,
-                                       f'{CANNOTSEND_MSG}: {safe_text}')
+        logging.info("Receiving updates with polling")
+        await app.updater.start_polling(drop_pending_updates=False)
+
+async def run_worker(app: Application):
+    """Run worker of multi-process mode until SIGINT or SIGTERM"""
+    node = ClusterNode(app, UpdateQueue(), LeaderLock(),
+                       pinned=extensions.is_pinned,
+                       on_elected=become_leader)
+    # received updates go to the queue before any handler
+    app.add_handler(node.handler(), group=-1)
+    work = asyncio.current_task()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(sig, work.cancel)
+    async with app:
+        await start_background_tasks(app)
+        await app.start()
+        try:
+            await node.run()
+        except asyncio.CancelledError:
+            logging.info(f"Worker {WORKER_INDEX} is stopping")
+        finally:
+            if app.updater.running:
+                await app.updater.stop()
+            await app.stop()
+            await stop_background_tasks(app)
 
 if __name__ == "__main__":
     logging.getLogger('httpx').setLevel(logging.WARNING)
 
+    if WORKERS and WORKER_INDEX is None:
+        # this process only starts and watches the workers
+        run_workers(WORKERS, sys.argv)
+        sys.exit()
+
     nnotion = Notion()
+    spool = InboxSpool()
+    exporter = MetricsExporter(metrics)
 
     defaults = Defaults(tzinfo=TIMEZONE, parse_mode='HTML')
-    app = ApplicationBuilder().token(BOT_TOKEN) \
-                              .defaults(defaults) \
-                              .build()
+    builder = ApplicationBuilder().token(BOT_TOKEN) \
+                                  .base_url(BOT_API_URL) \
+                                  .defaults(defaults) \
+                                  .post_init(start_background_tasks) \
+                                  .post_shutdown(stop_background_tasks)
+    if WORKER_INDEX is not None:
+        # the worker waits for handlers of an update to mark it done
+        builder = builder.application_class(ClusterApplication)
+    app = builder.build()
+    outbox = SendQueue(app.bot)
 
-    extensions = ExtensionLoader()
-    extensions.load(app)
+    extensions = ExtensionLoader(outbox)
+    # in multi-process mode events are run by the leader
+    extensions.load(app, jobs=WORKER_INDEX is None)
 
     app.add_handler(MessageHandler(filters.TEXT, add_to_inbox, block=False))
 
-    app.run_polling()
-
+    if WORKER_INDEX is None:
+        run(app)
+    else:
+        asyncio.run(run_worker(app))
@@ -0,0 +1,12 @@
+from .workqueue import UpdateQueue
+from .leader import LeaderLock
+from .node import ClusterApplication, ClusterNode
+from .supervisor import run_workers
+
+__all__ = [
+    "UpdateQueue",
+    "LeaderLock",
+    "ClusterApplication",
+    "ClusterNode",
+    "run_workers",
+]
@@ -0,0 +1,54 @@
+from __future__ import annotations
+import fcntl
+import os
+from pathlib import Path
+from typing import TextIO
+
+from config import LEADER_LOCK_PATH
+
+
+class LeaderLock:
+    """Exclusive lock on a file, which makes its holder the leader.
+
+    The lock is released by the system when the process exits
+    (or dies), then one of the other workers takes it.
+    The file contains pid of the leader.
+    """
+    __slots__ = (
+        "_path",
+        "_file",
+    )
+    _path: Path
+    _file: TextIO | None
+
+    def __init__(self, path: str = LEADER_LOCK_PATH) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def try_acquire(self) -> bool:
+        """Take the lock if it is free, return `True` if it is held"""
+        if self._file is not None:
+            return True
+        file = open(self._path, "a+")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return False
+        file.seek(0)
+        file.truncate()
+        file.write(f"{os.getpid()}\n")
+        file.flush()
+        self._file = file
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
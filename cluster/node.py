@@ -0,0 +1,157 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from time import monotonic
+
+from telegram import Update
+from telegram.ext import (
+    Application,
+    ApplicationHandlerStop,
+    CallbackContext,
+    TypeHandler,
+)
+
+from cluster.leader import LeaderLock
+from cluster.workqueue import UpdateQueue
+from config import LEADER_RETRY_INTERVAL, WORK_POLL_INTERVAL
+
+# updates claimed at once
+WORK_BATCH = 16
+# how often (seconds) the worker tells others it is alive
+HEARTBEAT_INTERVAL = 1
+# how often (seconds) the leader drops handled updates
+PRUNE_INTERVAL = 60
+
+# is the update being processed taken from the queue
+_from_queue: ContextVar[bool] = ContextVar("from_queue", default=False)
+# tasks of non-blocking handlers started for the queued update
+_handler_tasks: ContextVar[list[asyncio.Task] | None] = ContextVar(
+    "handler_tasks", default=None
+)
+
+
+class ClusterApplication(Application):
+    """`Application` which lets `ClusterNode` wait for non-blocking
+    handlers of a queued update (`ApplicationBuilder.application_class`)
+    """
+
+    def create_task(self, coroutine, update: object | None = None, *,
+                    name: str | None = None) -> asyncio.Task:
+        task = super().create_task(coroutine, update, name=name)
+        tasks = _handler_tasks.get()
+        if tasks is not None and update is not None:
+            tasks.append(task)
+        return task
+
+
+class ClusterNode:
+    """Worker process of the multi-process mode.
+
+    Every worker handles updates from the `UpdateQueue`. The worker
+    which holds the `LeaderLock` also receives updates from Telegram:
+    `handler` puts them into the queue instead of handling them.
+    Other workers try to take the lock every `LEADER_RETRY_INTERVAL`
+    seconds, so the leader is replaced when it dies.
+    An update is marked done after all its handlers finish, so updates
+    of a worker which dies meanwhile are handled by another one.
+    """
+    __slots__ = (
+        "_app",
+        "_queue",
+        "_lock",
+        "_pinned",
+        "_on_elected",
+        "_finishing",
+    )
+    _app: Application
+    _queue: UpdateQueue
+    _lock: LeaderLock
+    # is the update for the leader only
+    _pinned: Callable[[Update], bool]
+    # starts the work of the leader
+    _on_elected: Callable[[Application], Awaitable]
+    # tasks which mark updates done after their non-blocking handlers
+    _finishing: set[asyncio.Task]
+
+    def __init__(self, app: ClusterApplication, queue: UpdateQueue,
+                 lock: LeaderLock, pinned: Callable[[Update], bool],
+                 on_elected: Callable[[Application], Awaitable]) -> None:
+        if not isinstance(app, ClusterApplication):
+            raise TypeError("ClusterNode needs the application built "
+                            "with `application_class(ClusterApplication)`")
+        self._app = app
+        self._queue = queue
+        self._lock = lock
+        self._pinned = pinned
+        self._on_elected = on_elected
+        self._finishing = set()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock.held
+
+    def handler(self) -> TypeHandler:
+        """Handler for the first group, which queues received updates"""
+        return TypeHandler(Update, self._enqueue)
+
+    async def _enqueue(self, update: Update, context: CallbackContext):
+        if _from_queue.get():
+            return      # go on to the other handlers
+        chat = update.effective_chat
+        self._queue.put(update.update_id, chat.id if chat else 0,
+                        json.dumps(update.to_dict()), self._pinned(update))
+        raise ApplicationHandlerStop
+
+    async def run(self):
+        """Handle queued updates and take part in leader election
+        until cancelled
+        """
+        next_beat = next_election = next_prune = 0.0
+        while True:
+            now = monotonic()
+            if now >= next_beat:
+                self._queue.heartbeat()
+                next_beat = now + HEARTBEAT_INTERVAL
+            if not self.is_leader and now >= next_election:
+                next_election = now + LEADER_RETRY_INTERVAL
+                if self._lock.try_acquire():
+                    logging.info("Cluster: this worker is the leader now")
+                    await self._on_elected(self._app)
+            if self.is_leader and now >= next_prune:
+                self._queue.prune()
+                next_prune = now + PRUNE_INTERVAL
+            claimed = self._queue.claim(WORK_BATCH, self.is_leader)
+            if not claimed:
+                await asyncio.sleep(WORK_POLL_INTERVAL)
+                continue
+            for update_id, data in claimed:
+                await self._process(update_id, data)
+
+    async def _process(self, update_id: int, data: str):
+        tasks = []
+        token = _from_queue.set(True)
+        tasks_token = _handler_tasks.set(tasks)
+        try:
+            update = Update.de_json(json.loads(data), self._app.bot)
+            # slow handlers are not blocking (`block=False`),
+            # they go on in background
+            await self._app.process_update(update)
+        except Exception:
+            logging.exception(f"Cluster: cannot process update {update_id}")
+        finally:
+            _handler_tasks.reset(tasks_token)
+            _from_queue.reset(token)
+        if not tasks:
+            self._queue.done(update_id)
+            return
+        finishing = asyncio.create_task(self._done_after(update_id, tasks))
+        self._finishing.add(finishing)
+        finishing.add_done_callback(self._finishing.discard)
+
+    async def _done_after(self, update_id: int, tasks: list[asyncio.Task]):
+        # errors of handlers are already passed to the error handlers
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._queue.done(update_id)
@@ -0,0 +1,58 @@
+from __future__ import annotations
+import logging
+import os
+import signal
+import subprocess
+import sys
+from time import monotonic, sleep
+
+# a worker which exited is started again after this time (seconds)
+RESTART_DELAY = 5
+# workers which do not stop within this time (seconds) are killed
+STOP_TIMEOUT = 30
+
+
+def run_workers(n_workers: int, argv: list[str]):
+    """Run `n_workers` copies of the bot (`python <argv>`) with
+    `BOT_WORKER_INDEX` set, start again the ones which exit.
+    Return after SIGINT or SIGTERM, when the workers are stopped.
+    """
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    def start(index: int) -> subprocess.Popen:
+        env = {**os.environ, "BOT_WORKER_INDEX": str(index)}
+        return subprocess.Popen([sys.executable, *argv], env=env)
+
+    workers = {i: start(i) for i in range(n_workers)}
+    # worker index -> when to start it again
+    restarts: dict[int, float] = {}
+    logging.info(f"Cluster: started {n_workers} workers")
+    while not stopping:
+        now = monotonic()
+        for index, worker in workers.items():
+            if index in restarts:
+                if now >= restarts[index]:
+                    del restarts[index]
+                    workers[index] = start(index)
+            elif (code := worker.poll()) is not None:
+                logging.warning(f"Cluster: worker {index} exited with "
+                                f"code {code}, restarting it in "
+                                f"{RESTART_DELAY} s")
+                restarts[index] = now + RESTART_DELAY
+        sleep(0.5)
+    for worker in workers.values():
+        if worker.poll() is None:
+            worker.terminate()
+    for worker in workers.values():
+        try:
+            worker.wait(STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            worker.kill()
+    logging.info("Cluster: workers are stopped")
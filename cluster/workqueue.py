@@ -0,0 +1,138 @@
+from __future__ import annotations
+import os
+import sqlite3
+from pathlib import Path
+from time import time
+
+from config import WORK_QUEUE_PATH, WORK_LEASE, WORK_CHAT_AFFINITY
+
+# worker which has not called `heartbeat` for this time (seconds)
+# is considered dead, its chats go to other workers
+WORKER_TIMEOUT = 10
+
+
+class UpdateQueue:
+    """Telegram updates shared by the worker processes in SQLite.
+
+    The leader puts received updates, every worker (the leader too)
+    claims them in the order of update ids. Updates of a chat stick
+    to the worker which took the previous not pinned one, while that
+    worker is alive and the chat was active within `WORK_CHAT_AFFINITY`,
+    so they are handled in order and by the same plugin state. `pinned`
+    updates are claimed only by the leader and do not move the chat. Update claimed by a worker
+    which is dead (see `WORKER_TIMEOUT`) and did not mark it done
+    within `WORK_LEASE` is claimed again; updates of live workers
+    are not, even if their handlers run longer.
+    """
+    __slots__ = (
+        "_db",
+        "_worker",
+    )
+    _db: sqlite3.Connection
+    # id of this worker process
+    _worker: int
+
+    def __init__(self, path: str = WORK_QUEUE_PATH,
+                 worker: int | None = None) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS updates ("
+            " id INTEGER PRIMARY KEY,"     # update_id
+            " chat_id INTEGER NOT NULL,"
+            " data TEXT NOT NULL,"
+            " pinned INTEGER NOT NULL DEFAULT 0,"
+            " worker INTEGER,"
+            " claimed_at REAL,"
+            " done INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS updates_chat "
+            "ON updates (chat_id, claimed_at)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS workers ("
+            " id INTEGER PRIMARY KEY,"
+            " seen_at REAL NOT NULL)"
+        )
+        self._worker = os.getpid() if worker is None else worker
+
+    def put(self, update_id: int, chat_id: int, data: str,
+            pinned: bool = False) -> bool:
+        """Add the update. Return `False` if it is already queued
+        (e.g. received again after a change of the leader).
+        """
+        cur = self._db.execute(
+            "INSERT OR IGNORE INTO updates (id, chat_id, data, pinned) "
+            "VALUES (?, ?, ?, ?)", (update_id, chat_id, data, int(pinned))
+        )
+        return cur.rowcount == 1
+
+    def claim(self, limit: int, leader: bool = False) -> list[tuple[int, str]]:
+        """Take up to `limit` updates for this worker,
+        return their ids and data, the earliest first
+        """
+        now = time()
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            rows = self._db.execute(
+                "UPDATE updates SET worker = :me, claimed_at = :now "
+                "WHERE id IN ("
+                " SELECT id FROM updates"
+                " WHERE done = 0"
+                " AND (worker IS NULL OR claimed_at < :lease"
+                "  AND worker NOT IN ("
+                "   SELECT id FROM workers WHERE seen_at > :alive))"
+                " AND pinned <= :leader"
+                " AND (pinned = 1 OR chat_id NOT IN ("
+                # chats whose latest not pinned update is claimed
+                # by another live worker
+                "  SELECT u.chat_id FROM updates u"
+                "  JOIN workers w ON w.id = u.worker"
+                "  WHERE u.pinned = 0 AND u.worker != :me"
+                "  AND u.claimed_at > :affinity AND w.seen_at > :alive"
+                "  AND NOT EXISTS ("
+                "   SELECT 1 FROM updates v"
+                "   WHERE v.chat_id = u.chat_id AND v.pinned = 0"
+                "   AND (v.claimed_at, v.id) > (u.claimed_at, u.id))))"
+                " ORDER BY id LIMIT :limit) "
+                "RETURNING id, data",
+                {"me": self._worker, "now": now, "leader": int(leader),
+                 "lease": now - WORK_LEASE,
+                 "affinity": now - WORK_CHAT_AFFINITY,
+                 "alive": now - WORKER_TIMEOUT, "limit": limit}
+            ).fetchall()
+        return sorted(rows)
+
+    def done(self, update_id: int):
+        # the row is kept for chat affinity until `prune`
+        self._db.execute("UPDATE updates SET done = 1 WHERE id = ?",
+                         (update_id, ))
+
+    def heartbeat(self):
+        """Tell other workers that this one is alive"""
+        self._db.execute(
+            "INSERT OR REPLACE INTO workers (id, seen_at) VALUES (?, ?)",
+            (self._worker, time())
+        )
+
+    def prune(self):
+        """Drop handled updates and workers gone for longer
+        than `WORK_CHAT_AFFINITY`
+        """
+        cutoff = time() - WORK_CHAT_AFFINITY
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM updates "
+                             "WHERE done = 1 AND claimed_at < ?", (cutoff, ))
+            self._db.execute("DELETE FROM workers WHERE seen_at < ?",
+                             (cutoff, ))
+
+    @property
+    def depth(self) -> int:
+        """Number of updates not handled yet"""
+        return self._db.execute(
+            "SELECT COUNT(*) FROM updates WHERE done = 0"
+        ).fetchone()[0]
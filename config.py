@@ -9,36 +9,216 @@ def load_env_var(var_name: str) -> str:
         return value
     raise ValueError(f"{var_name} is not loaded properly")
 
-load_dotenv(override=True)
+# `ENV_FILE` allows to use another env file (e.g. for benchmarks)
+load_dotenv(os.environ.get("ENV_FILE"), override=True)
 
 # set applicatoin timezone
 TIMEZONE = ZoneInfo("Europe/Moscow")
 
+# directory for the bot state (spool, saved events)
+DATA_DIR = os.environ.get("DATA_DIR", "./data")
+
 # plugins directory
 PLUGINS_DIR = "./extension/plugins"
+# plugins with a manifest (`<module>.toml`) are imported on their first
+# command or event, set LAZY_PLUGINS=0 to import all of them at start
+LAZY_PLUGINS = os.environ.get("LAZY_PLUGINS", "1") != "0"
+# user commands run concurrently, but no more than N at once per plugin,
+# others wait for a free slot up to PLUGIN_ACTION_TIMEOUT
+PLUGIN_CONCURRENCY = 2
+# user command is cancelled after this time (seconds)
+PLUGIN_ACTION_TIMEOUT = 60
+# overrides of the values above for some plugins: {"PluginName": value}
+PLUGIN_CONCURRENCY_OVERRIDES: dict[str, int] = {
+    # archiving changes the same pages, do not run it twice at once
+    "InboxManagement": 1,
+    "CalenarCleanup": 1,
+}
+PLUGIN_ACTION_TIMEOUT_OVERRIDES: dict[str, float] = {
+    # bulk archiving of many pages
+    "CalenarCleanup": 180,
+}
+# refresh events of plugins (`AbstractPlugin.refresh_events`) first run
+# this time (seconds) after start, in every worker process
+PLUGIN_REFRESH_DELAY = 10
+# check PLUGINS_DIR every N seconds and reload changed plugin files,
+# 0 disables the watcher (use /reload command instead)
+PLUGINS_WATCH_INTERVAL = 0
+# one-shot and chained plugin events are stored here to survive restarts
+JOB_STORE_PATH = f"{DATA_DIR}/jobs.sqlite3"
+# events missed while the bot was down are run at startup,
+# if they are late less than this time (seconds), older ones are dropped
+JOB_MISFIRE_GRACE = 60 * 60
+
+# multi-process mode: `python bot.py` starts N worker processes, which
+# take updates from a shared queue; one of them (the leader) receives
+# updates from Telegram and runs scheduled events. 0 runs the bot in
+# this process alone
+WORKERS = int(os.environ.get("WORKERS", 0))
+# index of the worker, set by bot.py in worker processes
+WORKER_INDEX = (int(os.environ["BOT_WORKER_INDEX"])
+                if "BOT_WORKER_INDEX" in os.environ else None)
+# updates received by the leader wait here for a worker
+WORK_QUEUE_PATH = f"{DATA_DIR}/work_queue.sqlite3"
+# the worker holding a lock on this file is the leader
+LEADER_LOCK_PATH = f"{DATA_DIR}/leader.lock"
+# followers try to take the lock every N seconds
+LEADER_RETRY_INTERVAL = 5
+# idle workers check the queue every N seconds
+WORK_POLL_INTERVAL = 0.05
+# update claimed by a worker, which died before handling it,
+# is given to another worker after this time (seconds)
+WORK_LEASE = 30
+# updates of a chat go to the same worker while it is alive and
+# the chat is active within this time (seconds), so the plugin state
+# of the chat (e.g. the last random task) stays in one process
+WORK_CHAT_AFFINITY = 30 * 60
+# the leader picks up events saved by other workers every N seconds
+JOB_POLL_INTERVAL = 1
+# and inbox messages spooled by other workers
+SPOOL_POLL_INTERVAL = 1
+
+# multi-tenant mode: chats and their Notion workspaces are read from
+# this TOML file (see tenants.py), then TG_CHAT_ID, INTEGRATION_TOKEN
+# and database ids below are not used
+TENANTS_FILE = os.environ.get("TENANTS_FILE")
+# daily and monthly events run for at most N tenants at once
+TENANT_FANOUT = 32
 
 # telegram token and target user id
 BOT_TOKEN = load_env_var("BOT_TOKEN")
-TG_CHAT_ID = int(load_env_var("TG_CHAT_ID"))
+# Bot API server, e.g. a local one (github.com/tdlib/telegram-bot-api)
+BOT_API_URL = os.environ.get("BOT_API_URL", "https://api.telegram.org/bot")
+TG_CHAT_ID = int(load_env_var("TG_CHAT_ID")) if not TENANTS_FILE else None
 
-# notion token
-INTEGRATION_TOKEN = load_env_var("INTEGRATION_TOKEN")
+# how updates are received: "polling" (getUpdates) or "webhook"
+# (Telegram posts updates to a local HTTP listener behind WEBHOOK_URL).
+# ! Note: switching is done by restart, pending updates are kept
+DELIVERY_MODE = os.environ.get("DELIVERY_MODE", "polling")
+if DELIVERY_MODE not in ("polling", "webhook"):
+    raise ValueError(f"unknown DELIVERY_MODE {DELIVERY_MODE!r}")
+if DELIVERY_MODE == "webhook":
+    # public https url (with path) which is proxied to the listener
+    WEBHOOK_URL = load_env_var("WEBHOOK_URL")
+    # Telegram sends it in every request, other requests are rejected
+    WEBHOOK_SECRET = load_env_var("WEBHOOK_SECRET")
+else:
+    WEBHOOK_URL = WEBHOOK_SECRET = None
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8443))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "telegram")
 
-# notion databases ids
-INBOX_DATABASE_ID = load_env_var("INBOX_DATABASE_ID")
-CALENDAR_DATABASE_ID = load_env_var("CALENDAR_DATABASE_ID")
-CURRENT_TASKS_ID = load_env_var("CURRENT_TASKS_ID")
-UNI_SCHEDULE = load_env_var("UNI_SCHEDULE_ID")
+# Notion API server, e.g. a local stand-in (benchmarks/fakenotion.py)
+NOTION_API_URL = os.environ.get("NOTION_API_URL", "https://api.notion.com")
+if not TENANTS_FILE:
+    # notion token
+    INTEGRATION_TOKEN = load_env_var("INTEGRATION_TOKEN")
+    # notion databases ids
+    INBOX_DATABASE_ID = load_env_var("INBOX_DATABASE_ID")
+    CALENDAR_DATABASE_ID = load_env_var("CALENDAR_DATABASE_ID")
+    CURRENT_TASKS_ID = load_env_var("CURRENT_TASKS_ID")
+    UNI_SCHEDULE = load_env_var("UNI_SCHEDULE_ID")
+else:
+    INTEGRATION_TOKEN = INBOX_DATABASE_ID = CALENDAR_DATABASE_ID = None
+    CURRENT_TASKS_ID = UNI_SCHEDULE = None
 
-# max number of tries to send task to the Notion
-# ! Note: time between tries grows exponentially
-TRY_SEND_LIMIT = 10
+# inbox messages are stored here until the Notion accepts them
+INBOX_SPOOL_PATH = f"{DATA_DIR}/inbox_spool.sqlite3"
 # Initital time between unsuccessufl tries of send task to the Notion
 # ! Note: time between tries grows exponentially
 TRY_SEND_INIT_DELAY = 30
+# upper limit of time between tries (seconds)
+TRY_SEND_MAX_DELAY = 60 * 60
+# window (seconds) for measuring inbox spool drain rate
+DRAIN_RATE_WINDOW = 300
+# number of chats whose inbox messages are sent to Notion simultaneously
+# (messages of one chat are sent one by one, to keep their order)
+INBOX_WORKERS = 3
+# the same telegram message is not added twice within this time (seconds)
+INBOX_DEDUPE_WINDOW = 2 * 24 * 60 * 60
+# messages are acknowledged once per burst, after the chat
+# is quiet for this time (seconds)
+INBOX_ACK_DELAY = 2
+# max time (seconds) to wait for delivery of a burst before acknowledgement
+INBOX_ACK_MAX_WAIT = 10
 
 PAGE_SIZE = 25
 
+# outgoing telegram messages: min time (seconds) between messages
+# to the same chat and between any two messages of the bot
+SEND_CHAT_INTERVAL = 1
+SEND_GLOBAL_INTERVAL = 1 / 30
+# number of tries to send a message on network errors
+SEND_MAX_TRIES = 5
+
+# how long (seconds) results of Notion queries are cached,
+# the bot drops the cache itself when it changes something in Notion
+NOTION_CACHE_TTL = {
+    "inbox": 30,
+    "calendar": 5 * 60,
+    "current_tasks": 5 * 60,
+    "uni_schedule": 60 * 60,
+}
+# max number of cached query results
+NOTION_CACHE_SIZE = 64
+# databases are synced incrementally (by `last_edited_time`), but once
+# in this interval (seconds) they are fully reloaded, because pages
+# archived outside of the bot can be noticed only this way
+NOTION_FULL_SYNC_INTERVAL = 6 * 60 * 60
+# mirrors of the databases are saved here, they answer read commands
+# when Notion is unavailable (the answer is marked as stale)
+NOTION_REPLICA_PATH = f"{DATA_DIR}/notion_replica.sqlite3"
+# how often (seconds) all mirrors are synced in the background
+NOTION_REPLICA_REFRESH_INTERVAL = 10 * 60
+# read commands wait for Notion at most this time (seconds),
+# then they answer from the saved mirror
+NOTION_READ_TIMEOUT = 5
+# calendar queries by date look for events started at most this
+# number of days ago (i.e. it is the max length of a multi-day event)
+CALENDAR_LOOKBACK_DAYS = 90
+# max number of simultaneous requests of bulk archive/unarchive
+NOTION_BULK_CONCURRENCY = 3
+# Notion allows about 3 requests per second for an integration,
+# requests of user commands go ahead of scheduled ones
+NOTION_RATE_LIMIT = 3
+# max number of requests sent at once after idle time
+NOTION_RATE_BURST = 3
+# connections to Notion, shared by all tenants: max number of them,
+# how many idle ones are kept open and for how long (seconds)
+NOTION_MAX_CONNECTIONS = 20
+NOTION_KEEPALIVE_CONNECTIONS = 10
+NOTION_KEEPALIVE_EXPIRY = 60
+# set NOTION_HTTP2=1 to use HTTP/2, it needs the `h2` package
+# (httpx[http2]), which is not in requirements.txt: requests of
+# a workspace are limited to NOTION_RATE_LIMIT per second, so a few
+# keep-alive HTTP/1.1 connections are enough
+NOTION_HTTP2 = os.environ.get("NOTION_HTTP2", "0") == "1"
+# time (seconds) to open a connection (TCP and TLS handshakes)
+# and to wait for an answer (or a free connection of the pool)
+NOTION_CONNECT_TIMEOUT = 5
+NOTION_RESPONSE_TIMEOUT = 60
+# connections are opened this time (seconds) before daily and monthly
+# events, so the events do not wait for handshakes; 0 disables it
+NOTION_PREWARM_LEAD = 30
+NOTION_PREWARM_CONNECTIONS = 4
+
+# latency metrics of plugin actions, Notion requests and telegram sends
+# (see also /stats) are written here for Prometheus textfile collector,
+# empty value disables the file
+METRICS_TEXTFILE_PATH = os.environ.get("METRICS_TEXTFILE_PATH",
+                                       f"{DATA_DIR}/metrics.prom")
+# how often (seconds) the file is written
+METRICS_EXPORT_INTERVAL = 15
+# if set, metrics are also served on http://127.0.0.1:<port>/metrics
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+if WORKER_INDEX is not None:
+    # every worker exports its own metrics (labeled with `worker`)
+    if METRICS_TEXTFILE_PATH:
+        stem, ext = os.path.splitext(METRICS_TEXTFILE_PATH)
+        METRICS_TEXTFILE_PATH = f"{stem}-{WORKER_INDEX}{ext}"
+    if METRICS_PORT:
+        METRICS_PORT += WORKER_INDEX
+
 PAIR_SCHEDULE = [[1, (9, 00), (10, 30)],
                  [2, (10, 40), (12, 10)],
                  [3, (12, 50), (14, 20)],
@@ -59,6 +239,12 @@ TODAY_SCHED_TIME = time(hour=8, minute=10, second=15)
 TOMMOROW_SCHED_TIME = time(hour=22, minute=30, second=10)
 # date of first schedule week (for checking even/odd)
 FIRST_SCHEDULE_WEEK = date(year=2024, month=2, day=5)
+# how often (seconds) schedule changes are pulled from Notion
+SCHEDULE_REFRESH_INTERVAL = 10 * 60
+
+## RandomCurrentTask plugin
+# how often (seconds) the local task index is reconciled with Notion
+TASK_INDEX_REFRESH_INTERVAL = 10 * 60
 
 ## Inbox Manager Plugin
 # default number of resent tasks obtained from inbox
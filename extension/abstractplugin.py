@@ -1,19 +1,28 @@
+from __future__ import annotations
 from abc import ABCMeta, abstractmethod
 from datetime import datetime
+from typing import TYPE_CHECKING
 
 from config import TIMEZONE
-from extension.exttypes import EventsScheduleT, CommandBindingsT
+from extension.exttypes import (
+    EventsScheduleT, CommandBindingsT, RefreshEventsT
+)
+
+if TYPE_CHECKING:
+    from extension.scheduler import Scheduler
 
 class AbstractPlugin(metaclass=ABCMeta):
     """Abstract base class for your fancy plugin.
     """
-    __slots__ = ("_enabled", "_name")
+    __slots__ = ("_enabled", "_name", "_scheduler")
     _enabled: bool
     _name: str
+    _scheduler: Scheduler | None
 
     def __init__(self, name):
         self._enabled = True
         self._name = name
+        self._scheduler = None
 
     @abstractmethod
     def user_commands(self) -> CommandBindingsT:
@@ -62,6 +71,18 @@ class AbstractPlugin(metaclass=ABCMeta):
         """
         ...
 
+    def refresh_events(self) -> RefreshEventsT:
+        """Repeating plugin events, which refresh in-memory state
+        of the plugin (e.g. an index of Notion pages).
+        Unlike other events, they run in every worker process (each
+        has its own state) for every tenant and are not saved:
+        `PLUGIN_REFRESH_DELAY` seconds after start, then every interval.
+
+        Return a sequence of pairs: `timedelta` interval, action.
+        Actions should return empty `ActionResult`.
+        """
+        return ()
+
     @abstractmethod
     def help(self, *args) -> dict[str, tuple[str, ...]]:
         """
@@ -106,6 +127,26 @@ class AbstractPlugin(metaclass=ABCMeta):
     def name(self):
         return self._name
 
+    @property
+    def scheduler(self) -> Scheduler | None:
+        """Scheduler of daily and monthly events.
+        Use it to move, pause or cancel events of this plugin, e.g.
+        `self.scheduler.reschedule(self, self.action, new_time)`.
+        Events are shared by all tenants, pass `chat_id` to change
+        the event only for one chat.
+        It is `None` until the plugin is loaded by `ExtensionLoader`.
+        """
+        return self._scheduler
+
+    def set_scheduler(self, scheduler: Scheduler):
+        self._scheduler = scheduler
+
+    def is_own_action(self, action) -> bool:
+        """Is `action` a method of this plugin,
+        so it can be found by name after restart.
+        """
+        return getattr(self, action.__name__, None) == action
+
     def _get_datetime_now(self) -> datetime:
         """Return current time"""
         return datetime.now(tz=TIMEZONE)
@@ -7,3 +7,6 @@ class ActionResult:
     message: str | None = None
     next_datetime: datetime | None = None
     next_action: Callable | None = None
+    # arguments of `next_action`, they must be JSON serializable
+    # for the event to survive restarts
+    next_args: tuple = ()
@@ -1,48 +1,235 @@
 from __future__ import annotations
+import asyncio
 import logging
+from datetime import datetime, timedelta
+from pathlib import Path
 
 from telegram import Update
 from telegram.ext import (
     Application,
-    CommandHandler,
     ContextTypes,
-    CallbackContext
+    CallbackContext,
+    JobQueue,
 )
 
-from extension import PluginManager, PluginLoader, AbstractPlugin
+from extension import PluginManager, PluginLoader, AbstractPlugin, ActionResult
 from extension.exttypes import ActionT
-from config import TG_CHAT_ID, PLUGINS_DIR
-from tools import validate_user
+from extension.jobstore import JobStore
+from extension.router import CommandRouter
+from extension.scheduler import Scheduler
+from metrics import metrics
+from mynotion import Priority, notion_priority
+from outbox import SendQueue
+from tenants import tenants, as_tenant
+from config import (
+    TENANT_FANOUT,
+    WORKERS,
+    JOB_POLL_INTERVAL,
+    PLUGINS_DIR,
+    PLUGINS_WATCH_INTERVAL,
+    PLUGIN_REFRESH_DELAY,
+    PLUGIN_CONCURRENCY,
+    PLUGIN_CONCURRENCY_OVERRIDES,
+    PLUGIN_ACTION_TIMEOUT,
+    PLUGIN_ACTION_TIMEOUT_OVERRIDES,
+    TIMEZONE,
+    JOB_MISFIRE_GRACE,
+)
+from tools import validate_user, protect_for_html
 
 
 class ExtensionLoader:
     __slots__ = (
         "_plg_manager",
-        "_plg_loader"
+        "_plg_loader",
+        "_outbox",
+        "_jobs",
+        "_app",
+        "_router",
+        "_scheduler",
+        "_limits",
+        "_runs_jobs",
+        "_known_jobs",
     )
     _plg_manager: PluginManager
     _plg_loader: PluginLoader
+    _outbox: SendQueue
+    _jobs: JobStore
+    _app: Application
+    # the only handler of plugin commands
+    _router: CommandRouter
+    _scheduler: Scheduler
+    # plugin name -> slots for its running user commands
+    _limits: dict[str, asyncio.Semaphore]
+    # are events run by this process (in multi-process mode
+    # only by the leader, see `start_jobs`)
+    _runs_jobs: bool
+    # ids of saved events scheduled in this process -> plugin name
+    _known_jobs: dict[int, str]
 
-    def __init__(self) -> None:
+    def __init__(self, outbox: SendQueue) -> None:
         self._plg_manager = PluginManager()
         self._plg_loader = PluginLoader(PLUGINS_DIR)
+        self._outbox = outbox
+        self._jobs = JobStore()
+        # slow commands must not hold other updates
+        self._router = CommandRouter(block=False)
+        self._limits = {}
+        self._runs_jobs = False
+        self._known_jobs = {}
 
-    def load(self, app: Application):
+    def load(self, app: Application, jobs: bool = True):
+        """Load plugins and add their commands. Their events are
+        scheduled if `jobs` is set, otherwise by `start_jobs`.
+        """
+        self._app = app
+        self._scheduler = Scheduler(app.job_queue, self._jobs)
         self.load_plugins()
+        self._plg_manager.set_reloader(self.reload)
+        app.add_handler(self._router)
         self.load_commands(app)
-        self.load_daily_events(app)
-        self.load_monthly_events(app)
-        self.load_disordered_events(app)
+        self.load_refresh_events(app)
+        if jobs:
+            self.start_jobs()
+        if PLUGINS_WATCH_INTERVAL:
+            app.job_queue.run_repeating(
+                self.watch_plugins,
+                interval=PLUGINS_WATCH_INTERVAL,
+                name="PluginsWatcher"
+            )
+
+    def start_jobs(self):
+        """Schedule events of all plugins and run them in this process.
+        In multi-process mode it is called by the leader, which also
+        picks up events saved by other workers.
+        """
+        self._runs_jobs = True
+        self.load_daily_events(self._app)
+        self.load_monthly_events(self._app)
+        self.load_disordered_events(self._app)
+        if WORKERS:
+            self._app.job_queue.run_repeating(
+                self.poll_jobs,
+                interval=JOB_POLL_INTERVAL,
+                name="JobPoller"
+            )
+
+    async def poll_jobs(self, context: CallbackContext):
+        self.restore_jobs(self._app, superseded=set())
+
+    def is_pinned(self, update: Update) -> bool:
+        """Should the update be handled by the leader: it is a command
+        of the plugin manager or of a plugin with daily or monthly
+        events, which may change the schedule
+        """
+        name = self._router.plugin_of(update)
+        if name is None:
+            return False
+        plg = self._plg_manager.find_plugin(name)
+        return (plg is self._plg_manager
+                or plg is not None and bool(tuple(plg.daily_events())
+                                            or tuple(plg.monthly_events())))
+
+    @property
+    def scheduler(self) -> Scheduler:
+        """Daily and monthly events, available after `load`"""
+        return self._scheduler
 
     def load_plugins(self):
         plugins = self._plg_loader.load()
+        for plg in [self._plg_manager, *plugins]:
+            plg.set_scheduler(self._scheduler)
         self._plg_manager.set_plugins(plugins)
 
-    def load_commands(self, app: Application):
+    def load_handlers(self, app: Application,
+                      plugins: set[str] | None = None):
+        """Add commands and events of given plugins (all by default)"""
+        self.load_commands(app, plugins)
+        self.load_refresh_events(app, plugins)
+        if not self._runs_jobs:
+            return
+        self.load_daily_events(app, plugins)
+        self.load_monthly_events(app, plugins)
+        self.load_disordered_events(app, plugins)
+
+    def unload_handlers(self, plugin_name: str):
+        """Remove commands and events of the plugin.
+        Saved single events stay in the job store.
+        """
+        self._router.remove_plugin(plugin_name)
+        for job in self._app.job_queue.get_jobs_by_name(plugin_name):
+            job.schedule_removal()
+        for job_id in [id for id, name in self._known_jobs.items()
+                       if name == plugin_name]:
+            del self._known_jobs[job_id]
+        self._scheduler.forget(plugin_name)
+
+    def reload(self, plugin_name: str | None = None) -> str:
+        """Reload file of the plugin, or all changed plugin files.
+        Return report for the user.
+        """
+        if plugin_name is None:
+            files = self._plg_loader.changed_files()
+            if not files:
+                return "Plugin files are not changed"
+        elif filename := self._plg_loader.file_of(plugin_name):
+            files = [filename]
+        else:
+            return (f"Error: plugin \"{plugin_name}\" is not loaded\n"
+                    "Hint: use /plugins to see loaded plugins")
+        return "\n".join(self._reload_file(f) for f in files)
+
+    def _reload_file(self, filename: str) -> str:
+        old_names = self._plg_loader.plugin_names(filename)
+        if Path(PLUGINS_DIR, filename).exists():
+            try:
+                plugins = self._plg_loader.load_file(filename, eager=True)
+            except Exception:
+                logging.exception(f"cannot reload file `{filename}`")
+                return f"{filename}: FAILED, old version is kept"
+        else:
+            self._plg_loader.forget_file(filename)
+            plugins = []
+        disabled = {p.name for name in old_names
+                    if (p := self._plg_manager.find_plugin(name))
+                        and not p.isenabled}
+        for plg in plugins:
+            plg.set_scheduler(self._scheduler)
+        for name in old_names:
+            self.unload_handlers(name)
+        self._plg_manager.replace_plugins(old_names, plugins)
+        new_names = {p.name for p in plugins}
+        self.load_handlers(self._app, new_names)
+        for plg in plugins:
+            if plg.name in disabled:
+                plg.disable()
+        logging.info(f"Plugin file `{filename}` is reloaded: "
+                     f"{old_names} -> {sorted(new_names)}")
+        if not plugins:
+            return f"{filename}: removed {', '.join(old_names)}"
+        report = f"{filename}: reloaded {', '.join(sorted(new_names))}"
+        taken = [f"/{cmd}" for plg in plugins for cmd, _ in plg.user_commands()
+                 if cmd.lower() not in self._router.commands(plg.name)]
+        if taken:
+            report += f", commands used by other plugins: {', '.join(taken)}"
+        return report
+
+    async def watch_plugins(self, context: CallbackContext):
+        if self._plg_loader.changed_files():
+            report = protect_for_html(self.reload())
+            if not self._runs_jobs:
+                return      # the leader tells about it
+            for admin in tenants.admins():
+                self._outbox.send(admin.chat_id, report)
+
+    def load_commands(self, app: Application,
+                      plugins: set[str] | None = None):
         for plg, cmd, action in self._plg_manager.user_commands():
+            if plugins is not None and plg.name not in plugins:
+                continue
             callback = self.make_command_callback(action, plg)
-            app.add_handler(CommandHandler(cmd, callback))
-            logging.info(f"[{plg.name}]: adding command /{cmd}")
+            if self._router.add(cmd, plg.name, callback):
+                logging.info(f"[{plg.name}]: adding command /{cmd}")
 
     def make_command_callback(self, action: ActionT, plg: AbstractPlugin):
         @validate_user
@@ -52,91 +239,293 @@ class ExtensionLoader:
                 return
             command_args = context.args or ()
             try:
-                act_result = await action(*command_args)
+                act_result = await self.run_command(
+                    plg, action, command_args, update.effective_chat.id
+                )
             except Exception:
                 logging.exception(f"[{plg.name}] user triggered action "
                                   f"'{action.__name__}' FAILED")
                 return None
+            if act_result is None:
+                return None
             if act_result.message:
-                await context.bot.send_message(
+                self._outbox.send(
                     update.effective_chat.id,
                     act_result.message
                 )
             else:
                 logging.info(f"[{plg.name}] executed from user "
-                             "command: {action.__name__}")
+                             f"command: {action.__name__}")
             if not (act_result.next_action is None
                       or act_result.next_datetime is None):
-                cb = self.create_event_callback(
+                self.schedule_once(
+                    context.job_queue,
+                    plg,
                     act_result.next_action,
-                    plg
-                )
-                context.job_queue.run_once(
-                    callback=cb,
-                    when=act_result.next_datetime,
-                    name=plg.name,
-                    chat_id=update.effective_chat.id
+                    act_result.next_datetime,
+                    update.effective_chat.id,
+                    act_result.next_args
                 )
         return callback
 
-    def load_daily_events(self, app: Application):
-        for plg, dt, action in self._plg_manager.daily_events():
-            callback = self.create_event_callback(action, plg)
-            app.job_queue.run_daily(
-                callback,
-                time=dt.time(),
-                name=plg.name,
-                chat_id=TG_CHAT_ID
+    async def run_command(self, plg: AbstractPlugin, action: ActionT,
+                          args: tuple, chat_id: int) -> ActionResult | None:
+        """Run user command within the plugin concurrency limit
+        and timeout. Return `None` (the user is notified),
+        if the command is cancelled.
+        """
+        limit = self._limits.get(plg.name)
+        if limit is None:
+            limit = asyncio.Semaphore(
+                PLUGIN_CONCURRENCY_OVERRIDES.get(plg.name, PLUGIN_CONCURRENCY)
+            )
+            self._limits[plg.name] = limit
+        timeout = PLUGIN_ACTION_TIMEOUT_OVERRIDES.get(plg.name,
+                                                      PLUGIN_ACTION_TIMEOUT)
+        if not limit.locked():
+            await limit.acquire()   # takes a free slot at once
+        else:
+            self._outbox.send(chat_id, f"[{plg.name}] is busy with previous "
+                                       "commands, your command is queued")
+            try:
+                # unlike `wait_for`, the timeout cannot cancel
+                # an already completed acquire and leak the slot
+                async with asyncio.timeout(timeout):
+                    await limit.acquire()
+            except TimeoutError:
+                logging.warning(f"[{plg.name}] command '{action.__name__}' "
+                                f"waited {timeout} s for a free slot, "
+                                "cancelled")
+                self._outbox.send(chat_id, "Command is cancelled: "
+                                           f"[{plg.name}] was busy for "
+                                           f"{timeout} s, try again later")
+                return None
+        try:
+            with metrics.timer("bot_plugin_action", plugin=plg.name,
+                               action=action.__name__, trigger="command"):
+                return await asyncio.wait_for(action(*args), timeout)
+        except TimeoutError:
+            logging.warning(f"[{plg.name}] command '{action.__name__}' "
+                            f"took more than {timeout} s, cancelled")
+            self._outbox.send(chat_id, f"Command is cancelled: it took more "
+                                       f"than {timeout} s. Part of the work "
+                                       "may be already done")
+            return None
+        finally:
+            limit.release()
+
+    def load_refresh_events(self, app: Application,
+                            plugins: set[str] | None = None):
+        """Schedule refresh events of given plugins (all by default).
+        They run in every process, followers of multi-process mode
+        answer commands from their own plugin state too.
+        """
+        for plg, interval, action in self._plg_manager.refresh_events():
+            if plugins is not None and plg.name not in plugins:
+                continue
+            app.job_queue.run_repeating(
+                self.create_fanout_callback(action, plg),
+                interval=interval,
+                first=PLUGIN_REFRESH_DELAY,
+                name=plg.name
             )
 
-    def load_disordered_events(self, app: Application):
-        for plg, dt, action in self._plg_manager.disordered_events():
-            callback = self.create_event_callback(action, plg)
-            app.job_queue.run_once(
-                callback,
-                when=dt,
-                name=plg.name,
-                chat_id=TG_CHAT_ID)
+    def load_daily_events(self, app: Application,
+                          plugins: set[str] | None = None):
+        for plg, dt, action in self._plg_manager.daily_events():
+            if plugins is not None and plg.name not in plugins:
+                continue
+            callback = self.create_fanout_callback(action, plg)
+            self._scheduler.run_daily(plg, action, callback,
+                                      dt.time(), None)
+
+    def load_disordered_events(self, app: Application,
+                               plugins: set[str] | None = None):
+        declared = [(plg, dt, action) for plg, dt, action
+                    in self._plg_manager.disordered_events()
+                    if plugins is None or plg.name in plugins]
+        self.restore_jobs(
+            app,
+            superseded={(plg.name, action.__name__)
+                        for plg, _, action in declared},
+            plugins=plugins
+        )
+        for plg, dt, action in declared:
+            for tenant in tenants:
+                self.schedule_once(app.job_queue, plg, action, dt,
+                                   tenant.chat_id)
+
+    def restore_jobs(self, app: Application,
+                     superseded: set[tuple[str, str]],
+                     plugins: set[str] | None = None):
+        """Schedule saved events of given plugins (all by default)
+        after restart or reload.
+        Events of `superseded` (plugin name, action name) pairs are
+        dropped, because plugins declare them again on start.
+        """
+        now = datetime.now(TIMEZONE)
+        for job in self._jobs.jobs():
+            if plugins is not None and job.plugin not in plugins:
+                continue
+            if job.id in self._known_jobs:
+                continue
+            plg = self._plg_manager.find_plugin(job.plugin)
+            action = getattr(plg, job.action, None)
+            if (job.plugin, job.action) in superseded:
+                self._jobs.remove(job.id)
+                continue
+            if plg is None or action is None:
+                logging.warning(f"[{job.plugin}] dropping saved event "
+                                f"'{job.action}': action is not found")
+                self._jobs.remove(job.id)
+                continue
+            when = job.when
+            if when < now:
+                late = now - when
+                if late > timedelta(seconds=JOB_MISFIRE_GRACE):
+                    logging.warning(f"[{plg.name}] dropping saved event "
+                                    f"'{job.action}': missed by {late}")
+                    self._jobs.remove(job.id)
+                    continue
+                logging.info(f"[{plg.name}] saved event '{job.action}' "
+                             f"was missed by {late}, running it now")
+                when = timedelta(0)
+            else:
+                logging.info(f"[{plg.name}] restoring saved event "
+                             f"'{job.action}' at {when}")
+            self.schedule_once(app.job_queue, plg, action, when,
+                               job.chat_id, job.args, job_id=job.id)
+
+    def schedule_once(self, job_queue: JobQueue, plg: AbstractPlugin,
+                      action: ActionT, when: datetime | timedelta,
+                      chat_id: int, args: tuple = (),
+                      job_id: int | None = None):
+        """Run `action` of the plugin once at `when`.
+        The event is saved to the job store, if the action is a method
+        of the plugin and `args` are JSON serializable.
+        `job_id` is given for events already saved.
+        """
+        if job_id is None:
+            job_id = self._save_job(plg, action, when, chat_id, args)
+        if job_id is not None:
+            if not self._runs_jobs:
+                return      # the leader runs saved events
+            self._known_jobs[job_id] = plg.name
+        callback = self.create_event_callback(action, plg, args, job_id)
+        job_queue.run_once(
+            callback,
+            when=when,
+            name=plg.name,
+            chat_id=chat_id)
+
+    def _save_job(self, plg: AbstractPlugin, action: ActionT,
+                  when: datetime | timedelta, chat_id: int,
+                  args: tuple) -> int | None:
+        if isinstance(when, timedelta):
+            when = datetime.now(TIMEZONE) + when
+        if not plg.is_own_action(action):
+            logging.warning(f"[{plg.name}] event '{action.__name__}' is not "
+                            "a plugin method, it will not survive restart")
+            return None
+        try:
+            return self._jobs.add(plg.name, action.__name__, args,
+                                  chat_id, when)
+        except TypeError:
+            logging.warning(f"[{plg.name}] event '{action.__name__}' has not "
+                            "serializable arguments, it will not survive "
+                            "restart")
+            return None
 
-    def load_monthly_events(self, app: Application):
+    def load_monthly_events(self, app: Application,
+                            plugins: set[str] | None = None):
         for plg, dt, action in self._plg_manager.monthly_events():
-            callback = self.create_event_callback(action, plg)
-            app.job_queue.run_monthly(
-                callback,
-                when=dt.time(),
-                day=dt.day,
-                name=plg.name,
-                chat_id=TG_CHAT_ID)
-
-    def create_event_callback(self, action: ActionT, plg: AbstractPlugin):
+            if plugins is not None and plg.name not in plugins:
+                continue
+            callback = self.create_fanout_callback(action, plg)
+            self._scheduler.run_monthly(plg, action, callback,
+                                        dt.time(), dt.day, None)
+
+    def create_event_callback(self, action: ActionT, plg: AbstractPlugin,
+                              args: tuple = (), job_id: int | None = None):
+        """Callback of a single event for the chat of the job.
+        `job_id` is an id of the saved event, it is removed
+        from the job store after the event (and its next event
+        is scheduled).
+        """
         async def callback(context: CallbackContext):
-            if not plg.isenabled:
+            if job_id is not None and not self._jobs.claim(f"job:{job_id}"):
+                logging.info(f"[{plg.name}] event '{action.__name__}' is "
+                             "already fired by another worker")
                 return
             try:
-                act_result = await action()
-            except Exception:
-                logging.exception(f"[{plg.name}] triggered action "
-                                  f"'{action.__name__}' FAILED")
-                return None
-            if act_result.message:
-                await context.bot.send_message(
-                    context.job.chat_id,
-                    act_result.message
-                )
+                await self.run_event(plg, action, args, context.job.chat_id,
+                                     context.job_queue)
+            finally:
+                if job_id is not None:
+                    self._jobs.remove(job_id)
+                    self._known_jobs.pop(job_id, None)
+        return callback
+
+    def create_fanout_callback(self, action: ActionT, plg: AbstractPlugin):
+        """Callback of a daily or monthly event, which runs the action
+        for every tenant, at most `TENANT_FANOUT` of them at a time.
+        Tenants which moved or paused the event have their own job
+        (with `chat_id`), it runs the action only for them.
+        """
+        async def callback(context: CallbackContext):
+            if context.job.chat_id is not None:
+                chats = [context.job.chat_id]
             else:
-                logging.info(f"[{plg.name}] executed event "
-                             "action: {action.__name__}")
-            if not (act_result.next_action is None
-                      or act_result.next_datetime is None):
-                cb = self.create_event_callback(
-                    act_result.next_action,
-                    plg
-                )
-                context.job_queue.run_once(
-                    callback=cb,
-                    when=act_result.next_datetime,
-                    name=plg.name,
-                    chat_id=context.job.chat_id
-                )
+                chats = [t.chat_id for t in tenants
+                         if not self._scheduler.has_own(plg, action,
+                                                        t.chat_id)]
+            window = asyncio.Semaphore(TENANT_FANOUT)
+
+            async def run_for(chat_id: int):
+                async with window:
+                    await self.run_event(plg, action, (), chat_id,
+                                         context.job_queue)
+
+            await asyncio.gather(*map(run_for, chats))
         return callback
 
+    async def run_event(self, plg: AbstractPlugin, action: ActionT,
+                        args: tuple, chat_id: int, job_queue: JobQueue):
+        """Run the event action for the tenant of the chat,
+        send its message and schedule its next event
+        """
+        if not plg.isenabled:
+            return
+        tenant = tenants.get(chat_id)
+        if tenant is None:
+            logging.warning(f"[{plg.name}] event '{action.__name__}' is "
+                            f"dropped: chat {chat_id} is not a tenant")
+            return
+        # scheduled events must not delay user commands
+        priority = notion_priority.set(Priority.BACKGROUND)
+        try:
+            with (as_tenant(tenant),
+                  metrics.timer("bot_plugin_action", plugin=plg.name,
+                                action=action.__name__, trigger="event")):
+                act_result = await action(*args)
+        except Exception:
+            logging.exception(f"[{plg.name}] triggered action "
+                              f"'{action.__name__}' FAILED")
+            return None
+        finally:
+            notion_priority.reset(priority)
+        if act_result.message:
+            self._outbox.send(chat_id, act_result.message)
+        else:
+            logging.info(f"[{plg.name}] executed event "
+                         f"action: {action.__name__}")
+        if not (act_result.next_action is None
+                  or act_result.next_datetime is None):
+            self.schedule_once(
+                job_queue,
+                plg,
+                act_result.next_action,
+                act_result.next_datetime,
+                chat_id,
+                act_result.next_args
+            )
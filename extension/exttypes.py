@@ -1,5 +1,5 @@
 from typing import Any, Callable, Coroutine
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from extension import ActionResult
 
@@ -7,4 +7,5 @@ from extension import ActionResult
 ActionT = Callable[..., Coroutine[Any, Any, ActionResult]]
 EventsScheduleT = tuple[tuple[datetime, ActionT], ...]  | tuple[()]
 CommandBindingsT = tuple[tuple[str, ActionT], ...] | tuple[()]
+RefreshEventsT = tuple[tuple[timedelta, ActionT], ...] | tuple[()]
 
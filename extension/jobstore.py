@@ -0,0 +1,98 @@
+import json
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from time import time
+
+from config import JOB_STORE_PATH, TIMEZONE
+
+# marks of fired events are kept this long (seconds)
+FIRED_KEEP = 40 * 24 * 60 * 60
+
+
+@dataclass(frozen=True, slots=True)
+class StoredJob:
+    id: int
+    plugin: str
+    action: str
+    args: tuple
+    chat_id: int
+    when: datetime
+
+
+class JobStore:
+    """One-shot plugin events saved in SQLite, so they survive restarts.
+
+    Event is stored by plugin name, name of the action (a method of
+    the plugin), JSON serializable arguments, chat and fire time.
+    Entry is removed after the event is done.
+
+    It also keeps marks of fired events, so an event is run once
+    even if several workers (or a new leader) have it scheduled.
+    """
+    __slots__ = ("_db", )
+    _db: sqlite3.Connection
+
+    def __init__(self, path: str = JOB_STORE_PATH) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " plugin TEXT NOT NULL,"
+            " action TEXT NOT NULL,"
+            " args TEXT NOT NULL,"
+            " chat_id INTEGER NOT NULL,"
+            " fire_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fired ("
+            " key TEXT PRIMARY KEY,"
+            " fired_at REAL NOT NULL)"
+        )
+
+    def add(self, plugin: str, action: str, args: tuple,
+            chat_id: int, when: datetime) -> int:
+        """Save the event and return its id.
+        Raise `TypeError` if `args` are not JSON serializable.
+        """
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=TIMEZONE)
+        cur = self._db.execute(
+            "INSERT INTO jobs (plugin, action, args, chat_id, fire_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (plugin, action, json.dumps(list(args)), chat_id, when.timestamp())
+        )
+        return cur.lastrowid
+
+    def remove(self, job_id: int):
+        self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id, ))
+
+    def jobs(self) -> list[StoredJob]:
+        """Return all saved events, the earliest first."""
+        rows = self._db.execute(
+            "SELECT id, plugin, action, args, chat_id, fire_at "
+            "FROM jobs ORDER BY fire_at"
+        ).fetchall()
+        return [
+            StoredJob(id, plugin, action, tuple(json.loads(args)), chat_id,
+                      datetime.fromtimestamp(fire_at, TIMEZONE))
+            for id, plugin, action, args, chat_id, fire_at in rows
+        ]
+
+    def claim(self, key: str) -> bool:
+        """Mark the event run (e.g. `"job:12"`) as fired.
+        Return `False` if it is already fired.
+        """
+        now = time()
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute("DELETE FROM fired WHERE fired_at < ?",
+                             (now - FIRED_KEEP, ))
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO fired (key, fired_at) VALUES (?, ?)",
+                (key, now)
+            )
+        return cur.rowcount == 1
@@ -0,0 +1,305 @@
+from __future__ import annotations
+import logging
+import tomllib
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import config
+from extension import AbstractPlugin, ActionResult
+from extension.exttypes import (
+    ActionT, CommandBindingsT, EventsScheduleT, RefreshEventsT
+)
+from tools import dt_from_time
+
+if TYPE_CHECKING:
+    from extension.scheduler import Scheduler
+
+
+@dataclass(frozen=True, slots=True)
+class ManifestEvent:
+    action: str
+    # daily and monthly events
+    time: time | None = None
+    # monthly events
+    day: int | None = None
+    # disordered events: seconds after start
+    delay: float | None = None
+    # refresh events: seconds between runs
+    interval: float | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class PluginManifest:
+    """Commands, help and events of a plugin, read from
+    `<module>.toml` next to the plugin module.
+    Times of events are names of `time` constants in config.py,
+    the plugin must use the same ones (see `check`).
+
+    Example:
+    ```
+    name = "Timer"
+    class = "TimerPlugin"
+    enabled = true
+
+    [commands]
+    timerset = "set_timer"
+
+    [help]
+    "Set timer" = ["/timerset <time>"]
+
+    [[daily_events]]
+    time = "MORNING_MESSAGE_TIME"
+    action = "morning_message"
+
+    [[monthly_events]]
+    day = 1
+    time = "REPORT_TIME"
+    action = "report"
+
+    [[disordered_events]]
+    delay = 10                      # seconds after start
+    action = "remind"
+
+    [[refresh_events]]
+    interval = "SCHEDULE_REFRESH_INTERVAL"  # or seconds
+    action = "refresh"
+    ```
+    """
+    name: str
+    class_name: str
+    enabled: bool
+    commands: tuple[tuple[str, str], ...]
+    help: dict[str, tuple[str, ...]]
+    daily_events: tuple[ManifestEvent, ...]
+    monthly_events: tuple[ManifestEvent, ...]
+    disordered_events: tuple[ManifestEvent, ...]
+    refresh_events: tuple[ManifestEvent, ...]
+
+    @classmethod
+    def read(cls, path: Path) -> PluginManifest:
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+        try:
+            return cls(
+                name=data["name"],
+                class_name=data["class"],
+                enabled=data.get("enabled", True),
+                commands=tuple(data.get("commands", {}).items()),
+                help={desc: tuple(aliases)
+                      for desc, aliases in data.get("help", {}).items()},
+                daily_events=tuple(
+                    ManifestEvent(ev["action"], _parse_time(ev["time"]))
+                    for ev in data.get("daily_events", ())
+                ),
+                monthly_events=tuple(
+                    ManifestEvent(ev["action"], _parse_time(ev["time"]),
+                                  day=ev["day"])
+                    for ev in data.get("monthly_events", ())
+                ),
+                disordered_events=tuple(
+                    ManifestEvent(ev["action"], delay=ev["delay"])
+                    for ev in data.get("disordered_events", ())
+                ),
+                refresh_events=tuple(
+                    ManifestEvent(ev["action"],
+                                  interval=_parse_seconds(ev["interval"]))
+                    for ev in data.get("refresh_events", ())
+                ),
+            )
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"invalid plugin manifest `{path}`: {e!r}")
+
+    def check(self, plugin: AbstractPlugin):
+        """Raise `ValueError` if the manifest does not describe
+        the plugin: its name, commands, help and events
+        """
+        def events(pairs) -> set:
+            return {(dt.time().replace(tzinfo=None), action.__name__)
+                    for dt, action in pairs}
+
+        def monthly(pairs) -> set:
+            return {(dt.day, dt.time().replace(tzinfo=None), action.__name__)
+                    for dt, action in pairs}
+
+        declared = {
+            "name": self.name,
+            "commands": dict(self.commands),
+            "help": self.help,
+            "daily_events": {(ev.time.replace(tzinfo=None), ev.action)
+                             for ev in self.daily_events},
+            "monthly_events": {(ev.day, ev.time.replace(tzinfo=None),
+                                ev.action)
+                               for ev in self.monthly_events},
+            # delays are chosen by the plugin at start
+            "disordered_events": {ev.action
+                                  for ev in self.disordered_events},
+            "refresh_events": {(ev.interval, ev.action)
+                               for ev in self.refresh_events},
+        }
+        actual = {
+            "name": plugin.name,
+            "commands": {cmd: action.__name__
+                         for cmd, action in plugin.user_commands()},
+            "help": {desc: tuple(aliases)
+                     for desc, aliases in plugin.help().items()},
+            "daily_events": events(plugin.daily_events()),
+            "monthly_events": monthly(plugin.monthly_events()),
+            "disordered_events": {action.__name__ for _, action
+                                  in plugin.disordered_events()},
+            "refresh_events": {(interval.total_seconds(), action.__name__)
+                               for interval, action
+                               in plugin.refresh_events()},
+        }
+        differ = [key for key in declared if declared[key] != actual[key]]
+        if differ:
+            raise ValueError(
+                f"manifest of [{self.name}] differs from the plugin: "
+                + "; ".join(f"{key} {declared[key]!r} != {actual[key]!r}"
+                            for key in differ)
+            )
+
+
+def _parse_time(value: str) -> time:
+    """Name of a `time` constant in config.py"""
+    if not isinstance(value, str):
+        raise ValueError(f"{value!r} is not a name of a time in config.py")
+    result = getattr(config, value, None)
+    if not isinstance(result, time):
+        raise ValueError(f"{value!r} is not a time in config.py")
+    return result
+
+
+def _parse_seconds(value: float | str) -> float:
+    """Number of seconds or name of such constant in config.py"""
+    if isinstance(value, str):
+        value = getattr(config, value, None)
+    if not isinstance(value, (int, float)) or value <= 0:
+        raise ValueError(f"{value!r} is not a positive number of seconds")
+    return value
+
+
+class LazyPlugin(AbstractPlugin):
+    """Stands for a plugin described by its manifest.
+
+    Commands, help and events are taken from the manifest, the plugin
+    module is imported on the first command or event of the plugin
+    (never, if the plugin stays disabled). Actions are forwarded
+    to the real plugin by name. Refresh events do not import
+    the plugin: its state is empty until it is imported.
+    """
+    __slots__ = (
+        "_manifest",
+        "_factory",
+        "_plugin",
+        "_actions",
+    )
+    _manifest: PluginManifest
+    # imports the module and creates the real plugin
+    _factory: Callable[[], AbstractPlugin]
+    _plugin: AbstractPlugin | None
+    # action name -> forwarding action
+    _actions: dict[str, ActionT]
+
+    def __init__(self, manifest: PluginManifest,
+                 factory: Callable[[], AbstractPlugin]) -> None:
+        super().__init__(manifest.name)
+        self._manifest = manifest
+        self._factory = factory
+        self._plugin = None
+        self._actions = {}
+        if not manifest.enabled:
+            self.disable()
+
+    @property
+    def isloaded(self) -> bool:
+        return self._plugin is not None
+
+    def load(self) -> AbstractPlugin:
+        """Import the plugin module, if it is not imported yet"""
+        if self._plugin is None:
+            plugin = self._factory()
+            # commands and events are already added from the manifest
+            self._manifest.check(plugin)
+            if self._scheduler is not None:
+                plugin.set_scheduler(self._scheduler)
+            if not self._enabled:
+                plugin.disable()
+            self._plugin = plugin
+            logging.info(f"[{self.name}] plugin module is loaded")
+        return self._plugin
+
+    def action(self, name: str) -> ActionT:
+        """Action which loads the plugin and calls its method `name`"""
+        if name not in self._actions:
+            async def action(*args):
+                return await getattr(self.load(), name)(*args)
+            action.__name__ = action.__qualname__ = name
+            self._actions[name] = action
+        return self._actions[name]
+
+    def __getattr__(self, name: str):
+        # only missing attributes get here: plugin actions by name
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.action(name)
+
+    def is_own_action(self, action: ActionT) -> bool:
+        if self._actions.get(action.__name__) is action:
+            return True
+        return (self._plugin is not None
+                and self._plugin.is_own_action(action))
+
+    def set_scheduler(self, scheduler: Scheduler):
+        super().set_scheduler(scheduler)
+        if self._plugin is not None:
+            self._plugin.set_scheduler(scheduler)
+
+    def enable(self):
+        super().enable()
+        if self._plugin is not None:
+            self._plugin.enable()
+
+    def disable(self):
+        super().disable()
+        if self._plugin is not None:
+            self._plugin.disable()
+
+    def user_commands(self) -> CommandBindingsT:
+        return tuple((cmd, self.action(name))
+                     for cmd, name in self._manifest.commands)
+
+    def help(self, *args) -> dict[str, tuple[str, ...]]:
+        return self._manifest.help
+
+    def daily_events(self) -> EventsScheduleT:
+        return tuple((dt_from_time(ev.time), self.action(ev.action))
+                     for ev in self._manifest.daily_events)
+
+    def monthly_events(self) -> EventsScheduleT:
+        # only day and time are used for monthly events
+        return tuple((datetime.combine(date(2000, 1, ev.day), ev.time),
+                      self.action(ev.action))
+                     for ev in self._manifest.monthly_events)
+
+    def disordered_events(self) -> EventsScheduleT:
+        now = self._get_datetime_now()
+        return tuple((now + timedelta(seconds=ev.delay),
+                      self.action(ev.action))
+                     for ev in self._manifest.disordered_events)
+
+    def refresh_events(self) -> RefreshEventsT:
+        return tuple((timedelta(seconds=ev.interval),
+                      self._refresh_action(ev.action))
+                     for ev in self._manifest.refresh_events)
+
+    def _refresh_action(self, name: str) -> ActionT:
+        """Action which calls method `name` of the imported plugin"""
+        async def action(*args):
+            if self._plugin is None:
+                return ActionResult()
+            return await getattr(self._plugin, name)(*args)
+        action.__name__ = action.__qualname__ = name
+        return action
@@ -5,35 +5,121 @@ from pathlib import Path
 import os
 
 from extension import AbstractPlugin
+from extension.lazyplugin import LazyPlugin, PluginManifest
+from config import LAZY_PLUGINS
 
 
 class PluginLoader:
     __slots__ = (
         "_plugins_dir",
+        "_mtimes",
+        "_names",
     )
     _plugins_dir: str
+    # file name -> modification time at the last load
+    _mtimes: dict[str, float]
+    # file name -> names of plugins loaded from the file
+    _names: dict[str, list[str]]
 
     def __init__(self, plugins_dir: str):
         self._plugins_dir = plugins_dir
+        self._mtimes = {}
+        self._names = {}
 
     def load(self) -> list[AbstractPlugin]:
-        plugin_files = [file for file in os.listdir(self._plugins_dir)
-                        if file.endswith('plugin.py')]
         plugins = []
-        for pf in plugin_files:
+        for pf in self._plugin_files():
             try:
-                plugins += self._load_plugin_file(pf)
+                plugins += self.load_file(pf)
             except Exception as e:
                 logging.exception(f"cannot load file `{pf}`, reason:\n")
         return plugins
 
+    def load_file(self, filename: str,
+                  eager: bool = False) -> list[AbstractPlugin]:
+        """Import (or import again) the plugin file
+        and return new instances of its plugins.
+        Plugin with a manifest (`<module>.toml`) is imported on its
+        first use, unless `eager` is set or `LAZY_PLUGINS` is off.
+        """
+        path, name = self._get_path_name(self._plugins_dir, filename)
+        if filename in self._mtimes:
+            # bytecode cache is checked by mtime in seconds and size,
+            # quick edits of the same size would be missed
+            Path(importlib.util.cache_from_source(path)).unlink(missing_ok=True)
+        # remember the version even if it is broken,
+        # so it is not loaded again until the next change
+        self._mtimes[filename] = self._mtime(filename)
+        manifest_path = path.with_suffix(".toml")
+        if manifest_path.exists():
+            manifest = PluginManifest.read(manifest_path)
+            plugin = LazyPlugin(
+                manifest,
+                lambda: self._create_plugin(filename, manifest.class_name)
+            )
+            if eager or not LAZY_PLUGINS:
+                plugin.load()
+            plugins = [plugin]
+        else:
+            plugins = self._load_plugin_file(filename)
+        self._names[filename] = [p.name for p in plugins]
+        return plugins
+
+    def forget_file(self, filename: str) -> list[str]:
+        """Forget removed file, return names of its plugins"""
+        self._mtimes.pop(filename, None)
+        return self._names.pop(filename, [])
+
+    def plugin_names(self, filename: str) -> list[str]:
+        return list(self._names.get(filename, ()))
+
+    def file_of(self, plugin_name: str) -> str | None:
+        for filename, names in self._names.items():
+            if plugin_name in names:
+                return filename
+        return None
+
+    def changed_files(self) -> list[str]:
+        """Plugin files added, modified or removed since the last load"""
+        current = {}
+        for pf in self._plugin_files():
+            try:
+                current[pf] = self._mtime(pf)
+            except FileNotFoundError:
+                pass
+        changed = [pf for pf, mtime in current.items()
+                   if self._mtimes.get(pf) != mtime]
+        changed += [pf for pf in self._mtimes if pf not in current]
+        return changed
+
+    def _plugin_files(self) -> list[str]:
+        return [file for file in os.listdir(self._plugins_dir)
+                if file.endswith('plugin.py')]
+
+    def _mtime(self, filename: str) -> float:
+        """Modification time of the plugin file and its manifest"""
+        path = Path(self._plugins_dir, filename)
+        manifest = path.with_suffix(".toml")
+        mtime = path.stat().st_mtime
+        if manifest.exists():
+            mtime = max(mtime, manifest.stat().st_mtime)
+        return mtime
+
     def _load_plugin_file(self, filename) -> list[AbstractPlugin]:
-            path, name = self._get_path_name(self._plugins_dir, filename)
-            spec = importlib.util.spec_from_file_location(name, path)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
+            module = self._import_module(filename)
             return self._fetch_plugins_from_module(module)
 
+    def _create_plugin(self, filename: str, class_name: str) -> AbstractPlugin:
+        module = self._import_module(filename)
+        return getattr(module, class_name)()
+
+    def _import_module(self, filename: str):
+        path, name = self._get_path_name(self._plugins_dir, filename)
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
     def _get_path_name(self, path: str, filename: str) -> tuple[Path, str]:
         filepath = Path(path, filename)
         module_name = filename[:-3]     # remove '.py'
@@ -1,11 +1,14 @@
 from itertools import count
 import logging
 from collections.abc import Callable, Iterable
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from extension import AbstractPlugin, ActionResult
+from tenants import current_tenant
 from tools import protect_for_html
 
+NOT_ADMIN_MSG = "Only admins can manage plugins, they are shared by all chats"
+
 
 class PluginManager(AbstractPlugin):
     """
@@ -21,6 +24,8 @@ class PluginManager(AbstractPlugin):
     # Singletone class
     _ids = count(0)
     _loaded_plugins: dict[str, AbstractPlugin]
+    # reloads plugin by name (or all changed plugins) and returns report
+    _reloader: Callable[[str | None], str] | None
 
     def __init__(self, plugins: Iterable[AbstractPlugin] = []):
         self.id = next(self._ids)
@@ -28,18 +33,18 @@ class PluginManager(AbstractPlugin):
             raise RuntimeError("There are additional PluginManager instance")
         super().__init__('PluginManager')
         self.set_plugins(plugins)
+        self._reloader = None
 
     def user_commands(self) -> Iterable[tuple[AbstractPlugin, str, Callable]]:
         logging.info("Plugin Manager: loading user commands")
-        for p in self._loaded_plugins.values():
-            if p.isenabled:
-                for command, action in p.user_commands():
-                    yield (p, command, action)
-            else:
-                logging.info(f"Plugin Manager: skipping [{p.name}]"
-                             " (not enabled)")
+        # own commands go first, so plugins cannot take them
         for command, action in self._manage_commands():
             yield (self, command, action)
+        # disabled plugins get handlers too (they check `isenabled`),
+        # so they work after `/enable`
+        for p in self._loaded_plugins.values():
+            for command, action in p.user_commands():
+                yield (p, command, action)
 
     def _manage_commands(self) -> Iterable[tuple[str, Callable]]:
         return (
@@ -47,6 +52,7 @@ class PluginManager(AbstractPlugin):
             ("disable", self.disable_plugin),
             ("plugins", self.list_plugins),
             ("pl", self.list_plugins),
+            ("reload", self.reload_plugins),
             ("help", self.gather_help),
         )
 
@@ -58,6 +64,9 @@ class PluginManager(AbstractPlugin):
                 ('/disable <plgName>', ),
             "List all plugins":
                 ('/plugins', '/pl'),
+            "Reload plugin <plgName> from its file, "
+            "or all plugins with changed files":
+                ('/reload [plgName]', ),
             "Show this help message":
                 ('/help', )
         }
@@ -65,39 +74,50 @@ class PluginManager(AbstractPlugin):
     def daily_events(self) -> Iterable[tuple[AbstractPlugin, datetime, Callable]]:
         logging.info("Plugin Manager: loading daily events")
         for p in self._loaded_plugins.values():
-            if p.isenabled:
-                for dt, action in p.daily_events():
-                    yield (p, dt, action)
-            else:
-                logging.info(f"Plugin Manager: skipping [{p.name}]"
-                             " (not enabled)")
+            for dt, action in p.daily_events():
+                yield (p, dt, action)
 
     def monthly_events(self) -> Iterable[tuple[AbstractPlugin, datetime, Callable]]:
         logging.info("Plugin Manager: loading monthly events")
         for p in self._loaded_plugins.values():
-            if p.isenabled:
-                for dt, action in p.monthly_events():
-                    yield (p, dt, action)
-            else:
-                logging.info(f"Plugin Manager: skipping [{p.name}]"
-                             " (not enabled)")
+            for dt, action in p.monthly_events():
+                yield (p, dt, action)
 
     def disordered_events(self) -> Iterable[tuple[AbstractPlugin, datetime, Callable]]:
         logging.info("Plugin Manager: loading disordered events")
         for p in self._loaded_plugins.values():
-            if p.isenabled:
-                for dt, action in p.disordered_events():
-                    yield (p, dt, action)
-            else:
-                logging.info(f"Plugin Manager: skipping [{p.name}]"
-                             " (not enabled)")
+            for dt, action in p.disordered_events():
+                yield (p, dt, action)
+
+    def refresh_events(self) -> Iterable[tuple[AbstractPlugin, timedelta, Callable]]:
+        logging.info("Plugin Manager: loading refresh events")
+        for p in self._loaded_plugins.values():
+            for interval, action in p.refresh_events():
+                yield (p, interval, action)
 
     def set_plugins(self, plugins: Iterable[AbstractPlugin]):
         self._loaded_plugins = {p.name: p for p in plugins}
 
+    def replace_plugins(self, old_names: Iterable[str],
+                        plugins: Iterable[AbstractPlugin]):
+        """Swap old plugins with new instances at once"""
+        loaded = {name: plg for name, plg in self._loaded_plugins.items()
+                  if name not in old_names}
+        loaded.update((p.name, p) for p in plugins)
+        self._loaded_plugins = loaded
+
+    def set_reloader(self, reloader: Callable[[str | None], str]):
+        self._reloader = reloader
+
     def _get_plugin(self, name):
         return self._loaded_plugins[name]
 
+    def find_plugin(self, name: str) -> AbstractPlugin | None:
+        """Return loaded plugin (or the manager itself) by name"""
+        if name == self.name:
+            return self
+        return self._loaded_plugins.get(name)
+
     async def enable_plugin(self, *args):
         """User command for enabling plugin by name (args)"""
         return self._switch_plugin(self._enable_plugin, *args)
@@ -108,6 +128,8 @@ class PluginManager(AbstractPlugin):
 
     def _switch_plugin(self, switcher: Callable, *args):
         """Wrapper for _enable and _disable methods"""
+        if not current_tenant.get().admin:
+            return ActionResult(NOT_ADMIN_MSG)
         try:
             plugin_name = " ".join(args)
             return switcher(plugin_name)
@@ -127,6 +149,19 @@ class PluginManager(AbstractPlugin):
         self._get_plugin(name).disable()
         return ActionResult(f"\"{name}\" is disabled now")
 
+    async def reload_plugins(self, *args) -> ActionResult:
+        """User command for reloading plugin by name (args),
+        or all plugins with changed files.
+        """
+        if not current_tenant.get().admin:
+            return ActionResult(NOT_ADMIN_MSG)
+        if self._reloader is None:
+            return ActionResult("Reloading of plugins is not available")
+        name = " ".join(args) or None
+        if name == self.name:
+            return ActionResult(f"You cannot reload {self.name}")
+        return ActionResult(protect_for_html(self._reloader(name)))
+
     async def list_plugins(self) -> ActionResult:
         """User command for listing loaded plugins"""
         message = ['<pre>']     # <pre> - HTML formatting of code
@@ -1,4 +1,4 @@
-from datetime import date, datetime
+from datetime import datetime
 
 from extension import AbstractPlugin, ActionResult
 from extension.exttypes import CommandBindingsT, EventsScheduleT
@@ -16,23 +16,14 @@ class CalenarCleanupPlugin(AbstractPlugin):
         self._notion = Notion()
 
     async def remove_past_events(self, *args) -> ActionResult:
-        events = await self._notion.get_calendar_events()
         today = datetime.now(TIMEZONE).date()
-        deleted = 0
-        for ev in events:
-            if self._is_event_passed(ev, today):
-                await self._notion.archive_page(ev['id'])
-                deleted += 1
-        return ActionResult(
-            message=f"{deleted} past events have been deleted!"
-        )
-        
-    @staticmethod
-    def _is_event_passed(event: dict, today: date): 
-        return (
-            event['end'] and event['end'].date() < today 
-                or (not event['end'] and event['start'].date() < today)
-        )
+        events = await self._notion.calendar_events_ended_before(today)
+        result = await self._notion.archive_pages(ev.id for ev in events)
+        message = f"{len(result.done)} past events have been deleted!"
+        if result.failed:
+            message += (f"\n{len(result.failed)} of {result.total} events "
+                        "could not be deleted, try again later")
+        return ActionResult(message=message)
 
     def user_commands(self) -> CommandBindingsT:
         return (
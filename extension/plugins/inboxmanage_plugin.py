@@ -3,18 +3,23 @@ import logging
 from extension import AbstractPlugin, ActionResult
 from extension.exttypes import CommandBindingsT, EventsScheduleT
 from mynotion import Notion
-from tools import protect_for_html
+from inbox import InboxSpool
+from tenants import current_tenant
+from tools import protect_for_html, stale_mark
 from config import INBOX_LAST_N
 
 class InboxManagement(AbstractPlugin):
     __slots__ = (
         "_notion",
+        "_spool",
     )
     _notion: Notion
+    _spool: InboxSpool
 
     def __init__(self):
         super().__init__("InboxManagement")
         self._notion = Notion()
+        self._spool = InboxSpool()
 
     def user_commands(self) -> CommandBindingsT:
         return (
@@ -22,7 +27,8 @@ class InboxManagement(AbstractPlugin):
             ("delete", self.delete_last_n),
             ("del_last", self.delete_last_n),
             ("inbox", self.last_tasks),
-            ("last", self.last_tasks)
+            ("last", self.last_tasks),
+            ("spool", self.spool_status),
         )
 
     async def last_tasks(self, *args) -> ActionResult:
@@ -33,7 +39,8 @@ class InboxManagement(AbstractPlugin):
         titles = await self._notion.last_inbox_pages(tasks_number)
         titles = list(map(protect_for_html, titles))
         message = ["<b>List of tasks</b>"] + titles
-        return ActionResult("\n".join(message))
+        return ActionResult("\n".join(message)
+                            + stale_mark(self._notion.stale_age("inbox")))
 
     async def delete_last_n(self, *args) -> ActionResult:
         if len(args) < 1:
@@ -42,20 +49,39 @@ class InboxManagement(AbstractPlugin):
                                 "<pre>delete_last 10 </pre>")
         try:
             n = int(args[0])
-            await self._notion.archive_n_pages(n)
-            return ActionResult(f"{n} pages have been deleted")
+            result = await self._notion.archive_n_pages(n)
+            message = f"{len(result.done)} pages have been deleted"
+            if result.failed:
+                message += (f"\n{len(result.failed)} pages could not be "
+                            "deleted, try again later")
+            return ActionResult(message)
         except ValueError:
             return ActionResult(f"Invalid number of pages: {args[0]}")
         except Exception as e:
             logging.exception(f"[Inbox Managenet]: {e}")
             return ActionResult(f"Some error occured during deletion")
 
+    async def spool_status(self, *args) -> ActionResult:
+        pending, failed, drain_rate = self._spool.chat_status(
+            current_tenant.get().chat_id
+        )
+        message = [
+            "<b>Inbox spool</b>",
+            f"waiting: {pending}",
+            f"drain rate: {drain_rate:.1f} per minute",
+        ]
+        if failed:
+            message.append(f"rejected by Notion: {failed}")
+        return ActionResult("\n".join(message))
+
     def help(self, *args) -> dict[str, tuple[str, ...]]:
         return {
             "delete last N tasks from inbox":
                 ('/delete <n>', '/delete_last <n>', '/del_last <n>'),
             "show last N (default is 10) tasks in inbox":
                 ('/inbox [n]', '/last [n]'),
+            "show messages of this chat waiting to be sent to Notion":
+                ('/spool', ),
         }
 
     def daily_events(self) -> EventsScheduleT:
@@ -3,8 +3,9 @@ from datetime import datetime
 
 from extension import AbstractPlugin, ActionResult
 from extension.exttypes import CommandBindingsT, EventsScheduleT
-from mynotion import Notion
-from tools import protect_for_html, dt_from_time, time_from_args
+from mynotion import Notion, CalendarEvent
+from tenants import TenantLocal, current_tenant
+from tools import protect_for_html, dt_from_time, time_from_args, stale_mark
 from config import MORNING_MESSAGE_TIME
 
 GOOD_MORNING_PHRASES = [
@@ -33,11 +34,15 @@ MONDAY_WISHES = [
 
 
 class MorningSummary(AbstractPlugin):
+    # send time of chats which did not change it
     _send_dtime: datetime
+    # send time of each chat
+    _chat_send_dtime: TenantLocal[datetime]
     def __init__(self) -> None:
         super().__init__("MorningSummary")
         self._notion = Notion()
         self._send_dtime = dt_from_time(MORNING_MESSAGE_TIME)
+        self._chat_send_dtime = TenantLocal(lambda: self._send_dtime)
 
     def user_commands(self) -> CommandBindingsT:
         return (
@@ -49,7 +54,7 @@ class MorningSummary(AbstractPlugin):
         return {
             "Show \"morning message\" now":
                 ('/morning', ),
-            "Update \"morning message\" sending time. "
+            "Update \"morning message\" sending time for this chat. "
             "Send it without arguments to find out the current value":
                 ('/morning_sendtime [time]', ),
         }
@@ -65,28 +70,24 @@ class MorningSummary(AbstractPlugin):
     def disordered_events(self) -> EventsScheduleT:
         return ()
 
-    def _fmt_event_time(self, event):
+    def _fmt_event_time(self, event: CalendarEvent):
         result = ''
-        if event['end']:
-            result = event['start'].strftime(" %d/%m")
-        if event['start'].hour or event['start'].minute:
-            result = result + event['start'].strftime(" %H:%M")
-        if event['end']:
-            result = result + event['end'].strftime(" — %d/%m")
-            if event['end'].hour or event['end'].minute:
-                result = result + event['end'].strftime(" %H:%M")
+        if event.end:
+            result = event.start.strftime(" %d/%m")
+        if event.start.hour or event.start.minute:
+            result = result + event.start.strftime(" %H:%M")
+        if event.end:
+            result = result + event.end.strftime(" — %d/%m")
+            if event.end.hour or event.end.minute:
+                result = result + event.end.strftime(" %H:%M")
         return result
 
     def _gather_base_summary(self, calendar, current_tasks):
         lines = []
         events = []
-        now = datetime.now()
         for event in calendar:
-            if now.date() == event['start'].date() or (now.date() >= event['start'].date()
-                                                       and event['end']
-                                                       and event['end'].date() >= now.date()):
-                line = ' > ' + event['title'] + self._fmt_event_time(event)
-                events.append(protect_for_html(line))
+            line = ' > ' + event.title + self._fmt_event_time(event)
+            events.append(protect_for_html(line))
         if events:
             lines.append("<b>События календаря:</b>")
             events[-1] = events[-1] + '\n'
@@ -115,17 +116,18 @@ class MorningSummary(AbstractPlugin):
         message.append(choice(pool))
 
     async def morning_message(self, *args) -> ActionResult:
-        calendar = await self._notion.get_calendar_events()
+        calendar = await self._notion.calendar_events_on(datetime.now().date())
         tasks = await self._notion.get_current_tasks()
-        tasks = list(tasks.values())
+        tasks = [task.title for task in tasks]
         message_data = self._gather_base_summary(calendar, tasks)
         self._say_goodmorning(message_data)
         self._wish_goodday(message_data)
-        return ActionResult("\n".join(message_data))
+        stale = self._notion.stale_age("calendar", "current_tasks")
+        return ActionResult("\n".join(message_data) + stale_mark(stale))
 
     async def clarify_send_time(self, *args) -> ActionResult:
         if len(args) < 1:
-            return ActionResult(str(self._send_dtime.time()))
+            return ActionResult(str(self._chat_send_dtime.get().time()))
         else:
             return self.set_send_time(*args)
 
@@ -133,6 +135,11 @@ class MorningSummary(AbstractPlugin):
         new_time = time_from_args(args)
         if isinstance(new_time, str):
             return ActionResult(new_time)
-        self._send_dtime = dt_from_time(new_time)
-        return ActionResult("New morning message time: "
-                            f"{self._send_dtime.time()}")
+        self._chat_send_dtime.set(dt_from_time(new_time))
+        message = ("New morning message time: "
+                   f"{self._chat_send_dtime.get().time()}")
+        if not (self.scheduler and self.scheduler.reschedule(
+                    self, self.morning_message, new_time,
+                    chat_id=current_tenant.get().chat_id)):
+            message += "\nIt will be applied after restart"
+        return ActionResult(message)
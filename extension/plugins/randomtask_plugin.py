@@ -1,42 +1,118 @@
-from collections.abc import Callable
-from datetime import datetime
-from random import choice
-from typing import Any
+import logging
+from collections.abc import Iterable
+from datetime import timedelta
+from random import randrange
 
 from extension import AbstractPlugin, ActionResult
-from extension.exttypes import ActionT, CommandBindingsT, EventsScheduleT
-from tools import protect_for_html
-from mynotion import Notion
+from extension.exttypes import (
+    CommandBindingsT, EventsScheduleT, RefreshEventsT
+)
+from tools import protect_for_html, stale_mark
+from mynotion import Notion, CurrentTask
+from tenants import TenantLocal
+from config import TASK_INDEX_REFRESH_INTERVAL
+
+
+class TaskIndex:
+    """Current tasks with O(1) random choice, removal and insertion."""
+    __slots__ = (
+        "_tasks",
+        "_positions",
+        "loaded",
+    )
+    _tasks: list[CurrentTask]
+    # task id -> index in `_tasks`
+    _positions: dict[str, int]
+    # was the index ever filled from Notion
+    loaded: bool
+
+    def __init__(self) -> None:
+        self._tasks = []
+        self._positions = {}
+        self.loaded = False
+
+    def reset(self, tasks: Iterable[CurrentTask]):
+        self._tasks = list({t.id: t for t in tasks}.values())
+        self._positions = {t.id: i for i, t in enumerate(self._tasks)}
+        self.loaded = True
+
+    def add(self, task: CurrentTask):
+        if task.id in self._positions:
+            self._tasks[self._positions[task.id]] = task
+            return
+        self._positions[task.id] = len(self._tasks)
+        self._tasks.append(task)
+
+    def remove(self, task_id: str) -> CurrentTask | None:
+        pos = self._positions.pop(task_id, None)
+        if pos is None:
+            return None
+        task = self._tasks[pos]
+        last = self._tasks.pop()
+        if last is not task:
+            # move the last task into the hole
+            self._tasks[pos] = last
+            self._positions[last.id] = pos
+        return task
+
+    def choice(self) -> CurrentTask | None:
+        if not self._tasks:
+            return None
+        return self._tasks[randrange(len(self._tasks))]
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+
+class TaskState:
+    """Task index and last chosen task of one tenant"""
+    __slots__ = (
+        "index",
+        "last_task",
+    )
+    index: TaskIndex
+    last_task: CurrentTask | None
+
+    def __init__(self) -> None:
+        self.index = TaskIndex()
+        self.last_task = None
 
 
 class RandomCurrentTask(AbstractPlugin):
     __slots__ = (
-        "_last_task_id",
-        "_last_task_name",
-        "_notion"
+        "_notion",
+        "_state",
     )
-    # page_id of last chosen taks
-    _last_task_id: str | None
-    _last_task_name: str
+    _state: TenantLocal[TaskState]
 
     def __init__(self) -> None:
         super().__init__(name="RandomCurrentTask")
-        self._last_task_id = None
         self._notion = Notion()
+        self._state = TenantLocal(TaskState)
 
     async def random_current_task(self, *args) -> ActionResult:
-        tasks = await self._notion.get_current_tasks()
-        task_id, task_title = choice(tuple(tasks.items()))
-        self._last_task_id = task_id
-        self._last_task_name = task_title
+        state = self._state.get()
+        if not state.index.loaded:
+            state.index.reset(await self._notion.get_current_tasks())
+        # the index may keep tasks archived outside of the bot
+        # until the next full sync of the mirror
+        while ((task := state.index.choice()) is not None
+               and not await self._notion.page_is_live(task.id)):
+            state.index.remove(task.id)
+        if task is None:
+            return ActionResult("There are no current tasks!")
+        state.last_task = task
         return ActionResult(
-            message=protect_for_html(task_title)
+            message=(protect_for_html(task.title)
+                     + stale_mark(self._notion.stale_age("current_tasks")))
         )
 
     async def complete_last_task(self, *args) -> ActionResult:
-        if self._last_task_id:
-            await self._notion.archive_page(self._last_task_id)
-            message = f"The task \"{self._last_task_name}\" is archived!"
+        state = self._state.get()
+        if state.last_task:
+            await self._notion.archive_page(state.last_task.id)
+            state.index.remove(state.last_task.id)
+            message = f"The task \"{state.last_task.title}\" is archived!"
         else:
             message = "There are no last random task!"
         return ActionResult(
@@ -44,13 +120,26 @@ class RandomCurrentTask(AbstractPlugin):
         )
 
     async def doagain_last_task(self, *args) -> ActionResult:
-        if self._last_task_id:
-            await self._notion.unarchive_page(self._last_task_id)
+        state = self._state.get()
+        if state.last_task:
+            await self._notion.unarchive_page(state.last_task.id)
+            state.index.add(state.last_task)
             message = "The task is back!"
         else:
             message = "There are no last random task!"
         return ActionResult(message=message)
 
+    async def reconcile_index(self, *args) -> ActionResult:
+        """Refresh event: bring the task index in line with Notion"""
+        try:
+            await self._notion.sync("current_tasks")
+            self._state.get().index.reset(
+                await self._notion.get_current_tasks()
+            )
+        except Exception:
+            logging.exception(f"[{self.name}] cannot reconcile task index")
+        return ActionResult()
+
     def user_commands(self) -> CommandBindingsT:
         return (
             ("rtask", self.random_current_task),
@@ -78,4 +167,10 @@ class RandomCurrentTask(AbstractPlugin):
     def disordered_events(self) -> EventsScheduleT:
         return ()
 
+    def refresh_events(self) -> RefreshEventsT:
+        return (
+            (timedelta(seconds=TASK_INDEX_REFRESH_INTERVAL),
+             self.reconcile_index),
+        )
+
 plg = RandomCurrentTask
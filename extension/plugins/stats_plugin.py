@@ -0,0 +1,79 @@
+from extension import AbstractPlugin, ActionResult
+from extension.exttypes import CommandBindingsT, EventsScheduleT
+from metrics import Histogram, metrics
+from tools import protect_for_html
+
+# /stats argument -> section title and metric family
+SECTIONS = {
+    "plugins": ("Plugin actions", "bot_plugin_action"),
+    "notion": ("Notion requests", "bot_notion_request"),
+    "connections": ("Notion connections (reused)", "bot_notion_connection"),
+    "handshakes": ("Notion handshakes", "bot_notion_handshake"),
+    "limiter": ("Notion rate limiter waits", "bot_notion_limiter_wait"),
+    "telegram": ("Telegram sends", "bot_telegram_send"),
+    "delivery": ("Telegram delivery (queue included)", "bot_send_latency"),
+}
+# rows per section, the slowest ones by total time
+MAX_ROWS = 15
+
+
+class StatsPlugin(AbstractPlugin):
+    """Latencies and errors collected since the bot start"""
+
+    def __init__(self) -> None:
+        super().__init__("Stats")
+
+    async def show_stats(self, *args) -> ActionResult:
+        sections = [a.lower() for a in args if a.lower() in SECTIONS]
+        message = []
+        for key in sections or SECTIONS:
+            title, family = SECTIONS[key]
+            series = metrics.series(family)
+            message.append(f"<b>{title}</b>")
+            if not series:
+                message.append("no calls yet\n")
+                continue
+            rows = sorted(series.items(), key=lambda s: s[1].sum,
+                          reverse=True)
+            lines = [_row(labels, h) for labels, h in rows[:MAX_ROWS]]
+            if len(rows) > MAX_ROWS:
+                lines.append(f"... and {len(rows) - MAX_ROWS} more")
+            message.append("<pre>" + protect_for_html("\n".join(lines))
+                           + "</pre>")
+        return ActionResult("\n".join(message))
+
+    def user_commands(self) -> CommandBindingsT:
+        return (
+            ("stats", self.show_stats),
+        )
+
+    def help(self, *args) -> dict[str, tuple[str, ...]]:
+        return {
+            "Latency (p50/p95/max) and errors of plugin actions, "
+            "Notion requests, connections and rate limiter waits, "
+            "Telegram sends and delivery":
+                ("/stats [plugins|notion|connections|handshakes|limiter"
+                 "|telegram|delivery]", ),
+        }
+
+    def daily_events(self) -> EventsScheduleT:
+        return ()
+
+    def monthly_events(self) -> EventsScheduleT:
+        return ()
+
+    def disordered_events(self) -> EventsScheduleT:
+        return ()
+
+
+def _row(labels: tuple[tuple[str, str], ...], h: Histogram) -> str:
+    name = " ".join(value for _, value in labels) or "all"
+    errors = f" err {h.errors}" if h.errors else ""
+    return (f"{name}\n  n {h.count}{errors} p50 {_ms(h.quantile(0.5))} "
+            f"p95 {_ms(h.quantile(0.95))} max {_ms(h.max)}")
+
+
+def _ms(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.1f}s"
+    return f"{seconds * 1000:.0f}ms"
@@ -1,8 +1,8 @@
-from datetime import time, datetime, timedelta
+from datetime import datetime, timedelta
 
 from extension import AbstractPlugin, ActionResult
 from extension.exttypes import CommandBindingsT, EventsScheduleT
-from tools import time_from_args, dt_from_time
+from tools import time_from_args
 from config import TIMEZONE
 
 class TimerPlugin(AbstractPlugin):
@@ -32,17 +32,15 @@ class TimerPlugin(AbstractPlugin):
             minutes=ttime.minute,
             seconds=ttime.second
             )
-        beep = self.timer_beep_factory(tdelta)
         return ActionResult(
             message="Timer is set",
             next_datetime=datetime.now(TIMEZONE) + tdelta,
-            next_action=beep
+            next_action=self.timer_beep,
+            next_args=(str(tdelta), )
         )
 
-    def timer_beep_factory(self, timertime: timedelta):
-        async def timer_beep(*args) -> ActionResult:
-            return ActionResult(f"Ring!!! {timertime} is done")
-        return timer_beep
+    async def timer_beep(self, timertime: str) -> ActionResult:
+        return ActionResult(f"Ring!!! {timertime} is done")
 
     def daily_events(self) -> EventsScheduleT:
         return ()
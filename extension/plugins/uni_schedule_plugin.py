@@ -1,28 +1,49 @@
 from datetime import datetime, date, time, timedelta
+import logging
 import textwrap
 
 from extension import AbstractPlugin, ActionResult
-from extension.exttypes import CommandBindingsT, EventsScheduleT
+from extension.exttypes import (
+    CommandBindingsT, EventsScheduleT, RefreshEventsT
+)
 from mynotion import Notion
-from tools import protect_for_html, time_from_args, dt_from_time
+from tenants import TenantLocal, current_tenant
+from tools import protect_for_html, time_from_args, dt_from_time, stale_mark
 from config import (
     TODAY_SCHED_TIME,
     TOMMOROW_SCHED_TIME,
     TIMEZONE,
-    FIRST_SCHEDULE_WEEK
+    FIRST_SCHEDULE_WEEK,
+    SCHEDULE_REFRESH_INTERVAL,
 )
 
+SCHEDULE_HEADER = ("%-2s %-5s %-7s %-20s" % ("#", "нач.", "каб.", "предмет"),
+                   "-"*38)
+TIMELINE = protect_for_html('>' + '- '*18 + '<')
+
+# rendered pairs of a day: start time and text block of each pair
+RenderedDayT = tuple[tuple[time, str], ...]
+
 class UniSchedule(AbstractPlugin):
     __slots__ = (
         "_td_send_time",
         "_notion",
         "_tm_send_enabled",
-        "_tm_send_time"
+        "_tm_send_time",
+        "_rendered",
+        "_rendered_version",
     )
     _notion: Notion
+    # send times of chats which did not change them
+    # (times of chats are kept by the scheduler)
     _td_send_time: time
-    _tm_send_enabled: bool
+    # is schedule for tomorrow sent to each chat
+    _tm_send_enabled: TenantLocal[bool]
     _tm_send_time: time
+    # pre-rendered schedule of each tenant, keys are `(weekday, even_week)`
+    _rendered: TenantLocal[dict[tuple[int, bool], RenderedDayT]]
+    # version of the schedule mirror (`Notion.version`) at rendering
+    _rendered_version: TenantLocal[int]
 
     # Note: Plugin methods should return `datetime` (not `time`),
     #   but, for daily events date part is ignored, so
@@ -34,8 +55,10 @@ class UniSchedule(AbstractPlugin):
         super().__init__("UniSchedule")
         self._notion = Notion()
         self._td_send_time = td_schedule_send
-        self._tm_send_enabled = True
+        self._tm_send_enabled = TenantLocal(lambda: True)
         self._tm_send_time = tom_schedule_send
+        self._rendered = TenantLocal(dict)
+        self._rendered_version = TenantLocal(lambda: -1)
 
     def user_commands(self) -> CommandBindingsT:
         return (
@@ -55,9 +78,9 @@ class UniSchedule(AbstractPlugin):
                 ('/yschedule', ),
             "Tommorow's schedule":
                 ('/tschedule', ),
-            "Set schedule send today's tommorow's,time ":
+            "Set schedule send today's tommorow's,time for this chat":
                 ('/schedule_settime <time>', '/tschedule_settime <time>'),
-            "Toggle tommorow's schedule send":
+            "Toggle tommorow's schedule send for this chat":
                 ('/tschedule_togglesend [ON/OFF]', ),
         }
 
@@ -74,17 +97,37 @@ class UniSchedule(AbstractPlugin):
 
     def disordered_events(self) -> EventsScheduleT:
         return ()
-    
+
+    def refresh_events(self) -> RefreshEventsT:
+        return (
+            (timedelta(seconds=SCHEDULE_REFRESH_INTERVAL),
+             self.refresh_schedule),
+        )
+
     def even_week(self, curdate: date) -> bool:
         days_diff = (curdate - FIRST_SCHEDULE_WEEK).days
         return days_diff // 7 % 2 != 0
 
-    async def fmt_schedule_message(self, day: date) -> str:
-        schedule = await self._notion.uni_daily_schedule(day, self.even_week(day))
-        schedule = sorted(schedule)
-        message = ["%-2s %-5s %-7s %-20s" % ("#", "нач.", "каб.", "предмет"),
-                   "-"*38]
-        timeline_flag = True
+    async def refresh_schedule(self, *args) -> ActionResult:
+        """Refresh event: re-render schedule if it is changed in Notion"""
+        try:
+            await self._notion.sync("uni_schedule")
+            # the mirror is also synced by others (e.g. the replica
+            # refresh), so its version is compared, not the result
+            version = self._notion.version("uni_schedule")
+            if version != self._rendered_version.get():
+                index = await self._notion.uni_schedule_index()
+                rendered = self._rendered.get()
+                rendered.clear()
+                rendered.update((key, self._render_pairs(schedule))
+                                for key, schedule in index.items())
+                self._rendered_version.set(version)
+        except Exception:
+            logging.exception(f"[{self.name}] cannot refresh schedule")
+        return ActionResult()
+
+    def _render_pairs(self, schedule) -> RenderedDayT:
+        rendered = []
         for num, pair_time, subj, _, auditory in schedule:
             ptime = time(*pair_time[1], tzinfo=TIMEZONE)
             message_line = "%-2s %02d:%02d %-7s %-20s" % (
@@ -96,12 +139,25 @@ class UniSchedule(AbstractPlugin):
             message_line = protect_for_html(message_line)
             message_line = textwrap.wrap(message_line, width=38,
                                          subsequent_indent=' '*17)
+            rendered.append((ptime, '\n'.join(message_line) + '\n'))
+        return tuple(rendered)
+
+    async def fmt_schedule_message(self, day: date) -> str:
+        key = (day.weekday(), self.even_week(day))
+        rendered = self._rendered.get()
+        if key not in rendered:
+            schedule = await self._notion.uni_daily_schedule(day, key[1])
+            rendered[key] = self._render_pairs(schedule)
+        message = list(SCHEDULE_HEADER)
+        timeline_flag = True
+        for ptime, pair_block in rendered[key]:
             # Print current timeline
-            if (datetime.now(TIMEZONE) < dt_from_time(ptime) and timeline_flag):
-                message_line.insert(0, protect_for_html('>' + '- '*18 + '<'))
+            if (timeline_flag and datetime.now(TIMEZONE) < dt_from_time(ptime)):
+                pair_block = TIMELINE + '\n' + pair_block
                 timeline_flag = False
-            message.append('\n'.join(message_line ) + '\n')
-        return "<pre>" + '\n'.join(message) + "</pre>"
+            message.append(pair_block)
+        return ("<pre>" + '\n'.join(message) + "</pre>"
+                + stale_mark(self._notion.stale_age("uni_schedule")))
 
     async def today(self, *args) -> ActionResult:
         message=await self.fmt_schedule_message(date.today())
@@ -118,7 +174,7 @@ class UniSchedule(AbstractPlugin):
         return ActionResult("Вчерашнее расписание:\n" + message)
 
     async def tomorrow_autosend(self, *args) -> ActionResult:
-        if self._tm_send_enabled:
+        if self._tm_send_enabled.get():
             return await self.tomorrow(self, *args)
         return ActionResult()
 
@@ -126,23 +182,32 @@ class UniSchedule(AbstractPlugin):
         time_or_exc = time_from_args(args)
         if isinstance(time_or_exc, str):
             return ActionResult(message=time_or_exc)
-        self._td_send_time = time_or_exc
         return ActionResult(
-            message=("New schedule send time:" +
-                     time_or_exc.strftime("%H:%M:%S") + "\n" +
-                     "Please, reload daily events to apply this change")
+            message=("New schedule send time: " +
+                     time_or_exc.strftime("%H:%M:%S") +
+                     self._reschedule(self.today, time_or_exc))
         )
 
     async def toggle_send_tomorrow(self, *args: str) -> ActionResult:
         if 0 < len(args) < 2:
             match args[0].upper():
                 case "ON":
-                    self._tm_send_enabled = True
+                    self._tm_send_enabled.set(True)
+                    if self.scheduler:
+                        self.scheduler.resume(
+                            self, self.tomorrow_autosend,
+                            chat_id=current_tenant.get().chat_id
+                        )
                     return ActionResult(
                         "enabled auto sending schedule for tommorow"
                     )
                 case "OFF":
-                    self._tm_send_enabled = False
+                    self._tm_send_enabled.set(False)
+                    if self.scheduler:
+                        self.scheduler.pause(
+                            self, self.tomorrow_autosend,
+                            chat_id=current_tenant.get().chat_id
+                        )
                     return ActionResult(
                         "diabled auto sending schedule for tommorow"
                     )
@@ -152,9 +217,16 @@ class UniSchedule(AbstractPlugin):
         time_or_exc = time_from_args(args)
         if isinstance(time_or_exc, str):
             return ActionResult(message=time_or_exc)
-        self._tm_send_time = time_or_exc
         return ActionResult(
-            message=("New send time of schedule for tommorow :" +
-                     time_or_exc.strftime("%H:%M:%S") + "\n" +
-                     "Please, reload daily events to apply this change")
+            message=("New send time of schedule for tommorow: " +
+                     time_or_exc.strftime("%H:%M:%S") +
+                     self._reschedule(self.tomorrow_autosend, time_or_exc))
         )
+
+    def _reschedule(self, action, new_time: time) -> str:
+        """Move daily event of the chat, return a note if it is not possible"""
+        if self.scheduler and self.scheduler.reschedule(
+                self, action, new_time,
+                chat_id=current_tenant.get().chat_id):
+            return ""
+        return "\nIt will be applied after restart"
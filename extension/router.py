@@ -0,0 +1,120 @@
+from __future__ import annotations
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+from telegram import MessageEntity, Update
+from telegram.ext import Application, BaseHandler, CallbackContext, filters
+
+HandlerCallback = Callable[[Update, CallbackContext], Awaitable[Any]]
+
+
+@dataclass(frozen=True, slots=True)
+class Route:
+    plugin: str
+    callback: HandlerCallback
+
+
+# check result: the route and command arguments
+CheckResultT = tuple[Route, list[str]]
+
+
+class CommandRouter(BaseHandler[Update, CallbackContext, None]):
+    """One handler for commands of all plugins.
+
+    Command is looked up in a dict instead of checking a
+    `CommandHandler` per alias. Unknown commands are not handled,
+    so they go to the next handlers (e.g. the inbox).
+    """
+    __slots__ = ("_routes", )
+    # command name (lowercase) -> route
+    _routes: dict[str, Route]
+
+    def __init__(self, block: bool = False) -> None:
+        super().__init__(self._no_callback, block=block)
+        self._routes = {}
+
+    @staticmethod
+    async def _no_callback(update: Update, context: CallbackContext):
+        # callbacks are taken from routes in `handle_update`,
+        # this one is never expected to run
+        logging.error("Command router: update is handled without a route")
+        if update.effective_message is not None:
+            await update.effective_message.reply_text(
+                "Command is not available, try again later")
+
+    def add(self, command: str, plugin: str,
+            callback: HandlerCallback) -> bool:
+        """Route the command to the plugin callback.
+        Return `False` if the command belongs to another plugin
+        or the callback is missing.
+        """
+        if not callable(callback):
+            logging.error(f"[{plugin}]: command /{command} has no callback, "
+                          "skipping it")
+            return False
+        command = command.lower()
+        route = self._routes.get(command)
+        if route is not None and route.plugin != plugin:
+            logging.error(f"[{plugin}]: command /{command} is already "
+                          f"used by [{route.plugin}], skipping it")
+            return False
+        if route is not None:
+            logging.warning(f"[{plugin}]: command /{command} is declared "
+                            "twice, the last one is used")
+        self._routes[command] = Route(plugin, callback)
+        return True
+
+    def remove(self, command: str):
+        self._routes.pop(command.lower(), None)
+
+    def remove_plugin(self, plugin: str) -> list[str]:
+        """Remove all commands of the plugin, return them"""
+        commands = self.commands(plugin)
+        for command in commands:
+            del self._routes[command]
+        return commands
+
+    def commands(self, plugin: str) -> list[str]:
+        return [command for command, route in self._routes.items()
+                if route.plugin == plugin]
+
+    def plugin_of(self, update: object) -> str | None:
+        """Name of the plugin which would handle the update"""
+        check = self.check_update(update)
+        return check[0].plugin if check else None
+
+    def check_update(self, update: object) -> CheckResultT | None:
+        # the same messages as `CommandHandler` handles
+        if not (isinstance(update, Update)
+                and filters.UpdateType.MESSAGES.check_update(update)):
+            return None
+        message = update.effective_message
+        if not (message.text
+                and message.entities
+                and message.entities[0].type == MessageEntity.BOT_COMMAND
+                and message.entities[0].offset == 0):
+            return None
+        command, _, bot_name = message.text[1:message.entities[0].length] \
+                                      .partition("@")
+        route = self._routes.get(command.lower())
+        if route is None:
+            return None
+        if bot_name and bot_name.lower() != message.get_bot().username.lower():
+            return None     # command for another bot
+        return route, message.text.split()[1:]
+
+    def collect_additional_context(self, context: CallbackContext,
+                                   update: Update,
+                                   application: Application,
+                                   check_result: CheckResultT) -> None:
+        context.args = check_result[1]
+
+    async def handle_update(self, update: Update,
+                            application: Application,
+                            check_result: CheckResultT,
+                            context: CallbackContext) -> Any:
+        self.collect_additional_context(context, update, application,
+                                        check_result)
+        return await check_result[0].callback(update, context)
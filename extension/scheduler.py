@@ -0,0 +1,220 @@
+from __future__ import annotations
+import logging
+from dataclasses import dataclass
+from datetime import datetime, time
+from typing import TYPE_CHECKING
+
+from telegram.ext import CallbackContext, Job, JobQueue
+
+from config import TIMEZONE
+
+if TYPE_CHECKING:
+    from extension import AbstractPlugin
+    from extension.exttypes import ActionT
+    from extension.jobstore import JobStore
+
+
+@dataclass(slots=True)
+class _Entry:
+    job: Job
+    # time of day of the event
+    when: time
+    # day of month for monthly events, `None` for daily ones
+    day: int | None
+    paused: bool = False
+
+
+class Scheduler:
+    """Daily and monthly plugin events by plugin and action.
+
+    Plugins use it (`AbstractPlugin.scheduler`) to move, pause
+    or cancel their own events while the bot is running.
+    An event is shared by all tenants, but a tenant can move or pause
+    it for its chat (`chat_id`): then the chat gets its own job and
+    the shared one skips it (see `has_own`).
+    With `fired` store an event is run at most once per day and time
+    by all processes sharing the store (see `JobStore.claim`).
+    """
+    __slots__ = (
+        "_job_queue",
+        "_fired",
+        "_entries",
+        "_chats",
+    )
+    _job_queue: JobQueue
+    _fired: JobStore | None
+    # (plugin name, action name) -> scheduled event
+    _entries: dict[tuple[str, str], _Entry]
+    # (plugin name, action name, chat id) -> the event of the chat
+    _chats: dict[tuple[str, str, int], _Entry]
+
+    def __init__(self, job_queue: JobQueue,
+                 fired: JobStore | None = None) -> None:
+        self._job_queue = job_queue
+        self._fired = fired
+        self._entries = {}
+        self._chats = {}
+
+    def run_daily(self, plg: AbstractPlugin, action: ActionT,
+                  callback, when: time, chat_id: int | None) -> Job:
+        key = self._key(plg, action)
+        job = self._start(self._once(key, callback), plg.name,
+                          when, None, chat_id)
+        self._entries[key] = _Entry(job, when, None)
+        return job
+
+    def run_monthly(self, plg: AbstractPlugin, action: ActionT,
+                    callback, when: time, day: int,
+                    chat_id: int | None) -> Job:
+        key = self._key(plg, action)
+        job = self._start(self._once(key, callback), plg.name,
+                          when, day, chat_id)
+        self._entries[key] = _Entry(job, when, day)
+        return job
+
+    def reschedule(self, plg: AbstractPlugin, action: ActionT,
+                   when: time, day: int | None = None,
+                   chat_id: int | None = None) -> bool:
+        """Move the event to another time (and day of month
+        for monthly events), only for the chat if `chat_id` is given.
+        Paused event stays paused.
+        Return `False` if the event is not scheduled.
+        """
+        entry = self._entry(plg, action, chat_id)
+        if entry is None:
+            return False
+        old = entry.job
+        old.schedule_removal()
+        if entry.day is not None:
+            entry.day = day or entry.day
+        job = self._start(old.callback, old.name, when, entry.day,
+                          old.chat_id)
+        if entry.paused:
+            job.enabled = False
+        entry.job = job
+        entry.when = when
+        logging.info(f"[{plg.name}] event '{action.__name__}' "
+                     f"is moved to {when}"
+                     + (f" for chat {chat_id}" if chat_id else ""))
+        return True
+
+    def pause(self, plg: AbstractPlugin, action: ActionT,
+              chat_id: int | None = None) -> bool:
+        return self._set_enabled(plg, action, False, chat_id)
+
+    def resume(self, plg: AbstractPlugin, action: ActionT,
+               chat_id: int | None = None) -> bool:
+        return self._set_enabled(plg, action, True, chat_id)
+
+    def cancel(self, plg: AbstractPlugin, action: ActionT) -> bool:
+        """Cancel the event for all chats"""
+        key = self._key(plg, action)
+        for chat_key in [k for k in self._chats if k[:2] == key]:
+            self._chats.pop(chat_key).job.schedule_removal()
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry.job.schedule_removal()
+        logging.info(f"[{plg.name}] event '{action.__name__}' is cancelled")
+        return True
+
+    def has_own(self, plg: AbstractPlugin, action: ActionT,
+                chat_id: int) -> bool:
+        """Is the event moved or paused for the chat"""
+        return (*self._key(plg, action), chat_id) in self._chats
+
+    def next_time(self, plg: AbstractPlugin, action: ActionT,
+                  chat_id: int | None = None) -> datetime | None:
+        """Next run of the event (for the chat if it has its own),
+        `None` if it is paused or not scheduled
+        """
+        key = self._key(plg, action)
+        entry = self._chats.get((*key, chat_id)) or self._entries.get(key)
+        return entry.job.next_t if entry else None
+
+    def next_fire(self) -> datetime | None:
+        """Earliest next run of all events, `None` if nothing is scheduled"""
+        return min((entry.job.next_t
+                    for entry in (*self._entries.values(),
+                                  *self._chats.values())
+                    if entry.job.next_t is not None), default=None)
+
+    def forget(self, plugin_name: str):
+        """Drop entries of the plugin, its jobs are removed by the caller"""
+        for key in [key for key in self._entries if key[0] == plugin_name]:
+            del self._entries[key]
+        for key in [key for key in self._chats if key[0] == plugin_name]:
+            del self._chats[key]
+
+    def _set_enabled(self, plg: AbstractPlugin, action: ActionT,
+                     enabled: bool, chat_id: int | None) -> bool:
+        entry = self._entry(plg, action, chat_id)
+        if entry is None:
+            return False
+        entry.job.enabled = enabled
+        entry.paused = not enabled
+        return True
+
+    def _entry(self, plg: AbstractPlugin, action: ActionT,
+               chat_id: int | None) -> _Entry | None:
+        """Shared event, or the event of the chat (it is copied
+        from the shared one on the first change for the chat)
+        """
+        key = self._key(plg, action)
+        shared = self._entries.get(key)
+        if chat_id is None or shared is None:
+            return shared
+        entry = self._chats.get((*key, chat_id))
+        if entry is None:
+            job = self._start(shared.job.callback, shared.job.name,
+                              shared.when, shared.day, chat_id)
+            job.enabled = not shared.paused
+            entry = self._chats[(*key, chat_id)] = _Entry(
+                job, shared.when, shared.day, shared.paused
+            )
+        return entry
+
+    def _start(self, callback, name: str, when: time, day: int | None,
+               chat_id: int | None) -> Job:
+        """Daily job, or monthly one if `day` is given"""
+        if day is None:
+            return self._job_queue.run_daily(
+                callback,
+                time=when,
+                name=name,
+                chat_id=chat_id
+            )
+        return self._job_queue.run_monthly(
+            callback,
+            when=when,
+            day=day,
+            name=name,
+            chat_id=chat_id
+        )
+
+    def _once(self, key: tuple[str, str], callback):
+        """Wrap the event callback, so that the event is skipped
+        if it is already fired today at its current time
+        """
+        if self._fired is None:
+            return callback
+
+        async def once(context: CallbackContext):
+            chat_id = context.job.chat_id
+            entry = (self._entries.get(key) if chat_id is None
+                     else self._chats.get((*key, chat_id)))
+            if entry is not None:
+                today = datetime.now(TIMEZONE).date()
+                fire = f"{key[0]}.{key[1]}@{today}T{entry.when}"
+                if chat_id is not None:
+                    fire += f"#{chat_id}"
+                if not self._fired.claim(fire):
+                    logging.info(f"[{key[0]}] event '{key[1]}' is already "
+                                 "fired by another worker")
+                    return
+            await callback(context)
+        return once
+
+    @staticmethod
+    def _key(plg: AbstractPlugin, action: ActionT) -> tuple[str, str]:
+        return plg.name, action.__name__
@@ -0,0 +1,10 @@
+from .spool import InboxSpool, SpoolEntry
+from .drainer import InboxDrainer
+from .ingest import InboxIngest
+
+__all__ = [
+    "InboxSpool",
+    "SpoolEntry",
+    "InboxDrainer",
+    "InboxIngest",
+]
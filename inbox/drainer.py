@@ -0,0 +1,163 @@
+from __future__ import annotations
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+
+from httpx import HTTPError
+from notion_client import APIErrorCode, APIResponseError
+from notion_client.errors import RequestTimeoutError
+
+from inbox.spool import InboxSpool, SpoolEntry
+from mynotion import Notion, is_unavailable
+from tenants import tenants, as_tenant
+from tools import protect_for_html
+from config import TRY_SEND_INIT_DELAY, TRY_SEND_MAX_DELAY, INBOX_WORKERS
+
+UNAVAILABLE_ERR = "Service Unavailable Err, requests will be send again later"
+RATE_ERR = "Rate Limited Err, requests will be send again later"
+TIMEOUT_ERR = "Notion does not respond, requests will be send again later"
+CANNOTSEND_MSG = "Cannot send a message"
+DRAINER_ERR = "Inbox drainer error, requests will be send again later"
+
+# Notion errors of requests which may succeed if they are sent again
+RETRY_CODES = (
+    APIErrorCode.InternalServerError,
+    APIErrorCode.ServiceUnavailable,
+    APIErrorCode.ConflictError,
+)
+
+NotifyT = Callable[[int, str], Awaitable]
+
+
+class InboxDrainer:
+    """Background task that flushes `InboxSpool` to the Notion inbox.
+
+    Entries of a chat are sent one by one in the order they were
+    spooled; up to `INBOX_WORKERS` chats are served concurrently
+    (the oldest entry of each is sent at once). While Notion is
+    unavailable the drainer waits with exponentially growing delay
+    and tells the user about the outage only once.
+    With `poll` the spool is also checked every `poll` seconds
+    without `wake`, for entries spooled by other processes.
+    """
+    __slots__ = (
+        "_spool",
+        "_notion",
+        "_notify",
+        "_wakeup",
+        "_poll",
+        "_task",
+    )
+    _spool: InboxSpool
+    _notion: Notion
+    _notify: NotifyT
+    _wakeup: asyncio.Event
+    _poll: float | None
+    _task: asyncio.Task | None
+
+    def __init__(self, spool: InboxSpool, notion: Notion, notify: NotifyT,
+                 poll: float | None = None):
+        self._spool = spool
+        self._notion = notion
+        self._notify = notify
+        self._wakeup = asyncio.Event()
+        self._poll = poll
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logging.info(f"Inbox drainer: started, {self._spool.depth} "
+                         "entries in spool")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Tell the drainer that there are new entries in the spool."""
+        self._wakeup.set()
+
+    async def _run(self):
+        delay = TRY_SEND_INIT_DELAY
+        outage_reported = False
+        while True:
+            try:
+                entries = self._spool.peek_chats(INBOX_WORKERS)
+                if not entries:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(),
+                                               self._poll)
+                    except TimeoutError:
+                        pass
+                    continue
+                reasons = await asyncio.gather(*map(self._deliver, entries))
+                failed = [(e, r) for e, r in zip(entries, reasons) if r]
+                if not failed:
+                    delay = TRY_SEND_INIT_DELAY
+                    outage_reported = False
+                    continue
+                entry, reason = failed[0]
+                if not outage_reported:
+                    outage_reported = True
+                    await self._report(entry.chat_id, f"{reason} "
+                                       f"({self._spool.depth} in queue)")
+                logging.warning(f"Inbox drainer: {reason}, "
+                                f"next try in {delay} s")
+            except Exception:
+                # the drainer must not stop, otherwise the spool
+                # grows silently
+                logging.exception(f"{DRAINER_ERR}, next try in {delay} s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, TRY_SEND_MAX_DELAY)
+
+    async def _deliver(self, entry: SpoolEntry) -> str | None:
+        """Send entry to Notion. Return reason if it should be retried."""
+        tenant = tenants.get(entry.chat_id)
+        if tenant is None:
+            # spooled before the chat was removed from tenants
+            logging.error(f"Inbox drainer: chat {entry.chat_id} is not "
+                          f"a tenant, entry is dropped: {entry.text}")
+            self._spool.fail(entry.id)
+            return None
+        try:
+            with as_tenant(tenant):
+                await self._notion.create_page_in_inbox(entry.text)
+        except APIResponseError as notion_err:
+            if notion_err.code == APIErrorCode.RateLimited:
+                return RATE_ERR
+            elif notion_err.code in RETRY_CODES:
+                return UNAVAILABLE_ERR
+            await self._reject(entry)
+            return None
+        except (RequestTimeoutError, HTTPError, TimeoutError):
+            return TIMEOUT_ERR
+        except Exception as err:
+            # e.g. gateway error with not JSON body (`HTTPResponseError`)
+            if is_unavailable(err):
+                return UNAVAILABLE_ERR
+            await self._reject(entry)
+            return None
+        self._spool.ack(entry.id)
+        return None
+
+    async def _reject(self, entry: SpoolEntry):
+        """Stop trying to deliver the entry and tell the user"""
+        logging.exception(f"{CANNOTSEND_MSG}: {entry.text}")
+        self._spool.fail(entry.id)
+        await self._report(
+            entry.chat_id,
+            f"{CANNOTSEND_MSG}: {protect_for_html(entry.text)}"
+        )
+
+    async def _report(self, chat_id: int, text: str):
+        try:
+            await self._notify(chat_id, text)
+        except Exception:
+            logging.exception("Inbox drainer: cannot notify user")
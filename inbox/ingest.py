@@ -0,0 +1,96 @@
+from __future__ import annotations
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from time import monotonic
+
+from inbox.drainer import InboxDrainer, NotifyT
+from inbox.spool import InboxSpool
+from config import INBOX_ACK_DELAY, INBOX_ACK_MAX_WAIT
+
+# how often (seconds) delivery of a finished burst is checked
+ACK_POLL_INTERVAL = 0.5
+
+
+@dataclass(slots=True)
+class _Burst:
+    """Messages of one chat received without a pause"""
+    entry_ids: list[int] = field(default_factory=list)
+    last_seen: float = field(default_factory=monotonic)
+
+
+class InboxIngest:
+    """Entry point of inbox messages.
+
+    A message is spooled (duplicates are dropped) and handed to the
+    drainer. Instead of answering every message, the user gets one
+    acknowledgement per burst: when the chat has been quiet for
+    `INBOX_ACK_DELAY` seconds and the burst is delivered (or
+    `INBOX_ACK_MAX_WAIT` seconds passed).
+    """
+    __slots__ = (
+        "_spool",
+        "_drainer",
+        "_notify",
+        "_bursts",
+        "_acks",
+    )
+    _spool: InboxSpool
+    _drainer: InboxDrainer
+    _notify: NotifyT
+    # chat id -> current burst
+    _bursts: dict[int, _Burst]
+    # acknowledgement tasks, also of bursts which are already finished
+    _acks: set[asyncio.Task]
+
+    def __init__(self, spool: InboxSpool, drainer: InboxDrainer,
+                 notify: NotifyT) -> None:
+        self._spool = spool
+        self._drainer = drainer
+        self._notify = notify
+        self._bursts = {}
+        self._acks = set()
+
+    def submit(self, chat_id: int, message_id: int, text: str) -> bool:
+        """Accept message. Return `False` for already seen message."""
+        entry_id = self._spool.put(text, chat_id, message_id)
+        if entry_id is None:
+            logging.info(f"Inbox: message {message_id} is already spooled")
+            return False
+        self._drainer.wake()
+        burst = self._bursts.get(chat_id)
+        if burst is None:
+            burst = self._bursts[chat_id] = _Burst()
+            ack = asyncio.create_task(self._acknowledge(chat_id))
+            self._acks.add(ack)
+            ack.add_done_callback(self._acks.discard)
+        burst.entry_ids.append(entry_id)
+        burst.last_seen = monotonic()
+        return True
+
+    async def stop(self):
+        acks = list(self._acks)
+        for ack in acks:
+            ack.cancel()
+        await asyncio.gather(*acks, return_exceptions=True)
+        self._bursts.clear()
+
+    async def _acknowledge(self, chat_id: int):
+        burst = self._bursts[chat_id]
+        while (quiet := monotonic() - burst.last_seen) < INBOX_ACK_DELAY:
+            await asyncio.sleep(INBOX_ACK_DELAY - quiet)
+        # next message starts a new burst
+        del self._bursts[chat_id]
+        deadline = monotonic() + INBOX_ACK_MAX_WAIT
+        pending, failed = self._spool.status(burst.entry_ids)
+        while pending and monotonic() < deadline:
+            await asyncio.sleep(ACK_POLL_INTERVAL)
+            pending, failed = self._spool.status(burst.entry_ids)
+        added = len(burst.entry_ids) - pending - failed
+        message = f"{added} added to Notion"
+        if pending:
+            message += f", {pending} pending"
+        try:
+            await self._notify(chat_id, message)
+        except Exception:
+            logging.exception("Inbox: cannot acknowledge messages")
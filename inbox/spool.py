@@ -0,0 +1,172 @@
+import sqlite3
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from time import monotonic, time
+
+from config import INBOX_SPOOL_PATH, DRAIN_RATE_WINDOW, INBOX_DEDUPE_WINDOW
+from tools import singleton
+
+
+@dataclass(frozen=True, slots=True)
+class SpoolEntry:
+    id: int
+    chat_id: int
+    message_id: int | None
+    text: str
+    created: float
+
+
+@singleton
+class InboxSpool:
+    """Durable FIFO of inbox messages that are not in the Notion yet.
+
+    Messages are written to SQLite before the user gets an answer,
+    so nothing is lost if Notion is down or the bot is restarted.
+    Entries that Notion refuses for good are kept with `failed` mark.
+    Telegram message ids seen within `INBOX_DEDUPE_WINDOW` are
+    remembered, so redelivered messages are not spooled twice.
+    """
+    __slots__ = (
+        "_db",
+        "_acked",
+    )
+    _db: sqlite3.Connection
+    # monotonic timestamps and chat ids of recent acknowledgements
+    _acked: deque[tuple[float, int]]
+
+    def __init__(self, path: str = INBOX_SPOOL_PATH) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " chat_id INTEGER NOT NULL,"
+            " message_id INTEGER,"
+            " text TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " failed INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " chat_id INTEGER NOT NULL,"
+            " message_id INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " PRIMARY KEY (chat_id, message_id))"
+        )
+        self._acked = deque()
+
+    def put(self, text: str, chat_id: int,
+            message_id: int | None = None) -> int | None:
+        """Spool the message. Return id of the entry,
+        or `None` if the message was already spooled.
+        """
+        now = time()
+        with self._db:
+            self._db.execute("BEGIN")
+            if message_id is not None:
+                self._db.execute("DELETE FROM seen WHERE created < ?",
+                                 (now - INBOX_DEDUPE_WINDOW, ))
+                cur = self._db.execute(
+                    "INSERT OR IGNORE INTO seen (chat_id, message_id, created) "
+                    "VALUES (?, ?, ?)",
+                    (chat_id, message_id, now)
+                )
+                if cur.rowcount == 0:
+                    return None
+            cur = self._db.execute(
+                "INSERT INTO spool (chat_id, message_id, text, created) "
+                "VALUES (?, ?, ?, ?)",
+                (chat_id, message_id, text, now)
+            )
+            return cur.lastrowid
+
+    def peek(self, limit: int = 1) -> list[SpoolEntry]:
+        """Return the oldest entries waiting for delivery."""
+        rows = self._db.execute(
+            "SELECT id, chat_id, message_id, text, created FROM spool "
+            "WHERE failed = 0 ORDER BY id LIMIT ?", (limit, )
+        ).fetchall()
+        return [SpoolEntry(*row) for row in rows]
+
+    def peek_chats(self, limit: int = 1) -> list[SpoolEntry]:
+        """Return the oldest waiting entry of each of up to `limit` chats
+        (the chats waiting longest).
+        """
+        rows = self._db.execute(
+            "SELECT id, chat_id, message_id, text, created FROM spool "
+            "WHERE id IN (SELECT MIN(id) FROM spool WHERE failed = 0 "
+            "GROUP BY chat_id ORDER BY MIN(id) LIMIT ?) ORDER BY id",
+            (limit, )
+        ).fetchall()
+        return [SpoolEntry(*row) for row in rows]
+
+    def status(self, entry_ids: list[int]) -> tuple[int, int]:
+        """Return how many of given entries are pending and failed,
+        the rest are delivered.
+        """
+        pending = failed = 0
+        for i in range(0, len(entry_ids), 500):
+            chunk = entry_ids[i:i + 500]
+            rows = self._db.execute(
+                "SELECT failed, COUNT(*) FROM spool WHERE id IN "
+                f"({', '.join('?' * len(chunk))}) GROUP BY failed", chunk
+            ).fetchall()
+            for is_failed, n in rows:
+                if is_failed:
+                    failed += n
+                else:
+                    pending += n
+        return pending, failed
+
+    def ack(self, entry_id: int):
+        """Remove delivered entry from the spool."""
+        row = self._db.execute(
+            "DELETE FROM spool WHERE id = ? RETURNING chat_id", (entry_id, )
+        ).fetchone()
+        if row is not None:
+            self._acked.append((monotonic(), row[0]))
+
+    def fail(self, entry_id: int):
+        """Keep entry on disk, but stop trying to deliver it."""
+        self._db.execute("UPDATE spool SET failed = 1 WHERE id = ?",
+                         (entry_id, ))
+
+    @property
+    def depth(self) -> int:
+        """Number of entries waiting for delivery."""
+        return self._db.execute(
+            "SELECT COUNT(*) FROM spool WHERE failed = 0"
+        ).fetchone()[0]
+
+    @property
+    def failed(self) -> int:
+        return self._db.execute(
+            "SELECT COUNT(*) FROM spool WHERE failed = 1"
+        ).fetchone()[0]
+
+    @property
+    def drain_rate(self) -> float:
+        """Delivered entries per minute over the last `DRAIN_RATE_WINDOW`."""
+        self._forget_acked()
+        return len(self._acked) * 60 / DRAIN_RATE_WINDOW
+
+    def chat_status(self, chat_id: int) -> tuple[int, int, float]:
+        """Return how many entries of the chat are pending and failed,
+        and its drain rate (see `drain_rate`).
+        """
+        pending, failed = self._db.execute(
+            "SELECT COUNT(*) - COALESCE(SUM(failed), 0), "
+            "COALESCE(SUM(failed), 0) FROM spool WHERE chat_id = ?",
+            (chat_id, )
+        ).fetchone()
+        self._forget_acked()
+        acked = sum(chat == chat_id for _, chat in self._acked)
+        return pending, failed, acked * 60 / DRAIN_RATE_WINDOW
+
+    def _forget_acked(self):
+        horizon = monotonic() - DRAIN_RATE_WINDOW
+        while self._acked and self._acked[0][0] < horizon:
+            self._acked.popleft()
@@ -0,0 +1,9 @@
+from .registry import Histogram, MetricsRegistry, metrics
+from .exporter import MetricsExporter
+
+__all__ = [
+    "Histogram",
+    "MetricsRegistry",
+    "metrics",
+    "MetricsExporter",
+]
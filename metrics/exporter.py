@@ -0,0 +1,105 @@
+from __future__ import annotations
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from metrics.registry import MetricsRegistry
+from config import (
+    METRICS_TEXTFILE_PATH,
+    METRICS_EXPORT_INTERVAL,
+    METRICS_PORT,
+    WORKER_INDEX,
+)
+
+# series of workers are told apart by this label in multi-process mode
+CONST_LABELS = ({"worker": str(WORKER_INDEX)}
+                if WORKER_INDEX is not None else {})
+
+
+class MetricsExporter:
+    """Background task that exposes metrics to Prometheus.
+
+    Every `METRICS_EXPORT_INTERVAL` seconds the metrics are written
+    to `METRICS_TEXTFILE_PATH` (for the textfile collector of
+    node_exporter), and if `METRICS_PORT` is set, they are served
+    on `http://127.0.0.1:<port>/metrics`.
+    """
+    __slots__ = (
+        "_registry",
+        "_task",
+        "_server",
+    )
+    _registry: MetricsRegistry
+    _task: asyncio.Task | None
+    _server: asyncio.Server | None
+
+    def __init__(self, registry: MetricsRegistry) -> None:
+        self._registry = registry
+        self._task = None
+        self._server = None
+
+    async def start(self):
+        if METRICS_TEXTFILE_PATH and self._task is None:
+            self._task = asyncio.create_task(self._run())
+        if METRICS_PORT and self._server is None:
+            self._server = await asyncio.start_server(
+                self._serve, "127.0.0.1", METRICS_PORT
+            )
+            logging.info(f"Metrics: serving on 127.0.0.1:{METRICS_PORT}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self.write_textfile()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def write_textfile(self):
+        """Replace the file at once, so the collector never reads
+        a half written one
+        """
+        path = Path(METRICS_TEXTFILE_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(self._registry.prometheus_text(**CONST_LABELS))
+        os.replace(tmp, path)
+
+    async def _run(self):
+        while True:
+            try:
+                self.write_textfile()
+            except OSError as err:
+                logging.error(f"Metrics: cannot write textfile: {err}")
+            await asyncio.sleep(METRICS_EXPORT_INTERVAL)
+
+    async def _serve(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readline()
+            # the rest of the request (headers) is not needed
+            while (await reader.readline()).strip():
+                pass
+            if request.split()[1:2] == [b"/metrics"]:
+                status = "200 OK"
+                body = self._registry.prometheus_text(**CONST_LABELS).encode()
+            else:
+                status, body = "404 Not Found", b""
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,165 @@
+from __future__ import annotations
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from time import perf_counter
+
+# upper bounds (seconds) of histogram buckets, the last one is +Inf
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+LabelsT = tuple[tuple[str, str], ...]
+
+
+@dataclass(slots=True)
+class Histogram:
+    """Latencies of one series and number of failed calls"""
+    # counts per bucket (not cumulative)
+    buckets: list[int] = field(default_factory=lambda: [0] * len(BUCKETS))
+    count: int = 0
+    sum: float = 0.0
+    max: float = 0.0
+    errors: int = 0
+
+    def add(self, seconds: float, error: bool = False):
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        if error:
+            self.errors += 1
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Estimate from buckets, like `histogram_quantile` of Prometheus"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = min(BUCKETS[i], self.max)
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+
+@dataclass(frozen=True, slots=True)
+class Family:
+    """Metric name and its description"""
+    name: str
+    help: str
+
+
+class MetricsRegistry:
+    """Latency histograms and error counts by family and labels.
+
+    Families are exported to Prometheus as `<name>_seconds` histogram
+    and `<name>_errors_total` counter.
+    """
+    __slots__ = (
+        "_families",
+        "_series",
+    )
+    _families: dict[str, Family]
+    # family name -> labels -> histogram
+    _series: dict[str, dict[LabelsT, Histogram]]
+
+    def __init__(self) -> None:
+        self._families = {}
+        self._series = {}
+
+    def describe(self, name: str, help: str):
+        self._families[name] = Family(name, help)
+        self._series.setdefault(name, {})
+
+    def observe(self, name: str, seconds: float, error: bool = False,
+                **labels: str):
+        series = self._series.setdefault(name, {})
+        key = tuple(labels.items())
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.add(seconds, error)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """Observe time of the block, an exception (also cancellation
+        by timeout) counts as error
+        """
+        started = perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(name, perf_counter() - started, error, **labels)
+
+    def series(self, name: str) -> dict[LabelsT, Histogram]:
+        return self._series.get(name, {})
+
+    def families(self) -> list[Family]:
+        return [self._families.get(name, Family(name, name))
+                for name in self._series]
+
+    def prometheus_text(self, **const: str) -> str:
+        """All series in Prometheus text exposition format,
+        `const` labels are added to every series
+        """
+        lines = []
+        for family in self.families():
+            series = {(*const.items(), *labels): h for labels, h
+                      in self._series[family.name].items()}
+            name = family.name
+            lines.append(f"# HELP {name}_seconds {family.help}")
+            lines.append(f"# TYPE {name}_seconds histogram")
+            for labels, h in series.items():
+                cumulative = 0
+                for bound, n in zip(BUCKETS, h.buckets):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_seconds_bucket"
+                                 f"{_labels(labels, le=le)} {cumulative}")
+                lines.append(f"{name}_seconds_sum{_labels(labels)} {h.sum}")
+                lines.append(f"{name}_seconds_count{_labels(labels)} {h.count}")
+            lines.append(f"# HELP {name}_errors_total Failed calls: {family.help}")
+            lines.append(f"# TYPE {name}_errors_total counter")
+            for labels, h in series.items():
+                lines.append(f"{name}_errors_total{_labels(labels)} {h.errors}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: LabelsT, **extra: str) -> str:
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"') \
+                .replace("\n", "\\n")
+
+
+# shared by all parts of the bot
+metrics = MetricsRegistry()
+metrics.describe("bot_plugin_action",
+                 "Time of plugin actions run by commands and events")
+metrics.describe("bot_notion_request", "Time of requests to the Notion API")
+metrics.describe("bot_notion_connection",
+                 "Time until a Notion request is sent, by connection reuse")
+metrics.describe("bot_notion_handshake",
+                 "Time of TCP and TLS handshakes with the Notion API")
+metrics.describe("bot_notion_limiter_wait",
+                 "Time Notion requests wait for the rate limiter, by priority")
+metrics.describe("bot_telegram_send", "Time of sendMessage calls")
+metrics.describe("bot_send_latency",
+                 "Time from queueing a message to its delivery to Telegram")
@@ -0,0 +1,30 @@
+from .cache import TTLCache
+from .records import CalendarEvent, CurrentTask, SchedulePair
+from .singleflight import SingleFlight
+from .ratelimit import RateLimiter, Priority, notion_priority
+from .sync import DatabaseMirror
+from .replica import ReplicaStore
+from .transport import ConnectionTrace, make_client
+from .notion import (
+    Notion, NotionPool, NotionWorkspace, BulkResult, is_unavailable
+)
+
+__all__ = [
+    "TTLCache",
+    "CalendarEvent",
+    "CurrentTask",
+    "SchedulePair",
+    "SingleFlight",
+    "RateLimiter",
+    "Priority",
+    "notion_priority",
+    "DatabaseMirror",
+    "ReplicaStore",
+    "ConnectionTrace",
+    "make_client",
+    "Notion",
+    "NotionPool",
+    "NotionWorkspace",
+    "BulkResult",
+    "is_unavailable",
+]
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from collections.abc import Hashable
+from time import monotonic
+from typing import Any
+
+
+class TTLCache:
+    """Size-bounded LRU cache with time to live per dataset.
+
+    Keys are tuples, the first item of a key is the dataset name
+    (e.g. `("inbox", 10)`), it selects the TTL of the entry and
+    allows to invalidate all entries of the dataset at once.
+    """
+    __slots__ = (
+        "_entries",
+        "_ttls",
+        "_maxsize",
+        "_generations",
+    )
+    _entries: OrderedDict[tuple, tuple[float, Any]]
+    _ttls: dict[str, float]
+    _maxsize: int
+    # incremented on each invalidation of the dataset
+    _generations: dict[str, int]
+
+    MISSING = object()
+
+    def __init__(self, ttls: dict[str, float], maxsize: int) -> None:
+        self._entries = OrderedDict()
+        self._ttls = ttls
+        self._maxsize = maxsize
+        self._generations = {}
+
+    def get(self, key: tuple[Hashable, ...]) -> Any:
+        """Return cached value or `TTLCache.MISSING`"""
+        try:
+            expires, value = self._entries[key]
+        except KeyError:
+            return self.MISSING
+        if expires < monotonic():
+            del self._entries[key]
+            return self.MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def generation(self, dataset: str) -> int:
+        return self._generations.get(dataset, 0)
+
+    def set(self, key: tuple[Hashable, ...], value: Any,
+            generation: int | None = None):
+        """Store value. If `generation` is given and the dataset was
+        invalidated since then, the value is outdated and ignored.
+        """
+        ttl = self._ttls.get(key[0], 0)
+        if ttl <= 0:
+            return
+        if generation is not None and generation != self.generation(key[0]):
+            return
+        self._entries[key] = (monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *datasets: str):
+        """Drop entries of given datasets (all entries if none given)
+        and refuse values loaded before this call.
+        """
+        if not datasets:
+            datasets = tuple(self._ttls)
+        for dataset in datasets:
+            self._generations[dataset] = self.generation(dataset) + 1
+        self.discard(*datasets)
+
+    def discard(self, *datasets: str):
+        """Drop entries of given datasets (all entries if none given)."""
+        if not datasets:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k[0] in datasets]:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,607 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Iterable
+from copy import copy
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from time import time
+from typing import Any, Sequence
+
+from httpx import AsyncClient as HTTPClient, TransportError
+from notion_client import AsyncClient, APIErrorCode, APIResponseError
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+from notion_client.helpers import async_iterate_paginated_api, is_full_page
+
+from config import (
+    NOTION_API_URL,
+    PAIR_SCHEDULE,
+    WEEKDAYS,
+    NOTION_CACHE_TTL,
+    NOTION_CACHE_SIZE,
+    NOTION_BULK_CONCURRENCY,
+    NOTION_RATE_LIMIT,
+    NOTION_RATE_BURST,
+    CALENDAR_LOOKBACK_DAYS,
+    NOTION_READ_TIMEOUT,
+    NOTION_PREWARM_CONNECTIONS,
+)
+
+from mynotion.cache import TTLCache
+from mynotion.records import CalendarEvent, CurrentTask, SchedulePair
+from mynotion.singleflight import SingleFlight
+from mynotion.ratelimit import RateLimiter, Priority, notion_priority
+from mynotion.replica import ReplicaStore
+from mynotion.sync import DatabaseMirror
+from mynotion.transport import NOTION_TIMEOUT, make_client, open_connections
+from metrics import metrics
+from tenants import Tenant, current_tenant
+from tools import singleton
+
+
+@dataclass(slots=True)
+class BulkResult:
+    """Outcome of bulk page update"""
+    total: int
+    done: list[str] = field(default_factory=list)
+    # page id -> error description
+    failed: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+
+class LimitedClient(AsyncClient):
+    """`AsyncClient` which passes every request through the rate limiter.
+    The token is sent with each request, so clients of different
+    workspaces can share one connection pool (`client` argument).
+    """
+    _limiter: RateLimiter
+    _token: str | None
+
+    def __init__(self, limiter: RateLimiter, token: str | None = None,
+                 **kwargs) -> None:
+        super().__init__(**kwargs)
+        # the notion client replaces timeouts of the HTTP client
+        # with its single timeout
+        self.client.timeout = NOTION_TIMEOUT
+        self._limiter = limiter
+        self._token = token
+
+    async def request(self, path: str, method: str, query=None, body=None,
+                      auth: str | None = None):
+        await self._limiter.acquire(notion_priority.get())
+        try:
+            # waiting for the limiter is not counted
+            with metrics.timer("bot_notion_request", method=method,
+                               path=_path_template(path)):
+                return await super().request(path, method, query, body,
+                                             auth or self._token)
+        except APIResponseError as notion_err:
+            if notion_err.code == APIErrorCode.RateLimited:
+                self._limiter.penalize(
+                    float(notion_err.headers.get("Retry-After", 1))
+                )
+            raise
+
+
+def is_unavailable(err: BaseException) -> bool:
+    """Notion cannot answer now (network, timeout, outage),
+    but the request itself is fine
+    """
+    if isinstance(err, APIResponseError):
+        return err.code == APIErrorCode.ServiceUnavailable
+    if isinstance(err, HTTPResponseError):
+        # e.g. gateway errors with HTML body
+        return err.status >= 500
+    return isinstance(err, (RequestTimeoutError, TransportError, TimeoutError))
+
+
+def _path_template(path: str) -> str:
+    """`databases/<uuid>/query` -> `databases/{id}/query`,
+    so metrics do not get a series per page
+    """
+    return "/".join("{id}" if len(part.replace("-", "")) == 32 else part
+                    for part in path.strip("/").split("/"))
+
+
+class Notion:
+    """Notion workspace of the current tenant (`tenants.current_tenant`).
+
+    Plugins are shared by all tenants, so they keep this object
+    and every call goes to the workspace of the chat being served.
+    """
+    __slots__ = ()
+
+    def __getattr__(self, name: str):
+        return getattr(NotionPool().workspace(current_tenant.get()), name)
+
+
+@singleton
+class NotionPool:
+    """Workspaces of all tenants, created on first use.
+    They share one connection pool and one replica file,
+    but each has its own rate limiter, cache and mirrors.
+    """
+    _http: HTTPClient
+    _replica: ReplicaStore
+    # chat id -> workspace
+    _workspaces: dict[int, "NotionWorkspace"]
+
+    def __init__(self) -> None:
+        self._http = make_client()
+        self._replica = ReplicaStore()
+        self._workspaces = {}
+
+    async def prewarm(self) -> int:
+        """Open connections before a burst of requests,
+        return the number of open ones
+        """
+        opened = await open_connections(self._http,
+                                        NOTION_PREWARM_CONNECTIONS)
+        logging.info(f"Notion: {opened} connections are ready")
+        return opened
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    def workspace(self, tenant: Tenant) -> "NotionWorkspace":
+        ws = self._workspaces.get(tenant.chat_id)
+        if ws is None:
+            ws = NotionWorkspace(tenant, self._http, self._replica)
+            self._workspaces[tenant.chat_id] = ws
+        return ws
+
+
+class NotionWorkspace:
+    """Databases of one tenant"""
+    _tenant: Tenant
+    _client: AsyncClient
+    # all requests to Notion share one limiter
+    _limiter: RateLimiter
+    # query results shared by all plugins
+    _cache: TTLCache
+    # local copies of databases, keys are dataset names
+    _mirrors: dict[str, DatabaseMirror]
+    # concurrent identical queries share one request
+    _flights: SingleFlight
+    # mirrors saved on disk
+    _replica: ReplicaStore
+    # datasets, last reads of which were answered by the saved mirror
+    _stale: set[str]
+
+    def __init__(self, tenant: Tenant, http: HTTPClient,
+                 replica: ReplicaStore) -> None:
+        self._tenant = tenant
+        # Notion limits requests per integration, i.e. per tenant
+        self._limiter = RateLimiter(NOTION_RATE_LIMIT, NOTION_RATE_BURST)
+        self._client = LimitedClient(self._limiter, tenant.token,
+                                     client=http, base_url=NOTION_API_URL)
+        self._cache = TTLCache(NOTION_CACHE_TTL, NOTION_CACHE_SIZE)
+        self._flights = SingleFlight()
+        self._mirrors = {
+            "inbox": DatabaseMirror(tenant.inbox_id),
+            "calendar": DatabaseMirror(tenant.calendar_id),
+            "current_tasks": DatabaseMirror(tenant.current_tasks_id),
+            "uni_schedule": DatabaseMirror(tenant.uni_schedule_id),
+        }
+        self._replica = replica
+        for dataset, mirror in self._mirrors.items():
+            if self._replica.load(self._replica_key(dataset), mirror):
+                logging.info(f"Notion [{tenant.name}]: {dataset} mirror "
+                             f"is restored, {len(mirror)} pages")
+        self._stale = set()
+
+    def _replica_key(self, dataset: str) -> str:
+        return f"{self._tenant.chat_id}/{dataset}"
+
+    async def _cached(self, key: tuple, loader: Callable[[], Awaitable[Any]]):
+        """Return result of `loader` from cache, or call it on miss.
+        First item of `key` is the dataset name (see `NOTION_CACHE_TTL`)
+        Concurrent misses of the same key share one `loader` call.
+        """
+        result = self._cache.get(key)
+        if result is TTLCache.MISSING:
+            # callers coming after invalidation must not join older call
+            generation = self._cache.generation(key[0])
+            result = await self._flights.do((*key, generation), loader)
+            self._cache.set(key, result, generation)
+        # callers may shuffle or extend the result
+        return copy(result)
+
+    def invalidate_cache(self, *datasets: str):
+        """Forget cached results of given datasets (or all of them)."""
+        self._cache.invalidate(*datasets)
+
+    async def sync(self, dataset: str) -> bool:
+        """Pull changes of the dataset into its mirror and save it.
+        Return `True` if the mirror is changed.
+        """
+        # the sync is finished, even if callers stop waiting for it
+        return await self._flights.do(("sync", dataset),
+                                      lambda: self._sync(dataset))
+
+    async def _sync(self, dataset: str) -> bool:
+        mirror = self._mirrors[dataset]
+        changed = await mirror.sync(self._client)
+        self._replica.save(self._replica_key(dataset), mirror)
+        if changed or dataset in self._stale:
+            # results loaded after this sync are up to date
+            self._cache.discard(dataset)
+        self._stale.discard(dataset)
+        return changed
+
+    def version(self, dataset: str) -> int:
+        """Version of the dataset mirror, it grows on every change
+        (by any sync or page written by the bot)
+        """
+        return self._mirrors[dataset].version
+
+    async def sync_all(self):
+        """Sync all mirrors (e.g. periodically in background),
+        so they are fresh when Notion goes down
+        """
+        # must not delay user commands
+        priority = notion_priority.set(Priority.BACKGROUND)
+        try:
+            for dataset in self._mirrors:
+                try:
+                    await self.sync(dataset)
+                except Exception as err:
+                    logging.warning(f"Notion [{self._tenant.name}]: "
+                                    f"cannot sync {dataset}: {err!r}")
+        finally:
+            notion_priority.reset(priority)
+
+    def stale_age(self, *datasets: str) -> timedelta | None:
+        """Age of the saved mirror, if the last read of any of
+        the datasets was answered by it, `None` if Notion answered.
+        """
+        synced = [self._mirrors[d].synced_at for d in datasets
+                  if d in self._stale]
+        if not synced:
+            return None
+        return timedelta(seconds=time() - min(synced))
+
+    async def _fresh(self, dataset: str):
+        """Sync the dataset before reading its mirror.
+        If Notion is unavailable or does not answer within
+        `NOTION_READ_TIMEOUT`, the mirror is read as it is
+        (the dataset is marked stale until the next successful sync).
+        While the dataset is stale, the mirror is read at once
+        and the sync goes on in background. The first sync, when there
+        is no saved mirror to fall back to, is waited for without
+        the timeout.
+        """
+        if dataset in self._stale:
+            self._sync_in_background(dataset)
+            return
+        try:
+            await asyncio.wait_for(self.sync(dataset),
+                                   self._read_timeout(dataset))
+        except Exception as err:
+            self._fall_back(dataset, err)
+
+    def _read_timeout(self, dataset: str) -> float | None:
+        """`NOTION_READ_TIMEOUT`, if there is a synced mirror to fall
+        back to, otherwise Notion is waited for
+        """
+        if self._mirrors[dataset].synced_at is None:
+            return None
+        return NOTION_READ_TIMEOUT
+
+    def _sync_in_background(self, dataset: str):
+        sync = asyncio.ensure_future(self.sync(dataset))
+        # failure is expected while Notion is down
+        sync.add_done_callback(lambda done: done.cancelled()
+                                            or done.exception())
+
+    def _fall_back(self, dataset: str, err: Exception):
+        """Mark the dataset stale or raise `err`, if the saved mirror
+        cannot be used instead of Notion
+        """
+        if not (is_unavailable(err)
+                and self._mirrors[dataset].synced_at is not None):
+            raise err
+        if dataset not in self._stale:
+            logging.warning(f"Notion [{self._tenant.name}]: {dataset} is read "
+                            f"from the saved mirror, Notion is unavailable: "
+                            f"{err!r}")
+        self._stale.add(dataset)
+
+    def _apply_page(self, page: dict):
+        """Put page returned by Notion into the mirror of its database"""
+        for dataset, mirror in self._mirrors.items():
+            if mirror.owns(page):
+                mirror.apply(page)
+                self._cache.invalidate(dataset)
+                return
+        # parent is unknown, the page could belong to any database
+        for mirror in self._mirrors.values():
+            mirror.discard(page['id'])
+        self._cache.invalidate()
+
+    async def create_page_in_inbox(self, title: str):
+        page = await self._client.pages.create(
+            parent={'database_id': self._tenant.inbox_id},
+            properties={
+                'Name': {'title': [{'text': {'content': title}}]}
+            })
+        self._apply_page(page)
+        return page
+
+    async def last_inbox_pages(self, n_pages: int) -> list[str]:
+        return await self._cached(("inbox", n_pages),
+                                  lambda: self._load_inbox_pages(n_pages))
+
+    async def _newest_inbox_pages(self, n_pages: int) -> tuple[list[dict], bool]:
+        """Newest `n_pages` inbox pages by "Created" and whether there
+        are more. They are queried from Notion, because the mirror keeps
+        pages archived outside of the bot until the next full sync;
+        the mirror is brought in line with the answer.
+        """
+        pages = []
+        cursor = None
+        while True:
+            results = await self._client.databases.query(
+                database_id=self._tenant.inbox_id,
+                sorts=[{"property": "Created", "direction": "descending"}],
+                page_size=min(n_pages - len(pages), 100),
+                **({"start_cursor": cursor} if cursor else {})
+            )
+            pages += results["results"]
+            cursor = results["next_cursor"]
+            if not results["has_more"] or len(pages) >= n_pages:
+                break
+        has_more = bool(results["has_more"])
+        self._drop_archived_inbox(pages, has_more)
+        return pages, has_more
+
+    def _drop_archived_inbox(self, newest: list[dict], has_more: bool):
+        """Put the newest inbox pages into the mirror and drop pages
+        which Notion did not return among them (they are archived)
+        """
+        mirror = self._mirrors["inbox"]
+        changed = False
+        for page in newest:
+            changed = mirror.apply(page) or changed
+        ids = {page['id'] for page in newest}
+        oldest = min((p['created_time'] for p in newest), default=None)
+        for page in list(mirror.pages()):
+            if page['id'] in ids:
+                continue
+            if not has_more or oldest is not None \
+                    and page['created_time'] > oldest:
+                changed = mirror.discard(page['id']) or changed
+        if changed:
+            self._cache.invalidate("inbox")
+
+    def _newest_inbox_pages_from_mirror(self, n_pages: int) -> tuple[list[dict], bool]:
+        """The same as `_newest_inbox_pages`, but over the mirror"""
+        mirror = self._mirrors["inbox"]
+        pages = sorted(mirror.pages(), key=lambda p: p['created_time'],
+                       reverse=True)
+        return pages[:n_pages], len(mirror) > n_pages
+
+    async def _load_inbox_pages(self, n_pages: int) -> list[str]:
+        if "inbox" in self._stale:
+            self._sync_in_background("inbox")
+            pages, has_more = self._newest_inbox_pages_from_mirror(n_pages)
+        else:
+            try:
+                pages, has_more = await asyncio.wait_for(
+                    self._newest_inbox_pages(n_pages),
+                    self._read_timeout("inbox")
+                )
+            except Exception as err:
+                self._fall_back("inbox", err)
+                pages, has_more = self._newest_inbox_pages_from_mirror(n_pages)
+        titles = []
+        for i, task in enumerate(pages):
+            if is_full_page(task):
+                task_title = task["properties"]["Name"]["title"]
+                if task_title:
+                    line = f"{i+1:>3d}. {task_title[0]['plain_text']}"
+                    titles.append(line)
+        if has_more:
+            titles.append("Visit Notion to see full list...")
+        return titles
+
+    async def archive_n_pages(self, count=1) -> BulkResult:
+        # pages are deleted only by the answer of Notion, never
+        # from the saved mirror
+        pages, _ = await self._newest_inbox_pages(count)
+        return await self.archive_pages(p['id'] for p in pages)
+
+    async def page_is_live(self, id: str) -> bool:
+        """Check in Notion that the page is not archived (the mirror
+        keeps pages archived outside of the bot until the next full
+        sync) and update the mirror with it. If Notion is unavailable,
+        the page is taken as live.
+        """
+        try:
+            page = await asyncio.wait_for(
+                self._client.pages.retrieve(page_id=id), NOTION_READ_TIMEOUT
+            )
+        except APIResponseError as err:
+            if err.code != APIErrorCode.ObjectNotFound:
+                raise
+            for mirror in self._mirrors.values():
+                mirror.discard(id)
+            self._cache.invalidate()
+            return False
+        except Exception as err:
+            if is_unavailable(err):
+                return True
+            raise
+        self._apply_page(page)
+        return not (page.get('archived') or page.get('in_trash'))
+
+    async def archive_page(self, id: str):
+        page = await self._client.pages.update(page_id=id, archived=True)
+        self._apply_page(page)
+
+    async def unarchive_page(self, id: str):
+        page = await self._client.pages.update(page_id=id, archived=False)
+        self._apply_page(page)
+
+    async def archive_pages(self, ids: Iterable[str]) -> BulkResult:
+        return await self._bulk_update(ids, archived=True)
+
+    async def unarchive_pages(self, ids: Iterable[str]) -> BulkResult:
+        return await self._bulk_update(ids, archived=False)
+
+    async def _bulk_update(self, ids: Iterable[str], **properties) -> BulkResult:
+        """Update pages concurrently, at most `NOTION_BULK_CONCURRENCY`
+        requests at a time. Failure of one page does not stop the others.
+        """
+        ids = list(dict.fromkeys(ids))
+        result = BulkResult(total=len(ids))
+        window = asyncio.Semaphore(NOTION_BULK_CONCURRENCY)
+
+        async def update(id: str):
+            async with window:
+                try:
+                    page = await self._client.pages.update(page_id=id,
+                                                           **properties)
+                except Exception as e:
+                    logging.warning(f"Notion [{self._tenant.name}]: "
+                                    f"cannot update page {id}: {e}")
+                    result.failed[id] = str(e)
+                    return
+            self._apply_page(page)
+            result.done.append(id)
+
+        await asyncio.gather(*map(update, ids))
+        return result
+
+    async def get_calendar_events(self) -> list[CalendarEvent]:
+        return await self._cached(("calendar", ), self._load_calendar_events)
+
+    async def _load_calendar_events(self) -> list[CalendarEvent]:
+        await self._fresh("calendar")
+        events = map(CalendarEvent.from_page, self._mirrors["calendar"].pages())
+        return [ev for ev in events if ev is not None]
+
+    async def calendar_events_ended_before(self, day: date) -> list[CalendarEvent]:
+        """Calendar events which are over before `day`"""
+        return await self._cached(
+            ("calendar", "ended_before", day),
+            lambda: self._load_calendar_events_ended_before(day)
+        )
+
+    async def _load_calendar_events_ended_before(self, day: date) -> list[CalendarEvent]:
+        # an event cannot end before it starts, so Notion gives events
+        # started before the `day`, and the end is checked here
+        events = await self._query_calendar_events({
+            "property": "Date", "date": {"before": day.isoformat()}
+        })
+        return [ev for ev in events
+                if (ev.end or ev.start).date() < day]
+
+    async def calendar_events_on(self, day: date) -> list[CalendarEvent]:
+        """Calendar events which take place on `day`.
+        Note: events started more than `CALENDAR_LOOKBACK_DAYS`
+        before the `day` are not taken into account.
+        """
+        return await self._cached(
+            ("calendar", "on", day),
+            lambda: self._load_calendar_events_on(day)
+        )
+
+    async def _load_calendar_events_on(self, day: date) -> list[CalendarEvent]:
+        lookback = day - timedelta(days=CALENDAR_LOOKBACK_DAYS)
+        if "calendar" in self._stale:
+            self._sync_in_background("calendar")
+            return self._calendar_events_on_from_mirror(day, lookback)
+        try:
+            events = await asyncio.wait_for(
+                self._query_calendar_events({"and": [
+                    {"property": "Date",
+                     "date": {"on_or_before": day.isoformat()}},
+                    {"property": "Date",
+                     "date": {"on_or_after": lookback.isoformat()}},
+                ]}),
+                self._read_timeout("calendar")
+            )
+            self._stale.discard("calendar")
+        except Exception as err:
+            self._fall_back("calendar", err)
+            return self._calendar_events_on_from_mirror(day, lookback)
+        return [ev for ev in events
+                if ev.start.date() == day
+                    or ev.end and ev.end.date() >= day]
+
+    def _calendar_events_on_from_mirror(self, day: date,
+                                        lookback: date) -> list[CalendarEvent]:
+        """The same as `_load_calendar_events_on`, but over the mirror"""
+        events = map(CalendarEvent.from_page, self._mirrors["calendar"].pages())
+        return [ev for ev in events
+                if ev and lookback <= ev.start.date() <= day
+                    and (ev.start.date() == day
+                         or ev.end and ev.end.date() >= day)]
+
+    async def _query_calendar_events(self, filter: dict) -> list[CalendarEvent]:
+        """Query calendar with the filter applied by Notion"""
+        events = []
+        async for page in async_iterate_paginated_api(
+            self._client.databases.query,
+            database_id=self._tenant.calendar_id,
+            filter=filter
+        ):
+            if event := CalendarEvent.from_page(page):
+                events.append(event)
+        return events
+
+    async def get_current_tasks(self) -> list[CurrentTask]:
+        return await self._cached(("current_tasks", ),
+                                  self._load_current_tasks)
+
+    async def _load_current_tasks(self) -> list[CurrentTask]:
+        await self._fresh("current_tasks")
+        tasks = []
+        for page in self._mirrors["current_tasks"].pages():
+            props = page["properties"]
+            if props["Name"]["title"]:
+                task_title = props["Name"]["title"][0]['plain_text']
+                tasks.append(CurrentTask(page['id'], task_title))
+        return tasks
+
+
+    async def uni_schedule_index(self) -> dict[tuple[int, bool], list[SchedulePair]]:
+        """Whole university schedule grouped by `(weekday, even_week)`,
+        pairs of each day are sorted by number.
+        """
+        return await self._cached(("uni_schedule", ),
+                                  self._load_uni_schedule_index)
+
+    async def uni_daily_schedule(self, day: date, even_week: bool) -> Sequence[SchedulePair]:
+        index = await self.uni_schedule_index()
+        return list(index[(day.weekday(), even_week)])
+
+    async def _load_uni_schedule_index(self) -> dict[tuple[int, bool], list[SchedulePair]]:
+        await self._fresh("uni_schedule")
+        index = {(weekday, even_week): []
+                 for weekday in range(7) for even_week in (False, True)}
+        for p in self._mirrors["uni_schedule"].pages():
+            props = p['properties']
+            page_weekday = props['День недели']['select']['name']
+            page_weekday = WEEKDAYS[page_weekday]
+
+            pair_num = int(props['Пара']['number'])
+            subject = props['Предмет']['title'][0]['plain_text']
+            lecturer = props['Преподаватель']['rich_text'][0]['plain_text']
+            auditory = props['Кабинет']['rich_text'][0]['plain_text']
+            is_entry_odd = props['Неделя']['select']['name'] == 'Нечетная'
+            is_entry_even = props['Неделя']['select']['name'] == 'Четная'
+
+            pair = SchedulePair(pair_num, PAIR_SCHEDULE[pair_num - 1],
+                                subject, lecturer, auditory)
+            for even_week in (False, True):
+                if (even_week and is_entry_even
+                        or not even_week and is_entry_odd
+                        or is_entry_even is is_entry_odd):
+                    index[(page_weekday - 1, even_week)].append(pair)
+        for daily_schedule in index.values():
+            daily_schedule.sort()
+        return index
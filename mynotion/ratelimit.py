@@ -0,0 +1,114 @@
+import asyncio
+import heapq
+from contextvars import ContextVar
+from enum import IntEnum
+from itertools import count
+from time import monotonic
+
+from metrics import metrics
+
+
+class Priority(IntEnum):
+    """Lanes of the rate limiter, lower value goes first"""
+    # user commands and inbox writes
+    INTERACTIVE = 0
+    # scheduled events and background refreshes
+    BACKGROUND = 1
+
+
+# priority of Notion requests made in the current context
+notion_priority: ContextVar[Priority] = ContextVar(
+    "notion_priority", default=Priority.INTERACTIVE
+)
+
+
+class RateLimiter:
+    """Token bucket with priority lanes.
+
+    Requests take one token each, tokens are refilled with `rate`
+    per second up to `capacity`. When the bucket is empty requests
+    wait in a queue ordered by priority and then by arrival.
+    Time requests wait is observed as `bot_notion_limiter_wait`
+    by priority.
+    """
+    __slots__ = (
+        "_rate",
+        "_capacity",
+        "_tokens",
+        "_updated",
+        "_waiters",
+        "_seq",
+        "_dispatcher",
+    )
+    _rate: float
+    _capacity: float
+    _tokens: float
+    _updated: float
+    _waiters: list[tuple[Priority, int, asyncio.Future]]
+    _dispatcher: asyncio.Task | None
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = monotonic()
+        self._waiters = []
+        self._seq = count()
+        self._dispatcher = None
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE):
+        """Wait for a token"""
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            _observe_wait(priority, 0.0)
+            return
+        started = monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        # cancelled waiter stays in the queue and is skipped later
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # cancelled after the token was granted: give it back
+                # for the next waiter
+                self._tokens += 1
+            raise
+        _observe_wait(priority, monotonic() - started)
+
+    def penalize(self, delay: float):
+        """Stop issuing tokens for `delay` seconds
+        (e.g. Notion answered with `rate_limited` anyway)
+        """
+        self._refill()
+        self._tokens = min(self._tokens, 0) - delay * self._rate
+
+    @property
+    def waiting(self) -> int:
+        return sum(not w.done() for _, _, w in self._waiters)
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(self._capacity,
+                           self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def _dispatch(self):
+        while self._waiters:
+            self._refill()
+            while self._tokens >= 1 and self._waiters:
+                _, _, waiter = heapq.heappop(self._waiters)
+                if waiter.done():
+                    continue
+                self._tokens -= 1
+                waiter.set_result(None)
+            if self._waiters:
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+def _observe_wait(priority: Priority, wait: float):
+    metrics.observe("bot_notion_limiter_wait", wait,
+                    priority=priority.name.lower())
@@ -0,0 +1,67 @@
+from datetime import datetime
+from typing import NamedTuple
+
+PairTime = tuple[int, tuple[int, int], tuple[int, int]]
+
+
+class CalendarEvent:
+    """Event from the calendar database.
+    Dates are kept as ISO strings and parsed on first access.
+    """
+    __slots__ = (
+        "id",
+        "title",
+        "_start",
+        "_end",
+    )
+    id: str
+    title: str
+    _start: str | datetime
+    _end: str | datetime | None
+
+    def __init__(self, id: str, title: str,
+                 start: str | datetime, end: str | datetime | None) -> None:
+        self.id = id
+        self.title = title
+        self._start = start
+        self._end = end
+
+    @classmethod
+    def from_page(cls, page: dict) -> "CalendarEvent | None":
+        """Make event from Notion page, `None` if title or date is empty"""
+        props = page["properties"]
+        date = props["Date"]['date']
+        title = props["Name"]["title"]
+        if not (title and date):
+            return None
+        return cls(page['id'], title[0]['plain_text'],
+                   date['start'], date['end'])
+
+    @property
+    def start(self) -> datetime:
+        if isinstance(self._start, str):
+            self._start = datetime.fromisoformat(self._start)
+        return self._start
+
+    @property
+    def end(self) -> datetime | None:
+        if isinstance(self._end, str):
+            self._end = datetime.fromisoformat(self._end)
+        return self._end
+
+    def __repr__(self) -> str:
+        return (f"CalendarEvent(id={self.id!r}, title={self.title!r}, "
+                f"start={self._start!r}, end={self._end!r})")
+
+
+class CurrentTask(NamedTuple):
+    id: str
+    title: str
+
+
+class SchedulePair(NamedTuple):
+    num: int
+    time: PairTime
+    subject: str
+    lecturer: str
+    auditory: str
@@ -0,0 +1,78 @@
+import json
+import sqlite3
+from pathlib import Path
+
+from mynotion.sync import DatabaseMirror
+from config import NOTION_REPLICA_PATH
+
+
+class ReplicaStore:
+    """Database mirrors saved in SQLite, so they are available
+    right after restart, even if Notion is not.
+
+    Only pages changed since the previous save are written.
+    A mirror saved for another database id (e.g. the id is changed
+    in `.env`) is not restored.
+    """
+    __slots__ = ("_db", )
+    _db: sqlite3.Connection
+
+    def __init__(self, path: str = NOTION_REPLICA_PATH) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS mirrors ("
+            " dataset TEXT PRIMARY KEY,"
+            " database_id TEXT NOT NULL,"
+            " checkpoint TEXT,"
+            " synced_at REAL,"
+            " last_full_sync REAL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " dataset TEXT NOT NULL,"
+            " id TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " PRIMARY KEY (dataset, id))"
+        )
+
+    def load(self, dataset: str, mirror: DatabaseMirror) -> bool:
+        """Restore the mirror, return `False` if it is not saved"""
+        row = self._db.execute(
+            "SELECT database_id, checkpoint, synced_at, last_full_sync "
+            "FROM mirrors WHERE dataset = ?", (dataset, )
+        ).fetchone()
+        if row is None or row[0] != mirror.database_id:
+            return False
+        pages = self._db.execute(
+            "SELECT data FROM pages WHERE dataset = ?", (dataset, )
+        )
+        mirror.restore((json.loads(data) for data, in pages), *row[1:])
+        return True
+
+    def save(self, dataset: str, mirror: DatabaseMirror):
+        replaced, changes = mirror.take_changes()
+        with self._db:
+            self._db.execute("BEGIN")
+            if replaced:
+                self._db.execute("DELETE FROM pages WHERE dataset = ?",
+                                 (dataset, ))
+            self._db.executemany(
+                "DELETE FROM pages WHERE dataset = ? AND id = ?",
+                ((dataset, id) for id, page in changes.items() if page is None)
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO pages (dataset, id, data) "
+                "VALUES (?, ?, ?)",
+                ((dataset, id, json.dumps(page))
+                 for id, page in changes.items() if page is not None)
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO mirrors (dataset, database_id, "
+                "checkpoint, synced_at, last_full_sync) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (dataset, mirror.database_id, mirror.checkpoint,
+                 mirror.synced_at, mirror.last_full_sync)
+            )
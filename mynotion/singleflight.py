@@ -0,0 +1,36 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class SingleFlight:
+    """Run one call per key at a time, concurrent callers
+    with the same key wait for the call in flight and share its result.
+    """
+    __slots__ = (
+        "_calls",
+    )
+    _calls: dict[Hashable, asyncio.Future]
+
+    def __init__(self) -> None:
+        self._calls = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(fn())
+            self._calls[key] = call
+            call.add_done_callback(lambda done: self._forget(key, done))
+        # cancellation of one caller must not cancel the others
+        return await asyncio.shield(call)
+
+    def _forget(self, key: Hashable, call: asyncio.Future):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.cancelled():
+            # exception is delivered to the callers (if any left)
+            call.exception()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
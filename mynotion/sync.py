@@ -0,0 +1,192 @@
+import asyncio
+import logging
+from collections.abc import Iterable
+from time import time
+from typing import Any
+
+from notion_client import AsyncClient
+from notion_client.helpers import async_iterate_paginated_api
+
+from config import NOTION_FULL_SYNC_INTERVAL
+
+
+def plain_id(id: str) -> str:
+    """Notion ids are the same with or without dashes"""
+    return id.replace('-', '')
+
+
+class DatabaseMirror:
+    """Local copy of a Notion database, updated incrementally.
+
+    Each sync pulls only pages with `last_edited_time` not older than
+    the newest one already seen. Notion does not return archived
+    pages from queries, so pages archived outside of the bot are
+    dropped by a full resync every `NOTION_FULL_SYNC_INTERVAL` seconds.
+    Changes since the last `take_changes` are tracked, so the mirror
+    can be saved to disk incrementally (see `ReplicaStore`).
+    `version` grows on every change, so readers notice changes made
+    by any sync, not only by their own.
+    """
+    __slots__ = (
+        "database_id",
+        "_pages",
+        "_checkpoint",
+        "_last_full_sync",
+        "_synced_at",
+        "_changed",
+        "_replaced",
+        "_version",
+        "_lock",
+    )
+    database_id: str
+    _pages: dict[str, dict[str, Any]]
+    # newest `last_edited_time` among pages pulled by syncs (pages
+    # written by the bot do not move it, edits made in Notion before
+    # them would be skipped)
+    _checkpoint: str | None
+    # unix time of the last full and of the last successful sync
+    _last_full_sync: float | None
+    _synced_at: float | None
+    # ids of pages put or dropped since `take_changes`
+    _changed: set[str]
+    # all pages are replaced since `take_changes`
+    _replaced: bool
+    # number of changes of the pages
+    _version: int
+    _lock: asyncio.Lock
+
+    def __init__(self, database_id: str) -> None:
+        self.database_id = database_id
+        self._pages = {}
+        self._checkpoint = None
+        self._last_full_sync = None
+        self._synced_at = None
+        self._changed = set()
+        self._replaced = False
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def synced_at(self) -> float | None:
+        """Unix time of the last successful sync, `None` if never synced"""
+        return self._synced_at
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def checkpoint(self) -> str | None:
+        return self._checkpoint
+
+    @property
+    def last_full_sync(self) -> float | None:
+        return self._last_full_sync
+
+    def restore(self, pages: Iterable[dict[str, Any]],
+                checkpoint: str | None, synced_at: float | None,
+                last_full_sync: float | None):
+        """Fill the mirror with pages saved earlier"""
+        self._pages = {page['id']: page for page in pages}
+        self._version += 1
+        self._checkpoint = checkpoint
+        self._synced_at = synced_at
+        self._last_full_sync = last_full_sync
+
+    def take_changes(self) -> tuple[bool, dict[str, dict[str, Any] | None]]:
+        """Return whether all pages are replaced and pages changed since
+        the previous call (`None` for dropped pages)
+        """
+        replaced = self._replaced
+        if replaced:
+            changes = dict(self._pages)
+        else:
+            changes = {id: self._pages.get(id) for id in self._changed}
+        self._replaced = False
+        self._changed = set()
+        return replaced, changes
+
+    def pages(self) -> Iterable[dict[str, Any]]:
+        return self._pages.values()
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def owns(self, page: dict[str, Any]) -> bool:
+        parent = page.get('parent', {}).get('database_id')
+        return parent is not None and plain_id(parent) == plain_id(self.database_id)
+
+    def apply(self, page: dict[str, Any]) -> bool:
+        """Put page into the mirror (or drop it, if it is archived).
+        Return `True` if the mirror is changed.
+        The checkpoint is moved only by syncs.
+        """
+        if page.get('archived') or page.get('in_trash'):
+            return self.discard(page['id'])
+        if self._pages.get(page['id']) == page:
+            return False
+        self._pages[page['id']] = page
+        self._changed.add(page['id'])
+        self._version += 1
+        return True
+
+    def discard(self, page_id: str) -> bool:
+        if self._pages.pop(page_id, None) is None:
+            return False
+        self._changed.add(page_id)
+        self._version += 1
+        return True
+
+    async def sync(self, client: AsyncClient) -> bool:
+        """Pull changes from Notion. Return `True` if anything changed."""
+        async with self._lock:
+            if (self._last_full_sync is None
+                    or time() - self._last_full_sync > NOTION_FULL_SYNC_INTERVAL):
+                changed = await self._full_sync(client)
+            else:
+                changed = await self._incremental_sync(client)
+            self._synced_at = time()
+            return changed
+
+    async def _full_sync(self, client: AsyncClient) -> bool:
+        pages = {}
+        checkpoint = None
+        async for page in async_iterate_paginated_api(
+            client.databases.query, database_id=self.database_id
+        ):
+            pages[page['id']] = page
+            edited = page.get('last_edited_time')
+            if edited and (checkpoint is None or edited > checkpoint):
+                checkpoint = edited
+        changed = pages != self._pages
+        self._pages = pages
+        self._checkpoint = checkpoint
+        self._last_full_sync = time()
+        if changed:
+            self._replaced = True
+            self._version += 1
+        logging.info(f"Notion mirror: full sync of {self.database_id}, "
+                     f"{len(pages)} pages")
+        return changed
+
+    async def _incremental_sync(self, client: AsyncClient) -> bool:
+        if self._checkpoint is None:
+            return await self._full_sync(client)
+        changed = False
+        checkpoint = self._checkpoint
+        # `last_edited_time` is rounded to minutes by Notion,
+        # so pages of the last seen minute are fetched again
+        async for page in async_iterate_paginated_api(
+            client.databases.query,
+            database_id=self.database_id,
+            filter={
+                "timestamp": "last_edited_time",
+                "last_edited_time": {"on_or_after": self._checkpoint},
+            }
+        ):
+            changed = self.apply(page) or changed
+            edited = page.get('last_edited_time')
+            if edited and edited > checkpoint:
+                checkpoint = edited
+        self._checkpoint = checkpoint
+        return changed
@@ -0,0 +1,102 @@
+from __future__ import annotations
+import asyncio
+import importlib.util
+import logging
+from time import perf_counter
+
+import httpx
+
+from metrics import metrics
+from config import (
+    NOTION_API_URL,
+    NOTION_MAX_CONNECTIONS,
+    NOTION_KEEPALIVE_CONNECTIONS,
+    NOTION_KEEPALIVE_EXPIRY,
+    NOTION_HTTP2,
+    NOTION_CONNECT_TIMEOUT,
+    NOTION_RESPONSE_TIMEOUT,
+)
+
+NOTION_TIMEOUT = httpx.Timeout(NOTION_RESPONSE_TIMEOUT,
+                               connect=NOTION_CONNECT_TIMEOUT)
+
+
+class ConnectionTrace:
+    """httpcore trace of one request (`trace` request extension).
+
+    Observes time of TCP and TLS handshakes (`bot_notion_handshake`)
+    and time until the request is sent, by whether the connection
+    is reused or new (`bot_notion_connection`).
+    """
+    __slots__ = (
+        "_started",
+        "_handshake_started",
+        "_new",
+    )
+    _started: float
+    _handshake_started: float
+    # is a new connection opened for the request
+    _new: bool
+
+    def __init__(self) -> None:
+        self._started = perf_counter()
+        self._handshake_started = self._started
+        self._new = False
+
+    async def __call__(self, event: str, info: dict):
+        match event.rsplit(".", 1):
+            case ["connection.connect_tcp" | "connection.start_tls",
+                  "started"]:
+                self._new = True
+                self._handshake_started = perf_counter()
+            case ["connection.connect_tcp" | "connection.start_tls" as step,
+                  "complete" | "failed" as result]:
+                metrics.observe("bot_notion_handshake",
+                                perf_counter() - self._handshake_started,
+                                result == "failed",
+                                phase=step.removeprefix("connection."))
+            case ["http11.send_request_headers"
+                  | "http2.send_request_headers", "started"]:
+                metrics.observe("bot_notion_connection",
+                                perf_counter() - self._started,
+                                reused="no" if self._new else "yes")
+
+
+async def _trace_request(request: httpx.Request):
+    request.extensions["trace"] = ConnectionTrace()
+
+
+def make_client() -> httpx.AsyncClient:
+    """HTTP client for the Notion API with a tuned connection pool"""
+    http2 = NOTION_HTTP2 and importlib.util.find_spec("h2") is not None
+    if NOTION_HTTP2 and not http2:
+        logging.warning("Notion: NOTION_HTTP2 is set, but `h2` is not "
+                        "installed, using HTTP/1.1")
+    return httpx.AsyncClient(
+        base_url=f"{NOTION_API_URL}/v1/",
+        http2=http2,
+        timeout=NOTION_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=NOTION_MAX_CONNECTIONS,
+            max_keepalive_connections=NOTION_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=NOTION_KEEPALIVE_EXPIRY,
+        ),
+        event_hooks={"request": [_trace_request]},
+    )
+
+
+async def open_connections(client: httpx.AsyncClient, n: int) -> int:
+    """Open up to `n` connections (idle ones are reused) with requests
+    without a token: they are not counted by the Notion rate limits
+    and the error answer does not matter. Return number of requests
+    which got an answer.
+    """
+    results = await asyncio.gather(
+        *(client.get("users/me") for _ in range(n)),
+        return_exceptions=True
+    )
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        logging.warning(f"Notion: {len(failed)} of {n} connections are "
+                        f"not opened: {failed[0]!r}")
+    return n - len(failed)
@@ -0,0 +1,7 @@
+from .splitter import split_html
+from .sendqueue import SendQueue
+
+__all__ = [
+    "split_html",
+    "SendQueue",
+]
@@ -0,0 +1,183 @@
+from __future__ import annotations
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from datetime import timedelta
+from time import monotonic
+from typing import Any
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from metrics import metrics
+from outbox.splitter import split_html
+from config import (
+    SEND_CHAT_INTERVAL,
+    SEND_GLOBAL_INTERVAL,
+    SEND_MAX_TRIES,
+)
+
+
+@dataclass(slots=True)
+class _Part:
+    text: str
+    kwargs: dict[str, Any]
+    # resolved after the last part of the message
+    done: asyncio.Future | None
+    enqueued: float
+    tries: int = 0
+
+
+class SendQueue:
+    """All messages of the bot are sent through this queue.
+
+    Messages longer than Telegram allows are split into several parts.
+    Each chat gets at most one message per `SEND_CHAT_INTERVAL` seconds
+    and the bot at most one per `SEND_GLOBAL_INTERVAL` seconds;
+    messages of one chat are delivered in order. When Telegram
+    answers with flood control error, sending is paused
+    for requested time. Time from `send` call to delivery of the whole
+    message is observed as `bot_send_latency`.
+    """
+    __slots__ = (
+        "_bot",
+        "_chats",
+        "_chat_ready",
+        "_global_ready",
+        "_wakeup",
+        "_task",
+    )
+    _bot: Bot
+    # chat id -> parts waiting for sending
+    _chats: dict[int, deque[_Part]]
+    # chat id -> monotonic time, when the chat can get next message
+    _chat_ready: dict[int, float]
+    _global_ready: float
+    _wakeup: asyncio.Event
+    _task: asyncio.Task | None
+
+    def __init__(self, bot: Bot) -> None:
+        self._bot = bot
+        self._chats = {}
+        self._chat_ready = {}
+        self._global_ready = 0.0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def send(self, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        """Put message into the queue.
+        Return future, which is resolved with `True` when the message
+        is delivered (`False` if it cannot be delivered).
+        Extra `kwargs` are passed to `Bot.send_message`.
+        """
+        done = asyncio.get_running_loop().create_future()
+        parts = split_html(text)
+        queue = self._chats.setdefault(chat_id, deque())
+        now = monotonic()
+        for i, part in enumerate(parts):
+            last = i == len(parts) - 1
+            queue.append(_Part(part, kwargs, done if last else None, now))
+        self._wakeup.set()
+        return done
+
+    @property
+    def waiting(self) -> int:
+        return sum(map(len, self._chats.values()))
+
+    def _next_chat(self) -> int | None:
+        """Chat with messages, which can get next message earlier"""
+        chats = [c for c, queue in self._chats.items() if queue]
+        if not chats:
+            return None
+        return min(chats, key=lambda c: self._chat_ready.get(c, 0.0))
+
+    async def _run(self):
+        while True:
+            chat_id = None
+            try:
+                chat_id = self._next_chat()
+                if chat_id is None:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                ready = max(self._chat_ready.get(chat_id, 0.0),
+                            self._global_ready)
+                if (delay := ready - monotonic()) > 0:
+                    # a message for another chat could arrive meanwhile
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._send_part(chat_id, self._chats[chat_id][0])
+            except Exception:
+                # the sender must not stop, otherwise all later
+                # messages stay in the queue
+                logging.exception(f"Send queue: unexpected error, message "
+                                  f"to {chat_id} is dropped")
+                if chat_id in self._chats:
+                    # the same message would fail again
+                    self._drop_message(self._chats[chat_id])
+
+    async def _send_part(self, chat_id: int, part: _Part):
+        queue = self._chats[chat_id]
+        now = monotonic()
+        self._chat_ready[chat_id] = now + SEND_CHAT_INTERVAL
+        self._global_ready = now + SEND_GLOBAL_INTERVAL
+        try:
+            with metrics.timer("bot_telegram_send"):
+                await self._bot.send_message(chat_id, part.text, **part.kwargs)
+        except RetryAfter as flood:
+            delay = flood.retry_after
+            if isinstance(delay, timedelta):
+                delay = delay.total_seconds()
+            logging.warning(f"Send queue: flood control, waiting {delay} s")
+            self._global_ready = monotonic() + delay
+            return
+        except (BadRequest, Forbidden) as err:
+            logging.error(f"Send queue: cannot send message "
+                          f"to {chat_id}: {err}")
+            self._drop_message(queue)
+            return
+        except TelegramError as err:
+            part.tries += 1
+            if part.tries < SEND_MAX_TRIES:
+                logging.warning(f"Send queue: {err}, will try again")
+                self._chat_ready[chat_id] = monotonic() + 2 ** part.tries
+                return
+            logging.error(f"Send queue: giving up sending to {chat_id}: {err}")
+            self._drop_message(queue)
+            return
+        queue.popleft()
+        if not queue:
+            del self._chats[chat_id]
+        if part.done is not None:
+            metrics.observe("bot_send_latency", monotonic() - part.enqueued)
+            if not part.done.done():
+                part.done.set_result(True)
+
+    def _drop_message(self, queue: deque[_Part]):
+        """Remove the head message (all its remaining parts)"""
+        while queue:
+            part = queue.popleft()
+            if part.done is not None:
+                metrics.observe("bot_send_latency",
+                                monotonic() - part.enqueued, error=True)
+                if not part.done.done():
+                    part.done.set_result(False)
+                return
@@ -0,0 +1,82 @@
+import re
+
+from telegram.constants import MessageLimit
+
+TAG_RE = re.compile(r"<(/?)([a-zA-Z][\w-]*)[^>]*>")
+
+
+def _update_open_tags(open_tags: list[tuple[str, str]], text: str):
+    """Apply opening and closing tags of `text` to the stack
+    of `(tag name, opening tag)` pairs
+    """
+    for match in TAG_RE.finditer(text):
+        closing, name = match.group(1), match.group(2).lower()
+        if not closing:
+            open_tags.append((name, match.group(0)))
+            continue
+        for i in range(len(open_tags) - 1, -1, -1):
+            if open_tags[i][0] == name:
+                del open_tags[i:]
+                break
+
+
+def _close(open_tags: list[tuple[str, str]]) -> str:
+    return ''.join(f"</{name}>" for name, _ in reversed(open_tags))
+
+
+def _reopen(open_tags: list[tuple[str, str]]) -> str:
+    return ''.join(tag for _, tag in open_tags)
+
+
+def _cut(line: str, size: int) -> list[str]:
+    """Cut line to pieces of at most `size` characters,
+    tags and HTML entities are never cut
+    """
+    pieces = []
+    while len(line) > size:
+        pos = size
+        tag_start, entity_start = line.rfind('<', 0, pos), line.rfind('&', 0, pos)
+        if tag_start > line.rfind('>', 0, pos):
+            pos = tag_start
+        elif entity_start > line.rfind(';', 0, pos):
+            pos = entity_start
+        else:
+            # prefer to cut on a space
+            space = line.rfind(' ', size // 2, pos)
+            pos = space + 1 if space > 0 else pos
+        if pos == 0:
+            pos = size
+        pieces.append(line[:pos])
+        line = line[pos:]
+    pieces.append(line)
+    return pieces
+
+
+def split_html(text: str,
+               limit: int = MessageLimit.MAX_TEXT_LENGTH) -> list[str]:
+    """Split HTML message into parts not longer than `limit`.
+
+    Text is split on line breaks when possible. Tags which are
+    open at the split point (e.g. `<pre>`, `<b>`) are closed at
+    the end of a part and opened again at the start of the next one.
+    """
+    if len(text) <= limit:
+        return [text]
+    pieces = []
+    for line in text.splitlines(keepends=True):
+        pieces += _cut(line, limit // 2)
+    parts = []
+    current = ''
+    open_tags: list[tuple[str, str]] = []
+    for piece in pieces:
+        tags_after = open_tags.copy()
+        _update_open_tags(tags_after, piece)
+        if (current.strip()
+                and len(current) + len(piece) + len(_close(tags_after)) > limit):
+            parts.append(current + _close(open_tags))
+            current = _reopen(open_tags)
+        current += piece
+        open_tags = tags_after
+    if current.strip():
+        parts.append(current)
+    return parts
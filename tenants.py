@@ -0,0 +1,161 @@
+"""Chats served by the bot and their Notion workspaces.
+
+By default there is one tenant made of TG_CHAT_ID, INTEGRATION_TOKEN
+and database ids from `.env`. With TENANTS_FILE the bot serves many
+chats, each with its own workspace:
+```
+[[tenant]]
+chat_id = 123456789
+name = "me"
+token = "secret_..."
+inbox = "<database id>"
+calendar = "<database id>"
+current_tasks = "<database id>"
+uni_schedule = "<database id>"
+admin = true        # can /enable, /disable and /reload plugins
+```
+Code serving a chat runs with `current_tenant` set to its tenant
+(see `tools.validate_user`), `mynotion.Notion` and `TenantLocal`
+use it to pick the data of that chat.
+"""
+from __future__ import annotations
+import tomllib
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+import config
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True, slots=True)
+class Tenant:
+    chat_id: int
+    name: str
+    # Notion integration token
+    token: str
+    inbox_id: str
+    calendar_id: str
+    current_tasks_id: str
+    uni_schedule_id: str
+    admin: bool = False
+
+
+class TenantRegistry:
+    __slots__ = ("_tenants", )
+    # chat id -> tenant
+    _tenants: dict[int, Tenant]
+
+    def __init__(self, tenants: list[Tenant]) -> None:
+        self._tenants = {}
+        for tenant in tenants:
+            if tenant.chat_id in self._tenants:
+                raise ValueError(f"chat {tenant.chat_id} is used by two "
+                                 "tenants")
+            self._tenants[tenant.chat_id] = tenant
+
+    @classmethod
+    def from_file(cls, path: str) -> TenantRegistry:
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+        try:
+            return cls([
+                Tenant(
+                    chat_id=int(t["chat_id"]),
+                    name=t.get("name", str(t["chat_id"])),
+                    token=t["token"],
+                    inbox_id=t["inbox"],
+                    calendar_id=t["calendar"],
+                    current_tasks_id=t["current_tasks"],
+                    uni_schedule_id=t["uni_schedule"],
+                    admin=t.get("admin", False),
+                )
+                for t in data.get("tenant", ())
+            ])
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"invalid tenants file `{path}`: {e!r}")
+
+    @classmethod
+    def from_config(cls) -> TenantRegistry:
+        """The only tenant from `.env`"""
+        return cls([Tenant(
+            chat_id=config.TG_CHAT_ID,
+            name="default",
+            token=config.INTEGRATION_TOKEN,
+            inbox_id=config.INBOX_DATABASE_ID,
+            calendar_id=config.CALENDAR_DATABASE_ID,
+            current_tasks_id=config.CURRENT_TASKS_ID,
+            uni_schedule_id=config.UNI_SCHEDULE,
+            admin=True,
+        )])
+
+    def get(self, chat_id: int) -> Tenant | None:
+        return self._tenants.get(chat_id)
+
+    def admins(self) -> list[Tenant]:
+        return [t for t in self._tenants.values() if t.admin]
+
+    def __iter__(self) -> Iterator[Tenant]:
+        return iter(self._tenants.values())
+
+    def __len__(self) -> int:
+        return len(self._tenants)
+
+
+if config.TENANTS_FILE:
+    tenants = TenantRegistry.from_file(config.TENANTS_FILE)
+    if not tenants:
+        raise ValueError(f"no tenants in `{config.TENANTS_FILE}`")
+else:
+    tenants = TenantRegistry.from_config()
+
+# tenant served in the current context; with one tenant it is
+# the default, with many, code outside of a chat must choose one
+if len(tenants) == 1:
+    current_tenant: ContextVar[Tenant] = ContextVar(
+        "current_tenant", default=next(iter(tenants))
+    )
+else:
+    current_tenant = ContextVar("current_tenant")
+
+
+@contextmanager
+def as_tenant(tenant: Tenant) -> Iterator[Tenant]:
+    """Run the block for the tenant"""
+    token = current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        current_tenant.reset(token)
+
+
+class TenantLocal(Generic[T]):
+    """Plugin state kept separately for each tenant,
+    because one plugin instance serves all of them
+    """
+    __slots__ = (
+        "_factory",
+        "_values",
+    )
+    _factory: Callable[[], T]
+    # chat id -> value
+    _values: dict[int, T]
+
+    def __init__(self, factory: Callable[[], T]) -> None:
+        self._factory = factory
+        self._values = {}
+
+    def get(self) -> T:
+        """Value of the current tenant"""
+        chat_id = current_tenant.get().chat_id
+        value = self._values.get(chat_id)
+        if value is None:
+            value = self._values[chat_id] = self._factory()
+        return value
+
+    def set(self, value: T):
+        """Replace value of the current tenant"""
+        self._values[current_tenant.get().chat_id] = value
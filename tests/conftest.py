@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# tests import the bot modules from the repository root, with fake
+# tokens, and keep the bot state (`DATA_DIR`) in a temporary directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bot-tests-"))
+import benchmarks.fakeenv  # noqa: E402,F401
+
+
+@pytest.fixture(scope="session")
+def loader():
+    # there is only one plugin manager (and so loader) in a process
+    from extension.extensionloader import ExtensionLoader
+    return ExtensionLoader(SimpleNamespace(send=lambda *args: None))
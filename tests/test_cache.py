@@ -0,0 +1,71 @@
+import pytest
+
+from mynotion import cache as cache_module
+from mynotion.cache import TTLCache
+
+MISSING = TTLCache.MISSING
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(clock) -> TTLCache:
+    return TTLCache({"inbox": 30, "calendar": 300, "off": 0}, maxsize=3)
+
+
+def test_entry_expires_after_dataset_ttl(cache, clock):
+    cache.set(("inbox", 10), "pages")
+    cache.set(("calendar", ), "events")
+    clock.now += 31
+    assert cache.get(("inbox", 10)) is MISSING
+    assert cache.get(("calendar", )) == "events"
+
+
+def test_dataset_without_ttl_is_not_cached(cache):
+    cache.set(("off", ), "value")
+    cache.set(("unknown", ), "value")
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_dropped(cache):
+    for n in range(3):
+        cache.set(("inbox", n), n)
+    cache.get(("inbox", 0))
+    cache.set(("inbox", 3), 3)
+    assert cache.get(("inbox", 1)) is MISSING
+    assert [cache.get(("inbox", n)) for n in (0, 2, 3)] == [0, 2, 3]
+
+
+def test_invalidation_drops_dataset_and_refuses_older_loads(cache):
+    cache.set(("inbox", 10), "pages")
+    cache.set(("calendar", ), "events")
+    loading = cache.generation("inbox")
+    cache.invalidate("inbox")
+    assert cache.get(("inbox", 10)) is MISSING
+    assert cache.get(("calendar", )) == "events"
+    # loaded before the invalidation
+    cache.set(("inbox", 10), "old pages", loading)
+    assert cache.get(("inbox", 10)) is MISSING
+    cache.set(("inbox", 10), "new pages", cache.generation("inbox"))
+    assert cache.get(("inbox", 10)) == "new pages"
+
+
+def test_discard_keeps_generation(cache):
+    generation = cache.generation("inbox")
+    cache.set(("inbox", 10), "pages")
+    cache.discard()
+    assert len(cache) == 0
+    assert cache.generation("inbox") == generation
@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from extension import ActionResult
+
+CHAT = 100
+
+
+class Plugin:
+    name = "Slow"
+    isenabled = True
+
+    def __init__(self) -> None:
+        self.release = asyncio.Event()
+
+    async def slow(self):
+        await self.release.wait()
+        return ActionResult("slow")
+
+    async def fast(self):
+        return ActionResult("fast")
+
+
+@pytest.fixture
+def sent(loader, monkeypatch) -> list[str]:
+    """Messages sent to the user"""
+    sent = []
+    monkeypatch.setattr(loader, "_outbox",
+                        SimpleNamespace(send=lambda chat, text: sent.append(text)))
+    monkeypatch.setattr("extension.extensionloader.PLUGIN_ACTION_TIMEOUT", 0.05)
+    monkeypatch.setitem(loader._limits, Plugin.name, asyncio.Semaphore(1))
+    return sent
+
+
+def test_queued_command_runs_when_slot_is_free(loader, sent):
+    async def main():
+        plg = Plugin()
+        first = asyncio.create_task(loader.run_command(plg, plg.slow, (), CHAT))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(loader.run_command(plg, plg.fast, (), CHAT))
+        await asyncio.sleep(0)
+        plg.release.set()
+        return (await first).message, (await second).message
+
+    assert asyncio.run(main()) == ("slow", "fast")
+    assert "queued" in sent[0]
+    assert not loader._limits[Plugin.name].locked()
+
+
+def test_queued_command_times_out_without_leaking_slot(loader, sent):
+    async def main():
+        plg = Plugin()
+        first = asyncio.create_task(loader.run_command(plg, plg.slow, (), CHAT))
+        await asyncio.sleep(0)
+        assert await loader.run_command(plg, plg.fast, (), CHAT) is None
+        plg.release.set()
+        return await first
+
+    assert asyncio.run(main()) is None      # the slow one timed out too
+    assert any("was busy" in text for text in sent)
+    assert loader._limits[Plugin.name]._value == 1
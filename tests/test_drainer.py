@@ -0,0 +1,146 @@
+import asyncio
+
+import httpx
+import pytest
+from notion_client import APIErrorCode, APIResponseError
+from notion_client.errors import HTTPResponseError
+
+from inbox import drainer as drainer_module
+from inbox.drainer import InboxDrainer
+from inbox.spool import InboxSpool
+from tenants import Tenant, TenantRegistry, tenants
+
+CHAT = next(iter(tenants)).chat_id
+REQUEST = httpx.Request("POST", "https://api.notion.com/v1/pages")
+
+
+def gateway_error() -> HTTPResponseError:
+    return HTTPResponseError(httpx.Response(502, text="<html>Bad Gateway",
+                                            request=REQUEST))
+
+
+def api_error(code: APIErrorCode) -> APIResponseError:
+    return APIResponseError(httpx.Response(400, request=REQUEST),
+                            code.value, code)
+
+
+class FakeNotion:
+    """Raises given errors, then accepts pages,
+    a page named by a number takes that many milliseconds
+    """
+
+    def __init__(self, *errors: Exception) -> None:
+        self.errors = list(errors)
+        self.pages: list[str] = []
+        self.running = self.max_running = 0
+
+    async def create_page_in_inbox(self, text: str):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(int(text) / 1000 if text.isdigit() else 0)
+        self.running -= 1
+        self.pages.append(text)
+
+
+@pytest.fixture
+def spool(monkeypatch):
+    monkeypatch.setattr(drainer_module, "TRY_SEND_INIT_DELAY", 0)
+    spool = InboxSpool()
+    spool._db.execute("DELETE FROM spool")
+    spool._db.execute("DELETE FROM seen")
+    return spool
+
+
+def drain(spool: InboxSpool, notion: FakeNotion) -> list[str]:
+    """Run the drainer until the spool is empty, return notifications"""
+    notified = []
+
+    async def notify(chat_id: int, text: str):
+        notified.append(text)
+
+    async def run():
+        drainer = InboxDrainer(spool, notion, notify)
+        drainer.start()
+        try:
+            for _ in range(200):
+                if spool.depth == 0:
+                    break
+                await asyncio.sleep(0.01)
+            assert not drainer._task.done()
+        finally:
+            await drainer.stop()
+
+    asyncio.run(run())
+    return notified
+
+
+@pytest.mark.parametrize("error", [
+    gateway_error(),
+    api_error(APIErrorCode.InternalServerError),
+    api_error(APIErrorCode.ServiceUnavailable),
+    api_error(APIErrorCode.ConflictError),
+    api_error(APIErrorCode.RateLimited),
+    httpx.ConnectError("connection refused"),
+])
+def test_transient_errors_are_retried(spool, error):
+    spool.put("task", CHAT)
+    notion = FakeNotion(error, error)
+    notified = drain(spool, notion)
+    assert notion.pages == ["task"]
+    assert spool.depth == 0 and spool.failed == 0
+    # the outage is reported once
+    assert len(notified) == 1
+
+
+def test_refused_entry_is_kept_failed(spool):
+    spool.put("bad", CHAT)
+    spool.put("good", CHAT)
+    notion = FakeNotion(api_error(APIErrorCode.ValidationError))
+    notified = drain(spool, notion)
+    assert notion.pages == ["good"]
+    assert spool.failed == 1
+    assert notified == ["Cannot send a message: bad"]
+
+
+def test_drainer_survives_unexpected_errors(spool, monkeypatch):
+    spool.put("task", CHAT)
+    peek = type(spool).peek_chats
+    calls = []
+
+    def flaky_peek(self, limit: int = 1):
+        calls.append(limit)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return peek(self, limit)
+
+    monkeypatch.setattr(type(spool), "peek_chats", flaky_peek)
+    notion = FakeNotion()
+    drain(spool, notion)
+    assert notion.pages == ["task"]
+
+
+def test_entries_of_a_chat_keep_their_order(spool):
+    for text in ("30", "20", "10"):
+        spool.put(text, CHAT)
+    notion = FakeNotion()
+    drain(spool, notion)
+    assert notion.pages == ["30", "20", "10"]
+    assert notion.max_running == 1
+
+
+def test_chats_are_served_concurrently(spool, monkeypatch):
+    monkeypatch.setattr(drainer_module, "tenants", TenantRegistry([
+        Tenant(chat_id=chat, name=str(chat), token="", inbox_id="",
+               calendar_id="", current_tasks_id="", uni_schedule_id="")
+        for chat in (1, 2)
+    ]))
+    for text in ("20", "10"):
+        spool.put(text, 1)
+        spool.put(text, 2)
+    notion = FakeNotion()
+    drain(spool, notion)
+    assert notion.max_running == 2
+    # the second entry of a chat goes after the first one
+    assert notion.pages == ["20", "20", "10", "10"]
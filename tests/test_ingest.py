@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from inbox import ingest as ingest_module
+from inbox.ingest import InboxIngest
+from inbox.spool import InboxSpool
+
+CHAT = 100
+
+
+@pytest.fixture
+def spool(monkeypatch) -> InboxSpool:
+    monkeypatch.setattr(ingest_module, "INBOX_ACK_DELAY", 0.01)
+    monkeypatch.setattr(ingest_module, "ACK_POLL_INTERVAL", 0.01)
+    spool = InboxSpool()
+    spool._db.execute("DELETE FROM spool")
+    spool._db.execute("DELETE FROM seen")
+    return spool
+
+
+def ingest(spool: InboxSpool, notified: list[str]) -> InboxIngest:
+    async def notify(chat_id: int, text: str):
+        notified.append(text)
+
+    return InboxIngest(spool, SimpleNamespace(wake=lambda: None), notify)
+
+
+def test_burst_is_acknowledged_once(spool):
+    notified = []
+
+    async def main():
+        inbox = ingest(spool, notified)
+        assert inbox.submit(CHAT, 1, "one")
+        assert inbox.submit(CHAT, 2, "two")
+        assert not inbox.submit(CHAT, 2, "two")
+        for entry in spool.peek(5):
+            spool.ack(entry.id)
+        await asyncio.sleep(0.1)
+        await inbox.stop()
+
+    asyncio.run(main())
+    assert notified == ["2 added to Notion"]
+
+
+def test_stop_cancels_finished_burst_waiting_for_delivery(spool):
+    notified = []
+
+    async def main():
+        inbox = ingest(spool, notified)
+        inbox.submit(CHAT, 1, "one")
+        # the burst is finished, its entry is not delivered yet
+        await asyncio.sleep(0.05)
+        assert not inbox._bursts
+        await inbox.stop()
+        for entry in spool.peek(5):
+            spool.ack(entry.id)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert notified == []
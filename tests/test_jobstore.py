@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from extension import jobstore
+from extension.jobstore import JobStore
+
+
+def test_event_is_claimed_once_by_all_workers(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    leader, follower = JobStore(path), JobStore(path)
+    assert leader.claim("Morning.morning@2026-10-18")
+    assert not follower.claim("Morning.morning@2026-10-18")
+    assert not leader.claim("Morning.morning@2026-10-18")
+    assert follower.claim("Morning.morning@2026-10-19")
+
+
+def test_old_marks_are_forgotten(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    store.claim("job:1")
+    monkeypatch.setattr(jobstore, "FIRED_KEEP", -1)
+    assert store.claim("job:1")
+
+
+def test_jobs_survive_reopening(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    when = datetime(2026, 10, 18, 9, 30)
+    job_id = JobStore(path).add("Morning", "morning", (1, "a"), 100, when)
+    [job] = JobStore(path).jobs()
+    assert (job.id, job.action, job.args, job.chat_id) \
+        == (job_id, "morning", (1, "a"), 100)
+    assert job.when == when.replace(tzinfo=jobstore.TIMEZONE)
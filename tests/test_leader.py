@@ -0,0 +1,23 @@
+import os
+
+from cluster.leader import LeaderLock
+
+
+def test_one_leader_at_a_time(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    first, second = LeaderLock(path), LeaderLock(path)
+    assert first.try_acquire()
+    assert first.try_acquire()      # already held
+    assert not second.try_acquire()
+    assert first.held and not second.held
+    assert (tmp_path / "leader.lock").read_text() == f"{os.getpid()}\n"
+
+
+def test_lock_moves_after_release(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    first, second = LeaderLock(path), LeaderLock(path)
+    first.try_acquire()
+    first.release()
+    assert not first.held
+    assert second.try_acquire()
+    assert not first.try_acquire()
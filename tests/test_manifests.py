@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import pytest
+
+from extension.plgloader import PluginLoader
+
+PLUGINS_DIR = Path(__file__).resolve().parent.parent / "extension" / "plugins"
+MANIFESTS = sorted(p.with_suffix(".py").name
+                   for p in PLUGINS_DIR.glob("*_plugin.toml"))
+
+PLUGIN = """
+from extension import AbstractPlugin, ActionResult
+
+
+class EchoPlugin(AbstractPlugin):
+    def __init__(self) -> None:
+        super().__init__("Echo")
+
+    async def echo(self, *args):
+        return ActionResult(" ".join(args))
+
+    def user_commands(self):
+        return (("echo", self.echo), )
+
+    def help(self, *args):
+        return {"Echo": ("/echo <text>", )}
+
+    def daily_events(self):
+        return ()
+
+    def monthly_events(self):
+        return ()
+
+    def disordered_events(self):
+        return ()
+"""
+
+MANIFEST = """
+name = "Echo"
+class = "EchoPlugin"
+
+[commands]
+echo = "echo"
+
+[help]
+"Echo" = ["/echo <text>"]
+"""
+
+
+@pytest.mark.parametrize("filename", MANIFESTS)
+def test_manifest_describes_plugin(filename):
+    plugin, = PluginLoader(str(PLUGINS_DIR)).load_file(filename, eager=True)
+    assert plugin.isloaded
+
+
+@pytest.fixture
+def plugins_dir(tmp_path) -> Path:
+    (tmp_path / "echo_plugin.py").write_text(PLUGIN)
+    return tmp_path
+
+
+def test_lazy_plugin_is_not_imported(plugins_dir):
+    (plugins_dir / "echo_plugin.toml").write_text(MANIFEST)
+    plugin, = PluginLoader(str(plugins_dir)).load_file("echo_plugin.py")
+    assert not plugin.isloaded
+    assert [cmd for cmd, _ in plugin.user_commands()] == ["echo"]
+
+
+@pytest.mark.parametrize("manifest", [
+    MANIFEST.replace('echo = "echo"', 'echo = "shout"'),
+    MANIFEST.replace('"/echo <text>"', '"/echo"'),
+    MANIFEST + '[[daily_events]]\ntime = "MORNING_MESSAGE_TIME"\n'
+               'action = "echo"\n',
+])
+def test_mismatched_manifest_fails_loading(plugins_dir, manifest):
+    (plugins_dir / "echo_plugin.toml").write_text(manifest)
+    with pytest.raises(ValueError, match="differs from the plugin"):
+        PluginLoader(str(plugins_dir)).load_file("echo_plugin.py",
+                                                 eager=True)
+
+
+def test_event_time_must_come_from_config(plugins_dir):
+    (plugins_dir / "echo_plugin.toml").write_text(
+        MANIFEST + '[[daily_events]]\ntime = 08:10:00\naction = "echo"\n'
+    )
+    with pytest.raises(ValueError, match="config.py"):
+        PluginLoader(str(plugins_dir)).load_file("echo_plugin.py")
@@ -0,0 +1,117 @@
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+from metrics import exporter as exporter_module
+from metrics import MetricsExporter, MetricsRegistry
+
+PLUGIN = (Path(__file__).resolve().parent.parent
+          / "extension" / "plugins" / "stats_plugin.py")
+spec = importlib.util.spec_from_file_location("stats_plugin", PLUGIN)
+stats = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(stats)
+
+
+@pytest.fixture
+def registry() -> MetricsRegistry:
+    registry = MetricsRegistry()
+    registry.describe("bot_notion_request", "Time of requests")
+    for seconds in (0.003, 0.02, 0.02, 0.7):
+        registry.observe("bot_notion_request", seconds, method="GET")
+    registry.observe("bot_notion_request", 40, error=True, method="POST")
+    return registry
+
+
+def test_histogram_counts_and_quantiles(registry):
+    (_, get), (_, post) = registry.series("bot_notion_request").items()
+    assert (get.count, get.errors, get.max) == (4, 0, 0.7)
+    assert get.sum == pytest.approx(0.743)
+    assert 0.01 < get.quantile(0.5) <= 0.025
+    assert 0.5 < get.quantile(0.95) <= 0.7
+    # interpolated within the bucket (30 s, 60 s], up to the max
+    assert (post.errors, post.quantile(0.5)) == (1, 35.0)
+
+
+def test_timer_counts_exception_as_error():
+    registry = MetricsRegistry()
+    with pytest.raises(TimeoutError):
+        with registry.timer("bot_plugin_action", plugin="Echo"):
+            raise TimeoutError
+    with registry.timer("bot_plugin_action", plugin="Echo"):
+        pass
+    h, = registry.series("bot_plugin_action").values()
+    assert (h.count, h.errors) == (2, 1)
+
+
+def test_prometheus_text(registry):
+    lines = registry.prometheus_text(worker="1").splitlines()
+    assert lines[:2] == ["# HELP bot_notion_request_seconds Time of requests",
+                         "# TYPE bot_notion_request_seconds histogram"]
+    get = '{worker="1",method="GET"'
+    # buckets are cumulative
+    assert f'bot_notion_request_seconds_bucket{get},le="0.005"}} 1' in lines
+    assert f'bot_notion_request_seconds_bucket{get},le="0.025"}} 3' in lines
+    assert f'bot_notion_request_seconds_bucket{get},le="+Inf"}} 4' in lines
+    assert f"bot_notion_request_seconds_count{get}}} 4" in lines
+    assert f"bot_notion_request_seconds_sum{get}}} " \
+           f"{0.003 + 0.02 + 0.02 + 0.7}" in lines
+    assert "# TYPE bot_notion_request_errors_total counter" in lines
+    assert f"bot_notion_request_errors_total{get}}} 0" in lines
+    assert 'bot_notion_request_errors_total{worker="1",method="POST"} 1' \
+        in lines
+
+
+def test_prometheus_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.observe("bot_plugin_action", 1, action='say "hi"\\\n')
+    text = registry.prometheus_text()
+    assert 'action="say \\"hi\\"\\\\\\n"' in text
+    # family without description is named after itself
+    assert "# HELP bot_plugin_action_seconds bot_plugin_action" in text
+
+
+def test_textfile_is_written(registry, tmp_path, monkeypatch):
+    path = tmp_path / "metrics" / "bot.prom"
+    monkeypatch.setattr(exporter_module, "METRICS_TEXTFILE_PATH", str(path))
+    MetricsExporter(registry).write_textfile()
+    assert path.read_text() == registry.prometheus_text(
+        **exporter_module.CONST_LABELS
+    )
+    assert not path.with_suffix(".tmp").exists()
+
+
+def test_metrics_are_served(registry):
+    exporter = MetricsExporter(registry)
+
+    async def get(target: str) -> bytes:
+        server = await asyncio.start_server(exporter._serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            return response
+
+    head, body = asyncio.run(get("/metrics")).split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200 OK")
+    assert f"Content-Length: {len(body)}".encode() in head
+    assert body == registry.prometheus_text().encode()
+    assert asyncio.run(get("/")).startswith(b"HTTP/1.1 404 Not Found")
+
+
+def test_stats_sections(registry, monkeypatch):
+    monkeypatch.setattr(stats, "metrics", registry)
+    plg = stats.StatsPlugin()
+    message = asyncio.run(plg.show_stats("NOTION", "limiter")).message
+    assert message.splitlines() == [
+        "<b>Notion requests</b>",
+        "<pre>POST",
+        "  n 1 err 1 p50 35.0s p95 39.5s max 40.0s",
+        "GET",
+        "  n 4 p50 18ms p95 660ms max 700ms</pre>",
+        "<b>Notion rate limiter waits</b>",
+        "no calls yet",
+    ]
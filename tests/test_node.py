@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+import pytest
+from telegram import User
+from telegram.ext import ApplicationBuilder, MessageHandler, filters
+
+from cluster import ClusterApplication, ClusterNode, LeaderLock, UpdateQueue
+
+CHAT = 100
+
+
+def message(update_id: int, text: str) -> str:
+    return json.dumps({"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "text": text,
+        "chat": {"id": CHAT, "type": "private"},
+    }})
+
+
+@pytest.fixture
+def queue(tmp_path) -> UpdateQueue:
+    queue = UpdateQueue(str(tmp_path / "queue.sqlite3"), worker=1)
+    queue.heartbeat()
+    return queue
+
+
+def node(queue: UpdateQueue, tmp_path, release: asyncio.Event,
+         handled: list[str]) -> ClusterNode:
+    app = ApplicationBuilder().token("123456:fake") \
+                              .application_class(ClusterApplication) \
+                              .build()
+
+    async def slow(update, context):
+        await release.wait()
+        handled.append(update.message.text)
+
+    app.add_handler(MessageHandler(filters.TEXT, slow, block=False))
+    # `initialize` would ask Telegram about the bot
+    app.bot._bot_user = User(123456, "bot", is_bot=True, username="bot")
+    app._initialized = True
+    return ClusterNode(app, queue, LeaderLock(str(tmp_path / "leader.lock")),
+                       pinned=lambda update: False,
+                       on_elected=lambda app: asyncio.sleep(0))
+
+
+# the application is not started in tests
+@pytest.mark.filterwarnings("ignore:Tasks created via")
+def test_update_is_done_after_its_handlers(queue, tmp_path):
+    handled = []
+
+    async def main():
+        release = asyncio.Event()
+        worker = node(queue, tmp_path, release, handled)
+        queue.put(1, CHAT, message(1, "task"))
+        [(update_id, data)] = queue.claim(16)
+        await worker._process(update_id, data)
+        pending = queue.depth
+        release.set()
+        await asyncio.gather(*worker._finishing)
+        return pending
+
+    assert asyncio.run(main()) == 1
+    assert handled == ["task"]
+    assert queue.depth == 0
+
+
+def test_node_needs_cluster_application(queue, tmp_path):
+    app = ApplicationBuilder().token("123456:fake").build()
+    with pytest.raises(TypeError):
+        ClusterNode(app, queue, LeaderLock(str(tmp_path / "leader.lock")),
+                    pinned=lambda update: False, on_elected=None)
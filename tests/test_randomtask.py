@@ -0,0 +1,114 @@
+import asyncio
+import importlib.util
+from pathlib import Path
+
+from mynotion import CurrentTask
+
+PLUGIN = (Path(__file__).resolve().parent.parent
+          / "extension" / "plugins" / "randomtask_plugin.py")
+spec = importlib.util.spec_from_file_location("randomtask_plugin", PLUGIN)
+randomtask = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(randomtask)
+
+TASKS = [CurrentTask(str(n), f"task {n}") for n in range(5)]
+
+
+class FakeNotion:
+    """Current tasks, some of them archived outside of the bot"""
+
+    def __init__(self) -> None:
+        self.tasks = list(TASKS)
+        self.archived: set[str] = set()
+        self.loads = 0
+
+    async def get_current_tasks(self) -> list[CurrentTask]:
+        self.loads += 1
+        return [t for t in self.tasks if t.id not in self.archived]
+
+    async def page_is_live(self, id: str) -> bool:
+        return id not in self.archived
+
+    async def archive_page(self, id: str):
+        self.archived.add(id)
+
+    async def unarchive_page(self, id: str):
+        self.archived.discard(id)
+
+    async def sync(self, dataset: str) -> bool:
+        return True
+
+    def stale_age(self, *datasets: str):
+        return None
+
+
+def test_index_add_remove_and_choice():
+    index = randomtask.TaskIndex()
+    index.reset(TASKS + [TASKS[0]])
+    assert len(index) == 5
+    assert index.remove("1") is TASKS[1]
+    assert index.remove("1") is None
+    index.add(TASKS[1])
+    index.add(CurrentTask("1", "renamed"))
+    assert len(index) == 5
+    chosen = {index.choice().title for _ in range(200)}
+    assert chosen == {"task 0", "renamed", "task 2", "task 3", "task 4"}
+
+
+def test_index_choice_of_empty_index():
+    index = randomtask.TaskIndex()
+    assert index.choice() is None
+    index.reset([TASKS[0]])
+    index.remove("0")
+    assert index.choice() is None and len(index) == 0
+
+
+def test_tasks_are_loaded_once_and_done_task_leaves_index():
+    plg = randomtask.RandomCurrentTask()
+    notion = plg._notion = FakeNotion()
+
+    async def main():
+        shown = {(await plg.random_current_task()).message for _ in range(20)}
+        done = plg._state.get().last_task
+        await plg.complete_last_task()
+        await plg.doagain_last_task()
+        undone = len(plg._state.get().index)
+        await plg.complete_last_task()
+        rest = {(await plg.random_current_task()).message for _ in range(50)}
+        return shown, done, undone, rest
+
+    shown, done, undone, rest = asyncio.run(main())
+    assert notion.loads == 1
+    assert shown <= {t.title for t in TASKS}
+    assert undone == len(TASKS)
+    assert done.title not in rest
+    assert notion.archived == {done.id}
+
+
+def test_task_archived_in_notion_is_skipped():
+    plg = randomtask.RandomCurrentTask()
+    notion = plg._notion = FakeNotion()
+
+    async def main():
+        await plg.random_current_task()
+        # archived outside of the bot, the index still has them
+        notion.archived = {"0", "1", "2", "3"}
+        return {(await plg.random_current_task()).message for _ in range(20)}
+
+    assert asyncio.run(main()) == {"task 4"}
+    assert len(plg._state.get().index) == 1
+
+
+def test_reconcile_index_brings_index_in_line():
+    plg = randomtask.RandomCurrentTask()
+    notion = plg._notion = FakeNotion()
+
+    async def main():
+        await plg.random_current_task()
+        notion.tasks.append(CurrentTask("5", "new task"))
+        notion.archived = {"0"}
+        await plg.reconcile_index()
+
+    asyncio.run(main())
+    index = plg._state.get().index
+    assert len(index) == 5
+    assert index.remove("0") is None and index.remove("5") is not None
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from metrics import Histogram, metrics
+from mynotion.ratelimit import Priority, RateLimiter
+
+
+def waits(priority: Priority) -> Histogram:
+    return metrics.series("bot_notion_limiter_wait").get(
+        (("priority", priority.name.lower()), ), Histogram()
+    )
+
+
+def test_burst_then_wait():
+    async def main():
+        limiter = RateLimiter(rate=1000, capacity=3)
+        for _ in range(3):
+            await limiter.acquire()
+        waited = waits(Priority.INTERACTIVE).count
+        await limiter.acquire(Priority.BACKGROUND)
+        return waited
+
+    waited = waits(Priority.INTERACTIVE).count
+    background = waits(Priority.BACKGROUND).count
+    assert asyncio.run(main()) == waited + 3
+    assert waits(Priority.BACKGROUND).count == background + 1
+    assert waits(Priority.BACKGROUND).max > 0
+
+
+def test_interactive_goes_first():
+    async def main():
+        limiter = RateLimiter(rate=100, capacity=1)
+        await limiter.acquire()
+        order = []
+
+        async def request(priority: Priority):
+            await limiter.acquire(priority)
+            order.append(priority)
+
+        await asyncio.gather(request(Priority.BACKGROUND),
+                             request(Priority.INTERACTIVE))
+        return order
+
+    assert asyncio.run(main()) == [Priority.INTERACTIVE, Priority.BACKGROUND]
+
+
+def test_cancelled_waiter_is_skipped():
+    async def main():
+        limiter = RateLimiter(rate=100, capacity=1)
+        await limiter.acquire()
+        cancelled = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.wait_for(limiter.acquire(), 1)
+        return limiter.waiting
+
+    assert asyncio.run(main()) == 0
+
+
+def test_granted_token_is_returned_on_cancel():
+    async def main():
+        limiter = RateLimiter(rate=0.01, capacity=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        # the token is granted, but the request is cancelled
+        # before it wakes up
+        limiter._tokens += 1
+        await limiter._dispatch()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter._dispatcher.cancel()
+        await asyncio.wait_for(limiter.acquire(), 0.1)
+
+    asyncio.run(main())
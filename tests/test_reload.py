@@ -0,0 +1,131 @@
+import asyncio
+import os
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from extension.plgloader import PluginLoader
+from extension.router import CommandRouter
+
+PLUGIN = """
+from extension import AbstractPlugin, ActionResult
+
+
+class EchoPlugin(AbstractPlugin):
+    def __init__(self) -> None:
+        super().__init__("Echo")
+
+    async def echo(self, *args):
+        return ActionResult("{reply}")
+
+    def user_commands(self):
+        return (("echo", self.echo), )
+
+    def help(self, *args):
+        return {{"Echo": ("/echo", )}}
+
+    def daily_events(self):
+        return ()
+
+    def monthly_events(self):
+        return ()
+
+    def disordered_events(self):
+        return ()
+"""
+
+
+def write(path: Path, text: str, mtime: float):
+    """Write the file with a distinct modification time"""
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def echo(tmp_path) -> Path:
+    path = tmp_path / "echo_plugin.py"
+    write(path, PLUGIN.format(reply="one"), 1_000_000)
+    return path
+
+
+@pytest.fixture
+def reloader(loader, echo, monkeypatch):
+    """The loader with plugins of a temporary directory"""
+    plg_loader = PluginLoader(str(echo.parent))
+    monkeypatch.setattr("extension.extensionloader.PLUGINS_DIR",
+                        str(echo.parent))
+    monkeypatch.setattr(loader, "_plg_loader", plg_loader)
+    monkeypatch.setattr(loader, "_router", CommandRouter())
+    monkeypatch.setattr(loader, "_runs_jobs", False)
+    monkeypatch.setattr(loader, "_scheduler",
+                        SimpleNamespace(forget=lambda name: None),
+                        raising=False)
+    monkeypatch.setattr(loader, "_app",
+                        SimpleNamespace(job_queue=SimpleNamespace(
+                            get_jobs_by_name=lambda name: [])),
+                        raising=False)
+    monkeypatch.setattr(loader._plg_manager, "_loaded_plugins", {})
+    loader.load_plugins()
+    loader.load_commands(loader._app)
+    return loader
+
+
+def reply(loader) -> str:
+    plugin = loader._plg_manager.find_plugin("Echo")
+    return asyncio.run(plugin.echo()).message
+
+
+def test_changed_files(echo):
+    plg_loader = PluginLoader(str(echo.parent))
+    plg_loader.load()
+    assert plg_loader.changed_files() == []
+    write(echo, PLUGIN.format(reply="two"), 1_000_001)
+    write(echo.with_name("new_plugin.py"), "", 1_000_000)
+    assert sorted(plg_loader.changed_files()) \
+        == ["echo_plugin.py", "new_plugin.py"]
+    plg_loader.load_file("echo_plugin.py")
+    # a manifest is a part of the plugin
+    write(echo.with_suffix(".toml"), "", 1_000_002)
+    assert "echo_plugin.py" in plg_loader.changed_files()
+    echo.unlink()
+    assert "echo_plugin.py" in plg_loader.changed_files()
+
+
+def test_changed_file_is_reloaded(reloader, echo):
+    assert reloader.reload() == "Plugin files are not changed"
+    write(echo, PLUGIN.format(reply="two"), 1_000_001)
+    assert reloader.reload() == "echo_plugin.py: reloaded Echo"
+    assert reply(reloader) == "two"
+    assert reloader._router.commands("Echo") == ["echo"]
+    assert reloader.reload() == "Plugin files are not changed"
+
+
+def test_plugin_is_reloaded_by_name(reloader):
+    old = reloader._plg_manager.find_plugin("Echo")
+    assert reloader.reload("Echo") == "echo_plugin.py: reloaded Echo"
+    assert reloader._plg_manager.find_plugin("Echo") is not old
+    assert reloader.reload("Missing").startswith("Error: plugin \"Missing\"")
+
+
+def test_broken_file_keeps_old_version(reloader, echo):
+    write(echo, "raise ImportError", 1_000_001)
+    assert reloader.reload() == "echo_plugin.py: FAILED, old version is kept"
+    assert reply(reloader) == "one"
+    assert reloader._router.commands("Echo") == ["echo"]
+    # the broken version is not tried again until the next change
+    assert reloader.reload() == "Plugin files are not changed"
+
+
+def test_disabled_plugin_stays_disabled(reloader, echo):
+    reloader._plg_manager.find_plugin("Echo").disable()
+    write(echo, PLUGIN.format(reply="two"), 1_000_001)
+    reloader.reload()
+    assert not reloader._plg_manager.find_plugin("Echo").isenabled
+
+
+def test_removed_file_unloads_plugin(reloader, echo):
+    echo.unlink()
+    assert reloader.reload() == "echo_plugin.py: removed Echo"
+    assert reloader._plg_manager.find_plugin("Echo") is None
+    assert reloader._router.commands("Echo") == []
@@ -0,0 +1,29 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from extension.router import CommandRouter
+
+
+async def answer(update, context):
+    pass
+
+
+def test_route_without_callback_is_rejected():
+    router = CommandRouter()
+    assert not router.add("help", "helper", None)
+    assert router.commands("helper") == []
+
+
+def test_command_of_another_plugin_is_rejected():
+    router = CommandRouter()
+    assert router.add("Help", "helper", answer)
+    assert not router.add("help", "other", answer)
+    assert router.commands("helper") == ["help"]
+    assert router.commands("other") == []
+
+
+def test_default_callback_answers_instead_of_raising():
+    update = MagicMock()
+    update.effective_message.reply_text = AsyncMock()
+    asyncio.run(CommandRouter._no_callback(update, MagicMock()))
+    update.effective_message.reply_text.assert_awaited_once()
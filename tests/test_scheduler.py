@@ -0,0 +1,163 @@
+import asyncio
+from datetime import time, timedelta
+from types import SimpleNamespace
+
+import pytest
+from telegram.ext import ApplicationBuilder
+
+from extension import AbstractPlugin, ActionResult
+from extension.extensionloader import ExtensionLoader
+from extension.jobstore import JobStore
+from extension.scheduler import Scheduler
+from tenants import Tenant, TenantRegistry
+
+CHATS = (1, 2, 3)
+MORNING = time(8, 10)
+LATER = time(9, 30)
+
+
+class Plugin:
+    name = "Morning"
+    isenabled = True
+
+    async def morning(self, *args):
+        pass
+
+
+@pytest.fixture
+def ran(monkeypatch) -> list[int]:
+    """Chats the event is run for"""
+    ran = []
+
+    async def run_event(self, plg, action, args, chat_id, job_queue):
+        ran.append(chat_id)
+
+    monkeypatch.setattr(ExtensionLoader, "run_event", run_event)
+    monkeypatch.setattr("extension.extensionloader.tenants", TenantRegistry([
+        Tenant(chat_id=chat, name=str(chat), token="", inbox_id="",
+               calendar_id="", current_tasks_id="", uni_schedule_id="")
+        for chat in CHATS
+    ]))
+    return ran
+
+
+@pytest.fixture
+def plg(loader, ran, tmp_path) -> Plugin:
+    loop = asyncio.new_event_loop()
+    app = ApplicationBuilder().token("123456:fake").build()
+    loader._app = app
+    loader._scheduler = Scheduler(app.job_queue,
+                                  JobStore(str(tmp_path / "jobs.sqlite3")))
+    plg = Plugin()
+    plg.loader, plg.loop = loader, loop
+    callback = loader.create_fanout_callback(plg.morning, plg)
+    loader.scheduler.run_daily(plg, plg.morning, callback, MORNING, None)
+    loop.run_until_complete(app.job_queue.start())
+    yield plg
+    loop.run_until_complete(app.job_queue.stop(wait=False))
+    loop.close()
+
+
+def jobs(plg: Plugin) -> dict[int | None, tuple[int, bool]]:
+    """Chat id -> hour of the job and is it enabled (not paused)"""
+    return {job.chat_id: (job.job.trigger.fields[5].expressions[0].first,
+                          job.next_t is not None)
+            for job in plg.loader._app.job_queue.get_jobs_by_name(plg.name)}
+
+
+def fire(plg: Plugin):
+    """Run enabled jobs of the event, as the job queue does"""
+    for job in plg.loader._app.job_queue.get_jobs_by_name(plg.name):
+        if job.next_t is not None:
+            context = SimpleNamespace(job=job, job_queue=None)
+            plg.loop.run_until_complete(job.callback(context))
+
+
+def test_shared_event_runs_for_all_chats(plg, ran):
+    fire(plg)
+    assert sorted(ran) == list(CHATS)
+
+
+def test_moved_event_runs_for_the_chat_only(plg, ran):
+    scheduler = plg.loader.scheduler
+    assert scheduler.reschedule(plg, plg.morning, LATER, chat_id=2)
+    assert scheduler.has_own(plg, plg.morning, 2)
+    assert not scheduler.has_own(plg, plg.morning, 1)
+    assert jobs(plg) == {None: (8, True), 2: (9, True)}
+    fire(plg)
+    assert sorted(ran) == list(CHATS)
+    ran.clear()
+    # the chat moves its event again, it is not copied once more
+    assert scheduler.reschedule(plg, plg.morning, MORNING, chat_id=2)
+    assert jobs(plg) == {None: (8, True), 2: (8, True)}
+
+
+def test_paused_event_is_skipped_for_the_chat_only(plg, ran):
+    scheduler = plg.loader.scheduler
+    assert scheduler.pause(plg, plg.morning, chat_id=3)
+    assert jobs(plg) == {None: (8, True), 3: (8, False)}
+    fire(plg)
+    assert sorted(ran) == [1, 2]
+    assert scheduler.resume(plg, plg.morning, chat_id=3)
+    ran.clear()
+    # the others already got today's event
+    fire(plg)
+    assert ran == [3]
+    ran.clear()
+    fire(plg)
+    assert ran == []
+
+
+def test_shared_change_keeps_chat_events(plg, ran):
+    scheduler = plg.loader.scheduler
+    scheduler.reschedule(plg, plg.morning, LATER, chat_id=2)
+    scheduler.pause(plg, plg.morning)
+    assert jobs(plg) == {None: (8, False), 2: (9, True)}
+    fire(plg)
+    assert ran == [2]
+
+
+def test_cancel_drops_chat_events(plg):
+    scheduler = plg.loader.scheduler
+    scheduler.reschedule(plg, plg.morning, LATER, chat_id=2)
+    assert scheduler.cancel(plg, plg.morning)
+    assert jobs(plg) == {}
+    assert not scheduler.has_own(plg, plg.morning, 2)
+
+
+class Refreshing(AbstractPlugin):
+    def __init__(self) -> None:
+        super().__init__("Refreshing")
+
+    async def refresh(self, *args):
+        return ActionResult()
+
+    def user_commands(self):
+        return ()
+
+    def daily_events(self):
+        return ()
+
+    def monthly_events(self):
+        return ()
+
+    def disordered_events(self):
+        return ()
+
+    def refresh_events(self):
+        return ((timedelta(minutes=10), self.refresh), )
+
+    def help(self, *args):
+        return {}
+
+
+def test_refresh_events_run_in_followers(loader, ran):
+    # followers load plugins without events (`jobs=False`)
+    app = ApplicationBuilder().token("123456:fake").build()
+    loader._app = app
+    loader._scheduler = Scheduler(app.job_queue)
+    loader._plg_manager.set_plugins([Refreshing()])
+    loader.load_refresh_events(app)
+    job, = app.job_queue.get_jobs_by_name("Refreshing")
+    asyncio.run(job.callback(SimpleNamespace(job=job, job_queue=None)))
+    assert sorted(ran) == list(CHATS)
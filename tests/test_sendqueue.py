@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from telegram.error import BadRequest
+
+from metrics import metrics
+from outbox import sendqueue
+from outbox.sendqueue import SendQueue
+
+CHAT = 100
+
+
+class FakeBot:
+    """Raises given errors, then records sent messages"""
+
+    def __init__(self, *errors: Exception) -> None:
+        self.errors = list(errors)
+        self.sent: list[tuple[int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture(autouse=True)
+def no_intervals(monkeypatch):
+    monkeypatch.setattr(sendqueue, "SEND_CHAT_INTERVAL", 0)
+    monkeypatch.setattr(sendqueue, "SEND_GLOBAL_INTERVAL", 0)
+
+
+def latency() -> tuple[int, int]:
+    """Delivered and failed messages observed so far"""
+    histograms = metrics.series("bot_send_latency").values()
+    return (sum(h.count - h.errors for h in histograms),
+            sum(h.errors for h in histograms))
+
+
+def deliver(bot: FakeBot, *texts: str) -> list[bool]:
+    async def main():
+        queue = SendQueue(bot)
+        queue.start()
+        try:
+            return await asyncio.wait_for(
+                asyncio.gather(*(queue.send(CHAT, text) for text in texts)),
+                1
+            )
+        finally:
+            await queue.stop()
+
+    return asyncio.run(main())
+
+
+def test_delivery_latency_is_observed():
+    delivered, failed = latency()
+    assert deliver(FakeBot(), "one", "two") == [True, True]
+    assert latency() == (delivered + 2, failed)
+
+
+def test_refused_message_is_dropped():
+    delivered, failed = latency()
+    bot = FakeBot(BadRequest("chat not found"))
+    assert deliver(bot, "one", "two") == [False, True]
+    assert bot.sent == [(CHAT, "two")]
+    assert latency() == (delivered + 1, failed + 1)
+
+
+def test_sender_survives_unexpected_error():
+    bot = FakeBot(ValueError("bug"))
+    assert deliver(bot, "one", "two") == [False, True]
+    assert bot.sent == [(CHAT, "two")]
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from mynotion.singleflight import SingleFlight
+
+
+class Query:
+    """Counts calls, each one waits for `release`"""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> list[int]:
+        self.calls += 1
+        await self.release.wait()
+        return [self.calls]
+
+
+def test_concurrent_callers_share_one_call():
+    async def main():
+        flights, query = SingleFlight(), Query()
+        callers = [asyncio.create_task(flights.do("inbox", query))
+                   for _ in range(3)]
+        other = asyncio.create_task(flights.do("calendar", query))
+        await asyncio.sleep(0)
+        in_flight = flights.in_flight
+        query.release.set()
+        results = await asyncio.gather(*callers, other)
+        return query.calls, in_flight, results, flights.in_flight
+
+    calls, in_flight, results, after = asyncio.run(main())
+    assert (calls, in_flight, after) == (2, 2, 0)
+    assert results[:3] == [[1], [1], [1]]
+
+
+def test_next_caller_starts_a_new_call():
+    async def main():
+        flights, query = SingleFlight(), Query()
+        query.release.set()
+        return [await flights.do("inbox", query) for _ in range(2)]
+
+    assert asyncio.run(main()) == [[1], [2]]
+
+
+def test_error_is_shared_by_all_callers():
+    async def failing():
+        await asyncio.sleep(0)
+        raise TimeoutError
+
+    async def main():
+        flights = SingleFlight()
+        return await asyncio.gather(flights.do("inbox", failing),
+                                    flights.do("inbox", failing),
+                                    return_exceptions=True)
+
+    assert [type(err) for err in asyncio.run(main())] == [TimeoutError] * 2
+
+
+def test_cancelled_caller_does_not_cancel_the_call():
+    async def main():
+        flights, query = SingleFlight(), Query()
+        first = asyncio.create_task(flights.do("inbox", query))
+        second = asyncio.create_task(flights.do("inbox", query))
+        await asyncio.sleep(0)
+        first.cancel()
+        query.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == [1]
@@ -0,0 +1,49 @@
+import re
+
+from outbox import split_html
+
+TAG_RE = re.compile(r"</?(\w+)[^>]*>")
+
+
+def balanced(part: str) -> bool:
+    stack = []
+    for match in TAG_RE.finditer(part):
+        if not match.group(0).startswith("</"):
+            stack.append(match.group(1))
+        elif not stack or stack.pop() != match.group(1):
+            return False
+    return not stack
+
+
+def test_short_message_is_not_split():
+    assert split_html("<b>short</b>", limit=100) == ["<b>short</b>"]
+
+
+def test_split_on_lines_within_limit():
+    text = "".join(f"line {i}\n" for i in range(50))
+    parts = split_html(text, limit=100)
+    assert len(parts) > 1
+    assert all(len(part) <= 100 for part in parts)
+    assert "".join(parts) == text
+
+
+def test_open_tags_are_closed_and_reopened():
+    lines = "".join(f"row {i}\n" for i in range(40))
+    text = f'<b>Title</b>\n<pre><code class="py">{lines}</code></pre>'
+    parts = split_html(text, limit=120)
+    assert len(parts) > 1
+    assert all(len(part) <= 120 and balanced(part) for part in parts)
+    assert parts[1].startswith('<pre><code class="py">')
+    # nothing is lost but the added tags
+    content = "".join(TAG_RE.sub("", part) for part in parts)
+    assert content == TAG_RE.sub("", text)
+
+
+def test_entities_and_tags_are_not_cut():
+    text = "a" * 45 + "&amp;" + " <i>x</i>" * 30
+    parts = split_html(text, limit=100)
+    assert all(len(part) <= 100 for part in parts)
+    assert "".join(parts) == text
+    for part in parts:
+        assert part.count("&") == part.count(";")
+        assert part.count("<") == part.count(">")
@@ -0,0 +1,59 @@
+import pytest
+
+from inbox.spool import InboxSpool
+
+CHAT, OTHER = 100, 200
+
+
+@pytest.fixture
+def spool() -> InboxSpool:
+    spool = InboxSpool()
+    spool._db.execute("DELETE FROM spool")
+    spool._db.execute("DELETE FROM seen")
+    spool._acked.clear()
+    return spool
+
+
+def test_chat_status_counts_only_the_chat(spool):
+    first = spool.put("one", CHAT)
+    spool.put("two", CHAT)
+    failed = spool.put("three", CHAT)
+    spool.put("other", OTHER)
+    spool.ack(first)
+    spool.fail(failed)
+    pending, failed, drain_rate = spool.chat_status(CHAT)
+    assert (pending, failed) == (1, 1)
+    assert drain_rate > 0
+    assert spool.chat_status(OTHER)[:2] == (1, 0)
+    assert spool.chat_status(OTHER)[2] == 0
+    assert spool.depth == 2
+
+
+def test_entries_are_peeked_in_order_until_acked(spool):
+    first = spool.put("one", CHAT)
+    second = spool.put("two", CHAT)
+    assert [e.text for e in spool.peek(5)] == ["one", "two"]
+    spool.ack(first)
+    assert [e.id for e in spool.peek(5)] == [second]
+    assert spool.status([first, second]) == (1, 0)
+
+
+def test_failed_entry_is_kept_but_not_peeked(spool):
+    entry = spool.put("refused", CHAT)
+    spool.fail(entry)
+    assert spool.peek() == []
+    assert spool.status([entry]) == (0, 1)
+    assert spool.failed == 1
+
+
+def test_redelivered_message_is_spooled_once(spool):
+    assert spool.put("one", CHAT, message_id=7) is not None
+    assert spool.put("one", CHAT, message_id=7) is None
+    assert spool.put("one", OTHER, message_id=7) is not None
+    assert spool.depth == 2
+
+
+def test_seen_messages_expire(spool, monkeypatch):
+    monkeypatch.setattr("inbox.spool.INBOX_DEDUPE_WINDOW", -1)
+    spool.put("one", CHAT, message_id=7)
+    assert spool.put("one", CHAT, message_id=7) is not None
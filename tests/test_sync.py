@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+from mynotion import DatabaseMirror
+
+DATABASE = "db"
+
+
+class FakeDatabase:
+    """Pages of one database, answers `databases.query`
+    with `last_edited_time` filter
+    """
+
+    def __init__(self) -> None:
+        self.pages: dict[str, dict] = {}
+        self.databases = SimpleNamespace(query=self.query)
+
+    def edit(self, page_id: str, edited: str, **fields) -> dict:
+        page = {"id": page_id, "last_edited_time": edited,
+                "parent": {"database_id": DATABASE}, **fields}
+        self.pages[page_id] = page
+        return page
+
+    async def query(self, database_id: str, filter: dict | None = None,
+                    **kwargs) -> dict:
+        since = filter["last_edited_time"]["on_or_after"] if filter else ""
+        return {
+            "results": [p for p in self.pages.values()
+                        if p["last_edited_time"] >= since],
+            "has_more": False,
+            "next_cursor": None,
+        }
+
+
+def titles(mirror: DatabaseMirror) -> dict[str, str]:
+    return {page["id"]: page.get("title") for page in mirror.pages()}
+
+
+def test_pages_written_by_bot_do_not_move_checkpoint():
+    notion = FakeDatabase()
+    mirror = DatabaseMirror(DATABASE)
+    notion.edit("a", "2024-01-01T10:00:00.000Z", title="old")
+    assert asyncio.run(mirror.sync(notion))
+    assert mirror.checkpoint == "2024-01-01T10:00:00.000Z"
+    # edited in Notion, then a page is added by the bot
+    notion.edit("a", "2024-01-01T10:05:00.000Z", title="new")
+    page = notion.edit("b", "2024-01-01T10:07:00.000Z", title="bot")
+    assert mirror.apply(page)
+    assert mirror.checkpoint == "2024-01-01T10:00:00.000Z"
+    assert asyncio.run(mirror.sync(notion))
+    assert titles(mirror) == {"a": "new", "b": "bot"}
+    assert mirror.checkpoint == "2024-01-01T10:07:00.000Z"
+
+
+def test_incremental_sync_pulls_only_new_edits():
+    notion = FakeDatabase()
+    mirror = DatabaseMirror(DATABASE)
+    notion.edit("a", "2024-01-01T10:00:00.000Z")
+    asyncio.run(mirror.sync(notion))
+    mirror.take_changes()
+    assert not asyncio.run(mirror.sync(notion))
+    notion.edit("b", "2024-01-01T10:01:00.000Z")
+    assert asyncio.run(mirror.sync(notion))
+    replaced, changes = mirror.take_changes()
+    assert not replaced and list(changes) == ["b"]
+
+
+def test_archived_page_is_dropped():
+    notion = FakeDatabase()
+    mirror = DatabaseMirror(DATABASE)
+    notion.edit("a", "2024-01-01T10:00:00.000Z")
+    asyncio.run(mirror.sync(notion))
+    assert mirror.apply({"id": "a", "archived": True})
+    assert titles(mirror) == {}
+
+
+def test_version_grows_on_changes():
+    notion = FakeDatabase()
+    mirror = DatabaseMirror(DATABASE)
+    notion.edit("a", "2024-01-01T10:00:00.000Z")
+    asyncio.run(mirror.sync(notion))
+    version = mirror.version
+    assert not asyncio.run(mirror.sync(notion))
+    assert mirror.version == version
+    notion.edit("a", "2024-01-01T10:01:00.000Z", title="new")
+    asyncio.run(mirror.sync(notion))
+    assert mirror.version > version
+    version = mirror.version
+    mirror.apply(notion.edit("b", "2024-01-01T10:02:00.000Z"))
+    assert mirror.version > version
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import socket
+
+import pytest
+
+from metrics import MetricsRegistry
+from mynotion import transport
+from mynotion.notion import LimitedClient
+from mynotion.ratelimit import RateLimiter
+from mynotion.transport import (
+    NOTION_TIMEOUT,
+    ConnectionTrace,
+    make_client,
+    open_connections,
+)
+
+
+class Server:
+    """HTTP/1.1 server which answers every request with 401
+    after `delay` seconds and keeps connections alive
+    """
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.connections = 0
+        self.requests = 0
+
+    async def __call__(self, reader: asyncio.StreamReader,
+                       writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while await reader.readline():
+                while (await reader.readline()).strip():
+                    pass
+                self.requests += 1
+                await asyncio.sleep(self.delay)
+                writer.write(b"HTTP/1.1 401 Unauthorized\r\n"
+                             b"Content-Type: application/json\r\n"
+                             b"Content-Length: 2\r\n\r\n{}")
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+@pytest.fixture
+def registry(monkeypatch) -> MetricsRegistry:
+    registry = MetricsRegistry()
+    monkeypatch.setattr(transport, "metrics", registry)
+    return registry
+
+
+async def serve(server: Server, monkeypatch):
+    """Start the server, Notion API URL points to it"""
+    listener = await asyncio.start_server(server, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    monkeypatch.setattr(transport, "NOTION_API_URL", f"http://127.0.0.1:{port}")
+    return listener
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_trace_tells_reused_connections(registry, monkeypatch):
+    server = Server()
+
+    async def main():
+        async with await serve(server, monkeypatch), make_client() as client:
+            for _ in range(3):
+                response = await client.get("users/me")
+                assert response.request.url.path == "/v1/users/me"
+
+    asyncio.run(main())
+    assert server.connections == 1
+    connection = registry.series("bot_notion_connection")
+    assert {labels: h.count for labels, h in connection.items()} \
+        == {(("reused", "no"), ): 1, (("reused", "yes"), ): 2}
+    handshake, = registry.series("bot_notion_handshake").items()
+    assert handshake[0] == (("phase", "connect_tcp"), )
+    assert (handshake[1].count, handshake[1].errors) == (1, 0)
+
+
+def test_failed_handshake_is_an_error(registry):
+    async def main():
+        trace = ConnectionTrace()
+        await trace("connection.connect_tcp.started", {})
+        await trace("connection.connect_tcp.complete", {})
+        await trace("connection.start_tls.started", {})
+        await trace("connection.start_tls.failed", {})
+
+    asyncio.run(main())
+    series = registry.series("bot_notion_handshake")
+    assert {labels: h.errors for labels, h in series.items()} \
+        == {(("phase", "connect_tcp"), ): 0, (("phase", "start_tls"), ): 1}
+    assert not registry.series("bot_notion_connection")
+
+
+def test_connections_are_opened_at_once(registry, monkeypatch):
+    server = Server(delay=0.05)
+
+    async def main():
+        async with await serve(server, monkeypatch), make_client() as client:
+            opened = await open_connections(client, 3)
+            # idle connections are reused
+            again = await open_connections(client, 3)
+            return opened, again
+
+    assert asyncio.run(main()) == (3, 3)
+    assert (server.connections, server.requests) == (3, 6)
+
+
+def test_unreachable_notion_opens_no_connections(registry, monkeypatch,
+                                                 caplog):
+    monkeypatch.setattr(transport, "NOTION_API_URL",
+                        f"http://127.0.0.1:{free_port()}")
+
+    async def main():
+        async with make_client() as client:
+            return await open_connections(client, 2)
+
+    with caplog.at_level(logging.WARNING):
+        assert asyncio.run(main()) == 0
+    assert "2 of 2 connections are not opened" in caplog.text
+    h, = registry.series("bot_notion_handshake").values()
+    assert h.errors == 2
+
+
+def test_http2_needs_h2(monkeypatch, caplog):
+    monkeypatch.setattr(transport, "NOTION_HTTP2", True)
+    monkeypatch.setattr(transport.importlib.util, "find_spec",
+                        lambda name: None)
+    with caplog.at_level(logging.WARNING):
+        client = make_client()
+    assert "`h2` is not installed" in caplog.text
+    assert not client._transport._pool._http2
+    assert client.timeout == NOTION_TIMEOUT
+    asyncio.run(client.aclose())
+
+
+def test_notion_client_keeps_transport_timeouts():
+    async def main():
+        async with make_client() as http:
+            client = LimitedClient(RateLimiter(3, 3), "token", client=http)
+            return client.client.timeout
+
+    timeout = asyncio.run(main())
+    assert timeout == NOTION_TIMEOUT
+    assert timeout.connect != timeout.read
@@ -0,0 +1,64 @@
+import asyncio
+import importlib.util
+from pathlib import Path
+
+from config import PAIR_SCHEDULE
+from mynotion import SchedulePair
+
+PLUGIN = (Path(__file__).resolve().parent.parent
+          / "extension" / "plugins" / "uni_schedule_plugin.py")
+
+
+def load_plugin():
+    spec = importlib.util.spec_from_file_location("uni_schedule_plugin",
+                                                  PLUGIN)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.UniSchedule()
+
+
+class FakeNotion:
+    """Schedule mirror which is synced by someone else too"""
+
+    def __init__(self) -> None:
+        self.subject = "Math"
+        self.mirror_version = 0
+        self.pending = False
+
+    def edit(self, subject: str):
+        self.subject = subject
+        self.pending = True
+
+    def sync_elsewhere(self):
+        """e.g. the background refresh of the replica"""
+        if self.pending:
+            self.pending = False
+            self.mirror_version += 1
+
+    async def sync(self, dataset: str) -> bool:
+        changed, self.pending = self.pending, False
+        self.mirror_version += changed
+        return changed
+
+    def version(self, dataset: str) -> int:
+        return self.mirror_version
+
+    async def uni_schedule_index(self):
+        return {(0, False): [SchedulePair(1, PAIR_SCHEDULE[0], self.subject,
+                                          "", "101")]}
+
+
+def rendered_subject(plg) -> str:
+    (_, block), = plg._rendered.get()[(0, False)]
+    return block
+
+
+def test_schedule_is_rendered_again_after_sync_by_others():
+    plg = load_plugin()
+    notion = plg._notion = FakeNotion()
+    asyncio.run(plg.refresh_schedule())
+    assert "Math" in rendered_subject(plg)
+    notion.edit("Physics")
+    notion.sync_elsewhere()
+    asyncio.run(plg.refresh_schedule())
+    assert "Physics" in rendered_subject(plg)
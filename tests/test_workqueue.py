@@ -0,0 +1,95 @@
+import pytest
+
+from cluster import UpdateQueue
+
+LEADER, FOLLOWER = 1, 2
+CHAT = 100
+
+
+@pytest.fixture
+def queues(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    leader = UpdateQueue(path, worker=LEADER)
+    follower = UpdateQueue(path, worker=FOLLOWER)
+    leader.heartbeat()
+    follower.heartbeat()
+    return leader, follower
+
+
+def take(queue: UpdateQueue, leader: bool = False) -> list[int]:
+    ids = [update_id for update_id, _ in queue.claim(16, leader)]
+    for update_id in ids:
+        queue.done(update_id)
+    return ids
+
+
+def test_chat_sticks_to_its_worker(queues):
+    leader, follower = queues
+    leader.put(1, CHAT, "{}")
+    assert take(follower) == [1]
+    leader.put(2, CHAT, "{}")
+    assert take(leader, leader=True) == []
+    assert take(follower) == [2]
+
+
+def test_pinned_update_goes_to_leader_only(queues):
+    leader, follower = queues
+    leader.put(1, CHAT, "{}", pinned=True)
+    assert take(follower) == []
+    assert take(leader, leader=True) == [1]
+
+
+def test_pinned_claim_does_not_block_chat(queues):
+    leader, follower = queues
+    leader.put(1, CHAT, "{}")
+    assert take(follower) == [1]
+    leader.put(2, CHAT, "{}", pinned=True)
+    assert take(leader, leader=True) == [2]
+    leader.put(3, CHAT, "{}")
+    assert take(leader, leader=True) == []
+    assert take(follower) == [3]
+    assert leader.depth == 0
+
+
+def test_latest_claimer_owns_chat(queues, tmp_path):
+    leader, follower = queues
+    leader.put(1, CHAT, "{}")
+    assert take(follower) == [1]
+    # the follower stops sending heartbeats, the chat moves
+    follower._db.execute("UPDATE workers SET seen_at = 0 WHERE id = ?",
+                         (FOLLOWER, ))
+    leader.put(2, CHAT, "{}")
+    assert take(leader, leader=True) == [2]
+    # the follower is back, but the leader took the chat last
+    follower.heartbeat()
+    leader.put(3, CHAT, "{}")
+    assert take(follower) == []
+    assert take(leader, leader=True) == [3]
+
+
+def test_expired_lease_is_claimed_again(queues, monkeypatch):
+    leader, follower = queues
+    leader.put(1, CHAT, "{}")
+    assert [i for i, _ in follower.claim(16)] == [1]
+    # the follower died without marking the update done
+    follower._db.execute("UPDATE workers SET seen_at = 0 WHERE id = ?",
+                         (FOLLOWER, ))
+    assert leader.claim(16, True) == []
+    monkeypatch.setattr("cluster.workqueue.WORK_LEASE", -1)
+    assert [i for i, _ in leader.claim(16, True)] == [1]
+
+
+def test_put_ignores_duplicates(queues):
+    leader, _ = queues
+    assert leader.put(1, CHAT, "{}")
+    assert not leader.put(1, CHAT, "{}")
+    assert leader.depth == 1
+
+
+def test_update_of_live_worker_is_not_claimed_again(queues, monkeypatch):
+    leader, follower = queues
+    leader.put(1, CHAT, "{}")
+    assert [i for i, _ in follower.claim(16)] == [1]
+    # the handler runs longer than the lease, the follower is alive
+    monkeypatch.setattr("cluster.workqueue.WORK_LEASE", -1)
+    assert leader.claim(16, True) == []
@@ -0,0 +1,255 @@
+import asyncio
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from mynotion import notion as notion_module
+from mynotion.notion import NotionWorkspace
+from mynotion.replica import ReplicaStore
+from tenants import Tenant
+
+TENANT = Tenant(chat_id=100, name="test", token="", inbox_id="inbox",
+                calendar_id="calendar", current_tasks_id="tasks",
+                uni_schedule_id="schedule")
+
+
+# date filter operator of Notion -> check of the start date
+DATE_FILTERS = {
+    "before": lambda start, day: start < day,
+    "on_or_before": lambda start, day: start <= day,
+    "on_or_after": lambda start, day: start >= day,
+}
+
+
+def matches(page: dict, filter: dict | None) -> bool:
+    """Date filters of `databases.query` (`and` of them too)"""
+    if filter is None or "timestamp" in filter:
+        return True
+    if "and" in filter:
+        return all(matches(page, f) for f in filter["and"])
+    date = page["properties"][filter["property"]]["date"]
+    (op, day), = filter["date"].items()
+    return date is not None and DATE_FILTERS[op](date["start"][:10], day)
+
+
+class FakeClient:
+    """Pages of the databases, answers `databases.query` (newest first
+    with `sorts`, date filters), `pages.retrieve` and `pages.update`
+    after `delay` seconds
+    """
+
+    def __init__(self) -> None:
+        self.rows: dict[str, dict] = {}
+        self.delay = 0.0
+        self.max_page_size = 100
+        self.filters: list[dict | None] = []
+        self.error: Exception | None = None
+        self.databases = SimpleNamespace(query=self.query)
+        self.pages = SimpleNamespace(retrieve=self.retrieve,
+                                     update=self.update)
+
+    def add(self, database_id: str, title: str, created: str) -> dict:
+        page = {"object": "page", "id": f"{database_id}-{title}", "url": "",
+                "created_time": created, "last_edited_time": created,
+                "parent": {"database_id": database_id}, "archived": False,
+                "properties": {"Name": {"title": [{"plain_text": title}]}}}
+        self.rows[page["id"]] = page
+        return page
+
+    def add_event(self, title: str, start: str, end: str | None = None):
+        page = self.add("calendar", title, created(0))
+        page["properties"]["Date"] = {"date": {"start": start, "end": end}}
+
+    def archive(self, page_id: str):
+        self.rows[page_id] = {**self.rows[page_id], "archived": True}
+
+    async def query(self, database_id: str, sorts: list | None = None,
+                    page_size: int = 100, start_cursor: str | None = None,
+                    filter: dict | None = None, **kwargs) -> dict:
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        self.filters.append(filter)
+        pages = [p for p in self.rows.values()
+                 if p["parent"]["database_id"] == database_id
+                 and not p["archived"] and matches(p, filter)]
+        if sorts:
+            pages.sort(key=lambda p: p["created_time"], reverse=True)
+        start = int(start_cursor or 0)
+        end = start + min(page_size, self.max_page_size)
+        return {"results": pages[start:end], "has_more": end < len(pages),
+                "next_cursor": str(end) if end < len(pages) else None}
+
+    async def retrieve(self, page_id: str) -> dict:
+        return self.rows[page_id]
+
+    async def update(self, page_id: str, archived: bool) -> dict:
+        self.rows[page_id] = {**self.rows[page_id], "archived": archived}
+        return self.rows[page_id]
+
+
+@pytest.fixture
+def client() -> FakeClient:
+    return FakeClient()
+
+
+@pytest.fixture
+def workspace(client, tmp_path) -> NotionWorkspace:
+    ws = NotionWorkspace(TENANT, None,
+                         ReplicaStore(str(tmp_path / "replica.sqlite3")))
+    ws._client = client
+    return ws
+
+
+def created(minute: int) -> str:
+    return f"2026-10-18T09:{minute:02d}:00.000Z"
+
+
+def test_first_sync_is_not_cut_by_read_timeout(workspace, client,
+                                               monkeypatch):
+    monkeypatch.setattr(notion_module, "NOTION_READ_TIMEOUT", 0.01)
+    client.add("tasks", "first", created(0))
+    client.delay = 0.05
+    tasks = asyncio.run(workspace.get_current_tasks())
+    assert [task.title for task in tasks] == ["first"]
+
+
+def test_later_sync_falls_back_to_mirror(workspace, client, monkeypatch):
+    monkeypatch.setattr(notion_module, "NOTION_READ_TIMEOUT", 0.01)
+    client.add("tasks", "first", created(0))
+
+    async def main():
+        await workspace.sync("current_tasks")
+        workspace.invalidate_cache()
+        client.delay = 0.05
+        return await workspace.get_current_tasks()
+
+    assert [task.title for task in asyncio.run(main())] == ["first"]
+    assert workspace.stale_age("current_tasks") is not None
+
+
+def test_inbox_skips_pages_archived_in_notion(workspace, client):
+    for minute, title in enumerate(("a", "b", "c", "d")):
+        client.add("inbox", title, created(minute))
+
+    async def main():
+        await workspace.sync("inbox")
+        # archived outside of the bot, the mirror still has them
+        client.archive("inbox-d")
+        client.archive("inbox-b")
+        shown = await workspace.last_inbox_pages(2)
+        result = await workspace.archive_n_pages(1)
+        return shown, result
+
+    shown, result = asyncio.run(main())
+    assert shown == ["  1. c", "  2. a"]
+    assert result.done == ["inbox-c"]
+    assert {p["id"] for p in workspace._mirrors["inbox"].pages()} \
+        == {"inbox-a"}
+
+
+def test_inbox_is_paginated(workspace, client):
+    for minute in range(5):
+        client.add("inbox", str(minute), created(minute))
+    client.max_page_size = 2
+    pages, has_more = asyncio.run(workspace._newest_inbox_pages(3))
+    assert [p["id"] for p in pages] == ["inbox-4", "inbox-3", "inbox-2"]
+    assert has_more
+
+
+def test_archived_page_is_not_live(workspace, client):
+    client.add("tasks", "first", created(0))
+    client.add("tasks", "second", created(1))
+
+    async def main():
+        await workspace.get_current_tasks()
+        client.archive("tasks-first")
+        return (await workspace.page_is_live("tasks-first"),
+                await workspace.page_is_live("tasks-second"),
+                await workspace.get_current_tasks())
+
+    first, second, tasks = asyncio.run(main())
+    assert (first, second) == (False, True)
+    assert [task.title for task in tasks] == ["second"]
+
+
+def test_bulk_update_counts_failed_pages(workspace, client, monkeypatch):
+    monkeypatch.setattr(notion_module, "NOTION_BULK_CONCURRENCY", 2)
+    for minute in range(5):
+        client.add("tasks", str(minute), created(minute))
+    running = []
+    peak = 0
+    update = client.update
+
+    async def flaky_update(page_id: str, archived: bool) -> dict:
+        nonlocal peak
+        running.append(page_id)
+        peak = max(peak, len(running))
+        await asyncio.sleep(0.01)
+        running.remove(page_id)
+        if page_id == "tasks-3":
+            raise RuntimeError("conflict")
+        return await update(page_id, archived)
+
+    client.pages.update = flaky_update
+    ids = [f"tasks-{minute}" for minute in (0, 1, 2, 3, 3, 4)]
+    result = asyncio.run(workspace.archive_pages(ids))
+    assert result.total == 5        # duplicates are updated once
+    assert sorted(result.done) == ["tasks-0", "tasks-1", "tasks-2", "tasks-4"]
+    assert result.failed == {"tasks-3": "conflict"}
+    assert not result.ok
+    assert client.rows["tasks-0"]["archived"]
+    assert not client.rows["tasks-3"]["archived"]
+    assert peak == 2
+
+
+def test_calendar_day_is_filtered_by_notion(workspace, client):
+    client.add_event("today", "2026-10-18T10:00:00+03:00")
+    client.add_event("trip", "2026-10-16", "2026-10-19")
+    client.add_event("over", "2026-10-15", "2026-10-17")
+    client.add_event("tomorrow", "2026-10-19")
+    client.add_event("long ago", "2026-01-01", "2026-12-31")
+    events = asyncio.run(workspace.calendar_events_on(date(2026, 10, 18)))
+    assert sorted(ev.title for ev in events) == ["today", "trip"]
+    # only the lookback window is asked from Notion
+    assert client.filters[-1]["and"][1]["date"]["on_or_after"] \
+        == (date(2026, 10, 18)
+            - timedelta(days=notion_module.CALENDAR_LOOKBACK_DAYS)).isoformat()
+
+
+def test_calendar_events_ended_before(workspace, client):
+    client.add_event("over", "2026-10-15", "2026-10-17")
+    client.add_event("ongoing", "2026-10-15", "2026-10-20")
+    client.add_event("past", "2026-10-01T09:00:00+03:00")
+    client.add_event("today", "2026-10-18")
+    events = asyncio.run(
+        workspace.calendar_events_ended_before(date(2026, 10, 18))
+    )
+    assert sorted(ev.title for ev in events) == ["over", "past"]
+    assert client.filters == [
+        {"property": "Date", "date": {"before": "2026-10-18"}}
+    ]
+
+
+def test_calendar_day_falls_back_to_mirror(workspace, client):
+    client.add_event("today", "2026-10-18")
+    client.add_event("tomorrow", "2026-10-19")
+
+    async def main():
+        await workspace.sync("calendar")
+        client.error = httpx.ConnectError("connection refused")
+        return await workspace.calendar_events_on(date(2026, 10, 18))
+
+    assert [ev.title for ev in asyncio.run(main())] == ["today"]
+    assert workspace.stale_age("calendar") is not None
+
+
+def test_first_calendar_read_is_not_cut_by_read_timeout(workspace, client,
+                                                         monkeypatch):
+    monkeypatch.setattr(notion_module, "NOTION_READ_TIMEOUT", 0.01)
+    client.add_event("today", "2026-10-18")
+    client.delay = 0.05
+    events = asyncio.run(workspace.calendar_events_on(date(2026, 10, 18)))
+    assert [ev.title for ev in events] == ["today"]
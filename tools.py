@@ -1,11 +1,12 @@
 from __future__ import annotations
-from datetime import time, datetime
+from datetime import time, datetime, timedelta
 from typing import TYPE_CHECKING, Sequence
 
 if TYPE_CHECKING:
     from telegram import Update
 
-from config import TG_CHAT_ID, TIMEZONE
+from config import TIMEZONE
+from tenants import tenants, as_tenant
 
 TIMESET_HELP_MSG = "You should provide your command \
 with hours minutes and seconds in this fashon:\n \
@@ -13,8 +14,12 @@ with hours minutes and seconds in this fashon:\n \
 "
 
 def validate_user(func):
+    """Serve only chats of tenants, with the chat's tenant as current"""
     async def wrapper(update: Update, *args, **kwargs):
-        if update.effective_chat.id == TG_CHAT_ID:
+        tenant = tenants.get(update.effective_chat.id)
+        if tenant is None:
+            return
+        with as_tenant(tenant):
             return await func(update, *args, **kwargs)
 
     return wrapper
@@ -24,6 +29,21 @@ def protect_for_html(text_data):
                     .replace('<', '&lt;')\
                     .replace('>', '&gt;')
 
+def stale_mark(age: timedelta | None) -> str:
+    """Note for answers made from the saved copy of Notion
+    (see `Notion.stale_age`), empty string for fresh answers
+    """
+    if age is None:
+        return ""
+    minutes = int(age.total_seconds() // 60)
+    if minutes < 60:
+        ago = f"{minutes} min"
+    elif minutes < 48 * 60:
+        ago = f"{minutes // 60} h"
+    else:
+        ago = f"{minutes // (24 * 60)} days"
+    return f"\n<i>⚠ Notion is unavailable, data as of {ago} ago</i>"
+
 def singleton(cls, *args, **kw):
     instances = {}
     def _singleton(*args, **kw):